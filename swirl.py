@@ -26,7 +26,7 @@ from swirl.services import SWIRL_SERVICES_DEBUG, SWIRL_SERVICES_DEBUG_DICT, SERV
 SWIRL_CORE_SERVICES = ['django', 'celery-worker']
 SWIRL_VERSION_CHECK_URL = 'http://updatecheck.swirl.today/'
 
-COMMAND_LIST = [ 'help', 'start', 'debug', 'start_sleep', 'stop', 'restart', 'migrate', 'setup', 'status', 'watch', 'logs' ]
+COMMAND_LIST = [ 'help', 'start', 'debug', 'start_sleep', 'stop', 'restart', 'migrate', 'setup', 'status', 'watch', 'logs', 'models' ]
 
 def get_swirl_version():
     """
@@ -478,6 +478,41 @@ def setup(service_list):
     else:
         return True
 
+##################################################
+
+def models(service_list):
+
+    print("Loading Models:")
+    print()
+
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'swirl_server.settings')
+    django.setup()
+
+    from swirl.model_registry import get_configured_models, preload_models
+
+    try:
+        configured = get_configured_models()
+    except Exception as err:
+        print(f"Error: {err}")
+        return False
+
+    if not configured:
+        print("No models are needed by the active SearchProviders")
+        return True
+
+    stats = preload_models(configured)
+    print(f"{'Model':<50} {'Load Time (s)':>14} {'Memory (MB)':>12}")
+    for stat in stats:
+        print(f"{stat['name']:<50} {stat['load_time']:>14} {round(stat['rss_delta'] / (1024 * 1024), 1):>12}")
+    print()
+
+    if len(stats) < len(configured):
+        print(f"{bcolors.WARNING}Warning: {len(configured) - len(stats)} model(s) failed to load, check the logs{bcolors.ENDC}")
+        return False
+
+    return True
+
 ##################################################
 ##################################################
 
@@ -561,7 +596,8 @@ COMMAND_DISPATCH = {
       'setup' : setup,
       'status': status,
       'watch':watch,
-      'logs': logs
+      'logs': logs,
+      'models': models
 }
 
 #############################################
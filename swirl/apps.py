@@ -10,3 +10,14 @@ class SwirlConfig(AppConfig):
         print ("setting up logging...")
         setup_logging()
         print ("setting up logging DONE")
+
+        from django.db.models.signals import post_save, post_delete
+        from swirl.connection_pool import invalidate_provider_clients
+        post_save.connect(invalidate_provider_clients, sender='swirl.SearchProvider', dispatch_uid='swirl_connection_pool_save')
+        post_delete.connect(invalidate_provider_clients, sender='swirl.SearchProvider', dispatch_uid='swirl_connection_pool_delete')
+        from swirl.circuit_breaker import reset_provider_circuit
+        post_save.connect(reset_provider_circuit, sender='swirl.SearchProvider', dispatch_uid='swirl_circuit_breaker_save')
+        post_delete.connect(reset_provider_circuit, sender='swirl.SearchProvider', dispatch_uid='swirl_circuit_breaker_delete')
+        from swirl.ranking_cache import invalidate_search_rankings
+        post_save.connect(invalidate_search_rankings, sender='swirl.Result', dispatch_uid='swirl_ranking_cache_save')
+        post_delete.connect(invalidate_search_rankings, sender='swirl.Result', dispatch_uid='swirl_ranking_cache_delete')
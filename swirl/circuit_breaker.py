@@ -0,0 +1,260 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+from swirl.latency import percentile
+
+SWIRL_CIRCUIT_BREAKER_REDIS_URL = getattr(settings, 'SWIRL_CIRCUIT_BREAKER_REDIS_URL', '')
+# allow() runs in the search process and the Celery workers record most outcomes, so by default only with a shared store
+SWIRL_CIRCUIT_BREAKER = getattr(settings, 'SWIRL_CIRCUIT_BREAKER', bool(SWIRL_CIRCUIT_BREAKER_REDIS_URL))
+# consecutive failures that open the circuit
+SWIRL_CIRCUIT_BREAKER_FAILURES = getattr(settings, 'SWIRL_CIRCUIT_BREAKER_FAILURES', 5)
+# error rate over the last SWIRL_CIRCUIT_BREAKER_WINDOW requests that opens the circuit, once there are SWIRL_CIRCUIT_BREAKER_MIN_SAMPLES
+SWIRL_CIRCUIT_BREAKER_ERROR_RATE = getattr(settings, 'SWIRL_CIRCUIT_BREAKER_ERROR_RATE', 0.5)
+SWIRL_CIRCUIT_BREAKER_WINDOW = getattr(settings, 'SWIRL_CIRCUIT_BREAKER_WINDOW', 20)
+SWIRL_CIRCUIT_BREAKER_MIN_SAMPLES = getattr(settings, 'SWIRL_CIRCUIT_BREAKER_MIN_SAMPLES', 10)
+# seconds an open circuit waits before letting a probe request through
+SWIRL_CIRCUIT_BREAKER_COOLDOWN = getattr(settings, 'SWIRL_CIRCUIT_BREAKER_COOLDOWN', 60)
+
+CLOSED = 'CLOSED'
+OPEN = 'OPEN'
+HALF_OPEN = 'HALF_OPEN'
+
+#############################################
+
+class MemoryCircuitStore:
+
+    '''
+    Circuit state for this process only
+    '''
+
+    def __init__(self):
+        self._states = {}
+        self._windows = {}
+        self._probes = {}
+        self._lock = threading.Lock()
+
+    def get_state(self, provider_id):
+        with self._lock:
+            state = self._states.get(provider_id)
+            return dict(state) if state else None
+
+    def set_state(self, provider_id, state):
+        with self._lock:
+            self._states[provider_id] = dict(state)
+
+    def push(self, provider_id, entry, window):
+        with self._lock:
+            entries = self._windows.get(provider_id)
+            if entries is None or entries.maxlen != window:
+                entries = deque(entries or [], maxlen=window)
+                self._windows[provider_id] = entries
+            entries.appendleft(entry)
+            return list(entries)
+
+    def get_window(self, provider_id):
+        with self._lock:
+            return list(self._windows.get(provider_id, []))
+
+    def acquire_probe(self, provider_id, ttl):
+        now = time.time()
+        with self._lock:
+            if self._probes.get(provider_id, 0) > now:
+                return False
+            self._probes[provider_id] = now + ttl
+            return True
+
+    def release_probe(self, provider_id):
+        with self._lock:
+            self._probes.pop(provider_id, None)
+
+    def delete(self, provider_id):
+        with self._lock:
+            self._states.pop(provider_id, None)
+            self._windows.pop(provider_id, None)
+            self._probes.pop(provider_id, None)
+
+class RedisCircuitStore:
+
+    '''
+    Circuit state shared by all workers through Redis
+    '''
+
+    # state is kept a day after the last request
+    expire = 86400
+
+    def __init__(self, client):
+        self.client = client
+
+    def _key(self, provider_id, suffix=''):
+        return f'swirl:circuit:{provider_id}{suffix}'
+
+    def get_state(self, provider_id):
+        data = self.client.get(self._key(provider_id))
+        return json.loads(data) if data else None
+
+    def set_state(self, provider_id, state):
+        self.client.set(self._key(provider_id), json.dumps(state), ex=self.expire)
+
+    def push(self, provider_id, entry, window):
+        key = self._key(provider_id, ':window')
+        pipe = self.client.pipeline()
+        pipe.lpush(key, json.dumps(entry))
+        pipe.ltrim(key, 0, window - 1)
+        pipe.expire(key, self.expire)
+        pipe.lrange(key, 0, window - 1)
+        return [json.loads(item) for item in pipe.execute()[-1]]
+
+    def get_window(self, provider_id):
+        return [json.loads(item) for item in self.client.lrange(self._key(provider_id, ':window'), 0, -1)]
+
+    def acquire_probe(self, provider_id, ttl):
+        return bool(self.client.set(self._key(provider_id, ':probe'), '1', nx=True, ex=max(int(ttl), 1)))
+
+    def release_probe(self, provider_id):
+        self.client.delete(self._key(provider_id, ':probe'))
+
+    def delete(self, provider_id):
+        self.client.delete(self._key(provider_id), self._key(provider_id, ':window'), self._key(provider_id, ':probe'))
+
+#############################################
+
+class CircuitBreaker:
+
+    '''
+    Per-SearchProvider circuit breaker over a rolling window of request outcomes and latencies
+    CLOSED: requests go through. OPEN, after SWIRL_CIRCUIT_BREAKER_FAILURES consecutive failures or an error rate of
+    SWIRL_CIRCUIT_BREAKER_ERROR_RATE: the provider is skipped. After SWIRL_CIRCUIT_BREAKER_COOLDOWN seconds one request
+    is let through (HALF_OPEN); success closes the circuit, failure opens it again
+    allow() is called by the search process and record() by whichever process ran the connector, usually a Celery
+    worker, so the state must be shared through Redis (SWIRL_CIRCUIT_BREAKER_REDIS_URL); without it the state is kept
+    in this process, which only works when the connectors run here too. If Redis fails, requests are let through
+    Pass redis_client to use another Redis-compatible client, e.g. fakeredis in tests
+    '''
+
+    def __init__(self, enabled=SWIRL_CIRCUIT_BREAKER, failures=SWIRL_CIRCUIT_BREAKER_FAILURES, error_rate=SWIRL_CIRCUIT_BREAKER_ERROR_RATE,
+                 window=SWIRL_CIRCUIT_BREAKER_WINDOW, min_samples=SWIRL_CIRCUIT_BREAKER_MIN_SAMPLES, cooldown=SWIRL_CIRCUIT_BREAKER_COOLDOWN,
+                 redis_url=SWIRL_CIRCUIT_BREAKER_REDIS_URL, redis_client=None, probe_timeout=None):
+        self.enabled = enabled
+        self.failures = failures
+        self.error_rate = error_rate
+        self.window = window
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        # a probe that hasn't reported by then is presumed lost, and another is let through
+        self.probe_timeout = probe_timeout or 2 * getattr(settings, 'SWIRL_TIMEOUT', 10)
+        self._memory = MemoryCircuitStore()
+        self._redis = RedisCircuitStore(redis_client) if redis_client is not None else None
+        self._redis_url = redis_url
+
+    def _store_call(self, method, *args):
+        if self._redis is None and self._redis_url:
+            try:
+                import redis
+                self._redis = RedisCircuitStore(redis.Redis.from_url(self._redis_url))
+            except Exception as err:
+                # the other processes' outcomes can't reach this one without it
+                logger.warning(f"circuit_breaker: redis unavailable at {self._redis_url}, circuit breaker off: {err}")
+                self._redis_url = ''
+                self.enabled = False
+                return None
+        if self._redis is not None:
+            try:
+                return getattr(self._redis, method)(*args)
+            except Exception as err:
+                logger.warning(f"circuit_breaker: redis {method} failed, letting requests through: {err}")
+                return None
+        return getattr(self._memory, method)(*args)
+
+    def _get_state(self, provider_id):
+        return self._store_call('get_state', provider_id) or {'state': CLOSED, 'consecutive_failures': 0, 'opened_at': None}
+
+    def allow(self, provider_id):
+        '''
+        True if a request may be sent to the provider; when an open circuit's cooldown is over, the first caller
+        gets True and the circuit goes HALF_OPEN until that probe reports back
+        '''
+        if not self.enabled:
+            return True
+        state = self._get_state(provider_id)
+        if state['state'] == CLOSED:
+            return True
+        if time.time() - (state['opened_at'] or 0) < self.cooldown:
+            return False
+        if not self._store_call('acquire_probe', provider_id, self.probe_timeout):
+            return False
+        state['state'] = HALF_OPEN
+        self._store_call('set_state', provider_id, state)
+        logger.info(f"circuit_breaker: provider {provider_id} HALF_OPEN, sending a probe request")
+        return True
+
+    def record(self, provider_id, success, latency=None):
+        '''
+        Records the outcome of a request to the provider, opening or closing its circuit as needed
+        '''
+        if not self.enabled:
+            return
+        entries = self._store_call('push', provider_id, [1 if success else 0, latency], self.window) or []
+        state = self._get_state(provider_id)
+        if success:
+            if state['state'] != CLOSED:
+                logger.info(f"circuit_breaker: provider {provider_id} responded, circuit CLOSED")
+                self._store_call('release_probe', provider_id)
+            state = {'state': CLOSED, 'consecutive_failures': 0, 'opened_at': None}
+        else:
+            state['consecutive_failures'] = state['consecutive_failures'] + 1
+            if state['state'] == HALF_OPEN:
+                state['state'] = OPEN
+                state['opened_at'] = time.time()
+                self._store_call('release_probe', provider_id)
+                logger.warning(f"circuit_breaker: provider {provider_id} probe failed, circuit OPEN")
+            elif state['state'] == CLOSED:
+                errors = len([entry for entry in entries if not entry[0]])
+                if state['consecutive_failures'] >= self.failures or (len(entries) >= self.min_samples and errors / len(entries) >= self.error_rate):
+                    state['state'] = OPEN
+                    state['opened_at'] = time.time()
+                    logger.warning(f"circuit_breaker: provider {provider_id} circuit OPEN after {state['consecutive_failures']} consecutive failures, {errors} of the last {len(entries)} requests failed")
+        self._store_call('set_state', provider_id, state)
+
+    def get_state(self, provider_id):
+        '''
+        The provider's circuit state with its rolling error rate and latency
+        '''
+        state = self._get_state(provider_id)
+        entries = self._store_call('get_window', provider_id) or []
+        latencies = [entry[1] for entry in entries if entry[0] and entry[1] is not None]
+        retry_at = None
+        if state['state'] == OPEN and state['opened_at']:
+            retry_at = state['opened_at'] + self.cooldown
+        return {
+            'state': state['state'],
+            'consecutive_failures': state['consecutive_failures'],
+            'samples': len(entries),
+            'error_rate': round(len([entry for entry in entries if not entry[0]]) / len(entries), 3) if entries else 0.0,
+            'avg_latency': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'p95_latency': round(percentile(latencies, 95), 3) if latencies else None,
+            'opened_at': state['opened_at'],
+            'retry_at': retry_at
+        }
+
+    def reset(self, provider_id):
+        self._store_call('delete', provider_id)
+
+circuit_breaker = CircuitBreaker()
+
+def reset_provider_circuit(sender, instance, **kwargs):
+    '''
+    post_save/post_delete receiver: an edited SearchProvider starts with a closed circuit
+    '''
+    circuit_breaker.reset(instance.id)
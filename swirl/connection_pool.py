@@ -0,0 +1,245 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+SWIRL_CONNECTION_POOL_MAX_PER_PROVIDER = getattr(settings, 'SWIRL_CONNECTION_POOL_MAX_PER_PROVIDER', 4)
+SWIRL_CONNECTION_POOL_IDLE_TIMEOUT = getattr(settings, 'SWIRL_CONNECTION_POOL_IDLE_TIMEOUT', 300)
+SWIRL_CONNECTION_POOL_CHECK_AFTER = getattr(settings, 'SWIRL_CONNECTION_POOL_CHECK_AFTER', 30)
+SWIRL_CONNECTION_POOL_WAIT = getattr(settings, 'SWIRL_CONNECTION_POOL_WAIT', 5)
+
+#############################################
+
+def get_connection_key(provider, *extra):
+    '''
+    Pool key for a provider's clients: its id and a hash of the fields the connection is made from,
+    so a client is never reused after the provider's url or credentials change
+    '''
+    fields = [provider.connector, provider.url, provider.credentials] + [str(value) for value in extra]
+    return (provider.id, hashlib.sha256(json.dumps(fields, default=str).encode('utf-8')).hexdigest())
+
+class PooledClient:
+
+    __slots__ = ('client', 'created', 'last_used', 'last_checked', 'in_use')
+
+    def __init__(self, client):
+        self.client = client
+        self.created = self.last_used = self.last_checked = time.time()
+        self.in_use = 0
+
+class ConnectionPool:
+
+    '''
+    Per-process pool of SDK clients and database connections for the SearchProvider connectors
+    Thread-safe SDK clients (Elasticsearch, MongoClient...) are shared: client() lends the one client for the key
+    Database connections are borrowed: connection() lends one to a single caller at a time, up to max_per_provider
+    A client idle for check_after seconds is health checked before it is used again, and closed after idle_timeout
+    A borrowed connection that raises is discarded; invalidate() drops all of a provider's clients
+    Keys include a hash of the provider's connection fields (get_connection_key), so an edited provider is never
+    served a client made from its old settings, in any process
+    '''
+
+    def __init__(self, max_per_provider=SWIRL_CONNECTION_POOL_MAX_PER_PROVIDER, idle_timeout=SWIRL_CONNECTION_POOL_IDLE_TIMEOUT,
+                 check_after=SWIRL_CONNECTION_POOL_CHECK_AFTER, wait=SWIRL_CONNECTION_POOL_WAIT):
+        self.max_per_provider = max_per_provider
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.wait = wait
+        self._pools = {}
+        self._closers = {}
+        self._stats = {}
+        self._lock = threading.Condition()
+        self._pid = os.getpid()
+
+    def _key_stats(self, key):
+        return self._stats.setdefault(key, {'provider_id': key[0], 'created': 0, 'reused': 0, 'failed_checks': 0,
+                                            'discarded': 0, 'evicted': 0, 'waits': 0})
+
+    def _close(self, key, pooled):
+        closer = self._closers.get(key)
+        try:
+            if closer:
+                closer(pooled.client)
+            elif hasattr(pooled.client, 'close'):
+                pooled.client.close()
+        except Exception as err:
+            logger.debug(f"connection_pool: error closing client for provider {key[0]}: {err}")
+
+    def _evict_idle(self, now):
+        # called with self._lock held; returns the clients to close
+        expired = []
+        for key, clients in self._pools.items():
+            for pooled in list(clients):
+                if not pooled.in_use and now - pooled.last_used > self.idle_timeout:
+                    clients.remove(pooled)
+                    self._key_stats(key)['evicted'] = self._key_stats(key)['evicted'] + 1
+                    expired.append((key, pooled))
+        return expired
+
+    def _healthy(self, pooled, check, now):
+        if not check or now - pooled.last_checked < self.check_after:
+            return True
+        try:
+            healthy = check(pooled.client) is not False
+        except Exception as err:
+            logger.info(f"connection_pool: health check failed: {err}")
+            healthy = False
+        pooled.last_checked = now
+        return healthy
+
+    def _reset_after_fork(self):
+        # called with self._lock held; clients opened by the parent can't be used here
+        if self._pid != os.getpid():
+            self._pools = {}
+            self._stats = {}
+            self._pid = os.getpid()
+
+    def _acquire(self, key, factory, close, check, shared):
+        now = time.time()
+        deadline = now + self.wait
+        with self._lock:
+            self._reset_after_fork()
+            if close:
+                self._closers[key] = close
+            to_close = self._evict_idle(now)
+            clients = self._pools.setdefault(key, [])
+            stats = self._key_stats(key)
+            pooled = None
+            while True:
+                for candidate in clients:
+                    if shared or not candidate.in_use:
+                        pooled = candidate
+                        break
+                if pooled or len(clients) < (1 if shared else self.max_per_provider):
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                stats['waits'] = stats['waits'] + 1
+                self._lock.wait(remaining)
+            if pooled:
+                pooled.in_use = pooled.in_use + 1
+        for item in to_close:
+            self._close(*item)
+
+        if pooled:
+            if self._healthy(pooled, check, time.time()):
+                with self._lock:
+                    stats['reused'] = stats['reused'] + 1
+                return pooled, True
+            with self._lock:
+                stats['failed_checks'] = stats['failed_checks'] + 1
+                if pooled in clients:
+                    clients.remove(pooled)
+                self._lock.notify_all()
+            self._close(key, pooled)
+
+        pooled = PooledClient(factory())
+        pooled.in_use = 1
+        with self._lock:
+            stats['created'] = stats['created'] + 1
+            clients = self._pools.setdefault(key, [])
+            if len(clients) < (1 if shared else self.max_per_provider):
+                clients.append(pooled)
+                return pooled, True
+        # the pool is full and none came back in time, this one is closed after use
+        return pooled, False
+
+    def _release(self, key, pooled, pooled_in, discard=False):
+        with self._lock:
+            pooled.in_use = max(pooled.in_use - 1, 0)
+            pooled.last_used = time.time()
+            clients = self._pools.get(key, [])
+            if discard and pooled in clients:
+                clients.remove(pooled)
+                self._key_stats(key)['discarded'] = self._key_stats(key)['discarded'] + 1
+            if discard and pooled.in_use:
+                # still in use by another borrower of a shared client, it closes on the last release
+                discard = False
+            closing = (discard or not pooled_in or not pooled in clients) and not pooled.in_use
+            self._lock.notify_all()
+        if closing:
+            self._close(key, pooled)
+
+    @contextmanager
+    def connection(self, key, factory, close=None, check=None):
+        '''
+        Borrow a connection for the block; factory() opens a new one, check(connection) returns False or raises if it is unusable
+        '''
+        pooled, pooled_in = self._acquire(key, factory, close, check, shared=False)
+        try:
+            yield pooled.client
+        except Exception:
+            self._release(key, pooled, pooled_in, discard=True)
+            raise
+        self._release(key, pooled, pooled_in)
+
+    @contextmanager
+    def client(self, key, factory, close=None, check=None):
+        '''
+        Use the shared, thread-safe client for the key for the block
+        Errors raised in the block are usually the provider's, not the client's, so the client is kept;
+        call invalidate() after a connection error
+        '''
+        pooled, pooled_in = self._acquire(key, factory, close, check, shared=True)
+        try:
+            yield pooled.client
+        finally:
+            self._release(key, pooled, pooled_in)
+
+    def invalidate(self, provider_id):
+        '''
+        Close and forget all clients of a provider, e.g. after it is edited
+        '''
+        to_close = []
+        with self._lock:
+            for key in [key for key in self._pools if key[0] == provider_id]:
+                for pooled in self._pools.pop(key):
+                    if not pooled.in_use:
+                        to_close.append((key, pooled))
+                self._stats.pop(key, None)
+            self._lock.notify_all()
+        for item in to_close:
+            self._close(*item)
+        return len(to_close)
+
+    def stats(self):
+        with self._lock:
+            stats = []
+            for key, key_stats in self._stats.items():
+                clients = self._pools.get(key, [])
+                entry = dict(key_stats)
+                entry['open'] = len(clients)
+                entry['in_use'] = len([pooled for pooled in clients if pooled.in_use])
+                stats.append(entry)
+            return stats
+
+    def close(self):
+        with self._lock:
+            pools = self._pools
+            self._pools = {}
+        for key, clients in pools.items():
+            for pooled in clients:
+                self._close(key, pooled)
+
+connection_pool = ConnectionPool()
+
+def invalidate_provider_clients(sender, instance, **kwargs):
+    '''
+    post_save/post_delete receiver: closes an edited or deleted SearchProvider's clients right away
+    Signals only run in the process that saved the provider, usually the web server; other processes, e.g. the
+    Celery workers, keep the old clients until idle_timeout, and won't lend them once the connection fields change
+    '''
+    connection_pool.invalidate(instance.id)
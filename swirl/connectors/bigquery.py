@@ -21,6 +21,7 @@ logger = get_task_logger(__name__)
 from google.cloud import bigquery
 
 from swirl.connectors.db_connector import DBConnector
+from swirl.connection_pool import connection_pool, get_connection_key
 
 ########################################
 ########################################
@@ -43,13 +44,16 @@ class BigQuery(DBConnector):
             self.status = "ERR_NO_CREDENTIALS"
             return
 
-        # connect to the db
+        # connect to the db - the client is shared by every search of this provider in this process
         try:
-            client = bigquery.Client()
+            with connection_pool.client(get_connection_key(self.provider), bigquery.Client) as client:
+                self.query_client(client)
         except Error as err:
             self.error(f"{err} connecting to {self.type}")
             self.status = 'ERR'
-            return
+        return
+
+    def query_client(self, client):
 
         # issue the count(*) query
         found = None
@@ -74,11 +78,8 @@ class BigQuery(DBConnector):
         except Error as err:
             self.error(f"{err} querying {self.type}")
             self.status = 'ERR'
-            client.close()
             return
 
-        client.close()
-
         self.column_names = dict(self.response[0]).keys()
         self.found = found
         return
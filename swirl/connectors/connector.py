@@ -7,10 +7,11 @@
 from sys import path
 from os import environ
 import time
-import copy
+import threading
+from contextlib import contextmanager
 
 import django
-from django.db import Error
+from django.db import Error, transaction
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
 
@@ -26,12 +27,36 @@ logger = get_task_logger(__name__)
 
 from swirl.models import Search, Result, SearchProvider
 from swirl.connectors.utils import get_mappings_dict
+from swirl.latency import get_provider_timeout
+from swirl.http_pool import http_pool
+from swirl.circuit_breaker import circuit_breaker
+from swirl.single_flight import single_flight, get_single_flight_key
+from swirl.result_cache import result_cache, get_result_cache_key, get_provider_cache_ttl
+from swirl.subscriptions import get_subscription
 from swirl.processors import *
 from swirl.processors.utils import result_processor_feedback_merge_records
+from swirl.processors.pipeline import ResultProcessorPipeline
+from swirl.processors.result_batch import to_json_results
 from swirl.processors.transform_query_processor_utils import get_query_processor_or_transform
 
 SWIRL_RP_SKIP_TAG = 'SW_RESULT_PROCESSOR_SKIP'
 
+# objects already loaded by the caller, used by Connector.__init__ instead of querying the database
+_prefetched = threading.local()
+
+@contextmanager
+def prefetched_objects(provider=None, search=None, user=None, query_transforms=None):
+    '''
+    Connectors created in this block (on this thread) use the given SearchProvider, Search and User if their ids match,
+    and look up QueryTransforms in query_transforms, a dict of (name, qrx_type): config_content, see swirl/snapshot.py
+    '''
+    previous = getattr(_prefetched, 'objects', None)
+    _prefetched.objects = {'provider': provider, 'search': search, 'user': user, 'query_transforms': query_transforms}
+    try:
+        yield
+    finally:
+        _prefetched.objects = previous
+
 ########################################
 
 class Connector:
@@ -64,18 +89,34 @@ class Connector:
         self.start_time = None
         self.search_user = None
         self.request_id = request_id
+        # set by federate_task for a rerun, which always queries the provider
+        self.bypass_cache = False
         self._swirl_timeout = getattr(settings,'SWIRL_TIMEOUT')
+        # shared, per-host keep-alive sessions for connectors that make HTTP requests
+        self.http_session = http_pool
+
+        prefetched = getattr(_prefetched, 'objects', None) or {}
+        self.query_transforms = prefetched.get('query_transforms')
 
         # get the provider and query
         try:
-            self.provider = SearchProvider.objects.get(id=self.provider_id)
-            self.search = Search.objects.get(id=self.search_id)
+            if prefetched.get('provider') and prefetched['provider'].id == self.provider_id:
+                self.provider = prefetched['provider']
+            else:
+                self.provider = SearchProvider.objects.get(id=self.provider_id)
+            if prefetched.get('search') and prefetched['search'].id == self.search_id:
+                self.search = prefetched['search']
+            else:
+                self.search = Search.objects.get(id=self.search_id)
         except ObjectDoesNotExist as err:
             self.error(f'ObjectDoesNotExist: {err}')
             return
 
         try:
-            self.search_user = User.objects.get(id=self.search.owner.id)
+            if prefetched.get('user') and prefetched['user'].id == self.search.owner_id:
+                self.search_user = prefetched['user']
+            else:
+                self.search_user = User.objects.get(id=self.search.owner.id)
         except ObjectDoesNotExist as err:
             logger.warning("unable to find search user, no auth check")
 
@@ -83,6 +124,14 @@ class Connector:
         self.response_mappings = get_mappings_dict(self.provider.response_mappings)
         self.result_mappings = get_mappings_dict(self.provider.result_mappings)
 
+        # per-provider latency budget
+        self._swirl_timeout = get_provider_timeout(self.provider)
+
+        # subscription updates only keep results not retrieved before
+        self.subscription = None
+        if self.update:
+            self.subscription = get_subscription(self.search, self.provider.id)
+
         self.status = 'READY'
 
     ########################################
@@ -126,18 +175,23 @@ class Connector:
                     if not self.auth:
                         self.status = 'NO_AUTH'
                         return False
-                    self.execute_search(session)
-                    if self.status not in ['FEDERATING', 'READY']:
-                        self.error(f"execute_search() failed, status {self.status}")
+                    cache_key = self.get_cache_key()
+                    if cache_key and self.load_cached_results(cache_key):
+                        res = self.save_results()
+                        if res:
+                            return res
+                        else:
+                            return False
+                    if self.hedge_lost():
+                        return False
+                    if not self.fetch_response(session):
                         return False
-                    if self.status in ['FEDERATING', 'READY']:
-                        self.normalize_response()
-                    if self.status not in ['FEDERATING', 'READY']:
-                        self.error(f"normalize_response() failed, status {self.status}")
+                    if self.hedge_lost():
                         return False
-                    else:
-                        self.process_results()
+                    self.process_results()
                     if self.status == 'READY':
+                        if cache_key:
+                            self.cache_results(cache_key)
                         res = self.save_results()
                         if res:
                             return res
@@ -162,6 +216,133 @@ class Connector:
 
     ########################################
 
+    def hedge_lost(self):
+
+        '''
+        True if this is a hedged request and another request to the provider already saved its results,
+        so this one can stop without processing them
+        '''
+
+        if self.update or not self.provider.hedge:
+            return False
+        # security review for 1.7 - OK, filtered by search ID
+        if Result.objects.filter(search_id=self.search, provider_id=self.provider.id).exists():
+            logger.info(f"{self}: hedged request already saved results, stopping")
+            return True
+        return False
+
+    ########################################
+
+    def fetch_response(self, session):
+
+        '''
+        Runs execute_search() and normalize_response(), returns False if either failed
+        Identical requests in flight at the same time share one response, see swirl/single_flight.py;
+        each still processes and saves its own results
+        '''
+
+        outcome, shared = single_flight.do(self.get_single_flight_key(), lambda: self._fetch_response(session), self._swirl_timeout)
+        if not shared:
+            return self.status in ['FEDERATING', 'READY']
+        self.found = outcome['found']
+        self.retrieved = outcome['retrieved']
+        self.results = outcome['results']
+        self.messages = self.messages + outcome['messages']
+        self.message(f"Shared the response to an identical request to {self.provider.name} that was already in flight")
+        if not outcome['status'] in ['FEDERATING', 'READY']:
+            self.status = 'ERROR'
+            self.save_results()
+            return False
+        self.status = outcome['status']
+        return True
+
+    def _fetch_response(self, session):
+
+        messages = len(self.messages)
+        try:
+            self.execute_search(session)
+        except Exception:
+            circuit_breaker.record(self.provider.id, False, time.time() - self.start_time)
+            raise
+        circuit_breaker.record(self.provider.id, self.status in ['FEDERATING', 'READY'], time.time() - self.start_time)
+        if self.status not in ['FEDERATING', 'READY']:
+            self.error(f"execute_search() failed, status {self.status}")
+        else:
+            self.normalize_response()
+            if self.status not in ['FEDERATING', 'READY']:
+                self.error(f"normalize_response() failed, status {self.status}")
+        # what an identical request in flight gets
+        return {
+            'status': self.status,
+            'found': self.found,
+            'retrieved': self.retrieved,
+            'results': self.results if self.status in ['FEDERATING', 'READY'] else [],
+            'messages': self.messages[messages:]
+        }
+
+    def get_single_flight_key(self):
+        user_id = None
+        if self.provider.authenticator or self.provider.eval_credentials:
+            # the provider searches with the user's own credentials
+            user_id = self.search.owner_id
+        return get_single_flight_key(self.provider, self.query_to_provider, self.search.sort, user_id=user_id)
+
+    ########################################
+
+    def get_cache_key(self):
+
+        '''
+        Returns the result cache key for this request, or None if the results should not be cached
+        Updates and reruns always query the provider
+        '''
+
+        if self.update or self.bypass_cache:
+            return None
+        if not get_provider_cache_ttl(self.provider):
+            return None
+        user_id = None
+        if self.provider.authenticator or self.provider.eval_credentials:
+            # the provider searches with the user's own credentials
+            user_id = self.search.owner_id
+        return get_result_cache_key(self.provider, self.query_to_provider, self.search.sort, self.query_string_to_provider,
+                                    user_id=user_id, skip=self._get_skip_processors_from_tags())
+
+    def load_cached_results(self, cache_key):
+
+        '''
+        Loads the processed results of an identical earlier request from the result cache, returns True on a hit
+        '''
+
+        cached = result_cache.get(cache_key)
+        if not cached:
+            return False
+        self.found = cached['found']
+        self.retrieved = cached['retrieved']
+        self.processed_results = cached['processed_results']
+        self.result_processor_json_feedback = cached['result_processor_json_feedback']
+        self.messages = self.messages + cached['messages']
+        self.message(f"Retrieved {self.retrieved} results for: {self.provider.name} from the result cache, cached {int(time.time() - cached['cached_at'])}s ago")
+        self.status = 'READY'
+        return True
+
+    def cache_results(self, cache_key):
+
+        '''
+        Stores the processed results in the result cache for the provider's TTL
+        '''
+
+        self.processed_results = to_json_results(self.processed_results)
+        result_cache.set(cache_key, {
+            'found': self.found,
+            'retrieved': self.retrieved,
+            'processed_results': self.processed_results,
+            'result_processor_json_feedback': self.result_processor_json_feedback,
+            'messages': self.messages,
+            'cached_at': time.time()
+        }, get_provider_cache_ttl(self.provider))
+
+    ########################################
+
     def process_query(self):
 
         '''
@@ -180,7 +361,8 @@ class Connector:
         for processor in processor_list:
             logger.debug(f"{self}: invoking query processor: {processor}")
             try:
-                processed_query = get_query_processor_or_transform(processor, query_temp, self.provider.query_mappings, self.provider.tags, self.search_user).process()
+                processed_query = get_query_processor_or_transform(processor, query_temp, self.provider.query_mappings, self.provider.tags, self.search_user,
+                                                                   query_transforms=self.query_transforms).process()
             except (NameError, TypeError, ValueError) as err:
                 self.error(f'{processor}: {err.args}, {err}')
                 return
@@ -323,39 +505,32 @@ class Connector:
 
         if not processor_list:
             self.processed_results = self.results
+            if self.subscription:
+                self.processed_results = self.subscription.filter(self.processed_results)
+                self.retrieved = len(self.processed_results)
             self.status = 'READY'
             return
 
-        processors_to_skip = self._get_skip_processors_from_tags()
-
-        for processor in processor_list:
-            if processor in processors_to_skip:
-                logger.debug(f"{self}: skipping processor: process results {processor} becasue it was in a skip tag of the search")
-                continue
-            logger.debug(f"{self}: invoking processor: process results {processor}")
-            last_results = copy.deepcopy(self.results)
-            try:
-                proc = alloc_processor(processor=processor)(self.results, self.provider, self.query_string_to_provider, request_id=self.request_id,
-                                                            result_processor_json_feedback=self.result_processor_json_feedback)
-                modified = proc.process()
-                self.results = proc.get_results()
-                logger.debug(f'provider : {self.provider.name} processor: {processor} modified : {modified}')
-                ## Check if this processor generated feed back and if so, remember it and merge it in to the exsiting
-                if self.results and 'result_processor_feedback' in self.results[-1]:
-                    self.result_processor_json_feedback =  self.results.pop(-1)
-            except (NameError, TypeError, ValueError) as err:
-                self.error(f'{processor}: {err.args}, {err}')
-                return
-            if modified < 0:
-                # if len(last_results) + modified != len(self.results):
-                #     self.warning(f"{processor} reported {modified} modified results, but returned {len(self.results)}!!")
-                self.message(f"{processor} deleted {-1*modified} results from: {self.provider.name}")
+        pipeline = ResultProcessorPipeline(processor_list, self.provider, self.query_string_to_provider, request_id=self.request_id,
+                                           result_processor_json_feedback=self.result_processor_json_feedback,
+                                           skip=self._get_skip_processors_from_tags(),
+                                           item_filter=self.subscription.filter if self.subscription else None)
+        failed = None
+        try:
+            self.results = pipeline.run(self.results)
+        except (NameError, TypeError, ValueError) as err:
+            failed = err
+        self.result_processor_json_feedback = pipeline.result_processor_json_feedback
+        for stage in pipeline.stages:
+            timing = f"({stage['items']} items, {stage['time'] * 1000:.1f}ms)"
+            if stage['modified'] < 0:
+                self.message(f"{stage['processor']} deleted {-1*stage['modified']} results from: {self.provider.name} {timing}")
             else:
-                # if len(self.results) != len(last_results):
-                #     self.warning(f"{processor} updated {modified} results but returned {len(self.results)}!!")
-                self.message(f"{processor} updated {modified} results from: {self.provider.name}")
-            del last_results
+                self.message(f"{stage['processor']} updated {stage['modified']} results from: {self.provider.name} {timing}")
         # end for
+        if failed:
+            self.error(f'{pipeline.current}: {failed.args}, {failed}')
+            return
         self.processed_results = self.results if self.results else []
         self.status = 'READY'
         self.retrieved = len(self.processed_results) # adjust retrieved in case processing effected the size of the list.
@@ -374,6 +549,9 @@ class Connector:
         # timing
         end_time = time.time()
 
+        # the storage boundary: ResultItems become json_results dicts
+        self.processed_results = to_json_results(self.processed_results)
+
         # gather processor lists
         query_processors = []
         query_processors = query_processors + self.search.pre_query_processors + self.provider.query_processors
@@ -397,6 +575,8 @@ class Connector:
             # add new flag
             for r in self.processed_results:
                 r['new'] = True
+            if self.subscription and self.subscription.dropped:
+                self.message(f"Skipped {self.subscription.dropped} results already retrieved from: {result.searchprovider}")
             try:
                 result.messages = result.messages + self.messages
                 result.found = max(result.found, self.found)
@@ -411,11 +591,26 @@ class Connector:
             except Error as err:
                 self.error(f'save_results() update failed: {err.args}, {err}', save_results=False)
                 return False
+            if self.subscription:
+                self.subscription.save(self.processed_results)
             logger.debug(f"{self}: Update: added {len(self.processed_results)} new items to result {result.id}")
             self.message(f"Retrieved {len(self.processed_results)} new results from: {result.searchprovider}")
             return result.retrieved
         # end if
 
+        if self.provider.hedge:
+            # a hedged request may be racing this one, only the first to finish saves its results
+            with transaction.atomic():
+                Search.objects.select_for_update().filter(id=self.search.id).first()
+                if Result.objects.filter(search_id=self.search, provider_id=self.provider.id).exists():
+                    logger.info(f"{self}: hedged request already saved results, discarding")
+                    return False
+                return self._create_result(query_processors, result_processors, end_time)
+
+        return self._create_result(query_processors, result_processors, end_time)
+
+    def _create_result(self, query_processors, result_processors, end_time):
+
         try:
             logger.debug(f"{self}: Result.create()")
             new_result = Result.objects.create(search_id=self.search, searchprovider=self.provider.name, provider_id=self.provider.id,
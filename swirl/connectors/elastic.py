@@ -19,6 +19,7 @@ logger = get_task_logger(__name__)
 
 from swirl.connectors.utils import bind_query_mappings
 from swirl.connectors.verify_ssl_common import VerifyCertsCommon
+from swirl.connection_pool import connection_pool, get_connection_key
 
 from elasticsearch import Elasticsearch
 from elasticsearch import *
@@ -96,21 +97,12 @@ class Elastic(VerifyCertsCommon):
             self.status = "ERR_NO_URL"
             return
 
-        try:
+        def new_client():
             if verify_certs:
-                es = Elasticsearch(basic_auth=tuple(auth),hosts=url,verify_certs=verify_certs,ca_certs=ca_certs)
-            else:
-                if auth:
-                    es = Elasticsearch(basic_auth=tuple(auth),hosts=url)
-                else:
-                    es = Elasticsearch(hosts=url)
-
-        except NameError as err:
-            self.error(f'NameError: {err}')
-        except TypeError as err:
-            self.error(f'TypeError: {err}')
-        except Exception as err:
-            self.error(f"Exception: {err}")
+                return Elasticsearch(basic_auth=tuple(auth),hosts=url,verify_certs=verify_certs,ca_certs=ca_certs)
+            if auth:
+                return Elasticsearch(basic_auth=tuple(auth),hosts=url)
+            return Elasticsearch(hosts=url)
 
         # extract index (str)
         index_name_pattern = r"index='([^']+)'"
@@ -141,8 +133,11 @@ class Elastic(VerifyCertsCommon):
 
         response = None
         try:
-            response = es.search(index=index, query=query, size=size)
+            # the client is shared by every search of this provider in this process
+            with connection_pool.client(get_connection_key(self.provider, verify_certs, ca_certs), new_client, check=lambda es: es.ping()) as es:
+                response = es.search(index=index, query=query, size=size)
         except ConnectionError as err:
+            connection_pool.invalidate(self.provider.id)
             self.error(f"es.search reports: {err}")
         except NotFoundError:
             self.error(f"es.search reports HTTP/404 (Not Found)")
@@ -154,6 +149,8 @@ class Elastic(VerifyCertsCommon):
             self.error(f"es.search reports HTTP/403 (Access Denied)")
         except ApiError as err:
             self.error(f"es.search reports '{err}'")
+        except (NameError, TypeError) as err:
+            self.error(f'{type(err).__name__}: {err}')
 
         self.response = response
 
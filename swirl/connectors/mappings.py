@@ -18,12 +18,12 @@ django.setup()
 
 # types for use with mappings
 
-QUERY_MAPPING_KEYS = [ 'DATE_SORT', 'RELEVANCY_SORT', 'PAGE' ]
+QUERY_MAPPING_KEYS = [ 'DATE_SORT', 'RELEVANCY_SORT', 'PAGE', 'DATE_AFTER' ]
 RESPONSE_MAPPING_KEYS = [ 'FOUND', 'RETRIEVED', 'RESULTS', 'RESULT' ]
 # RESULT_MAPPING_KEYS = [ 'BLOCK' ]
 MAPPING_KEYS = QUERY_MAPPING_KEYS + RESPONSE_MAPPING_KEYS #+ RESULT_MAPPING_KEYS
 
-QUERY_MAPPING_VARIABLES = [ 'RESULT_INDEX', 'RESULT_ZERO_INDEX', 'PAGE_INDEX' ]
+QUERY_MAPPING_VARIABLES = [ 'RESULT_INDEX', 'RESULT_ZERO_INDEX', 'PAGE_INDEX', 'WATERMARK_DATE' ]
 RESULT_MAPPING_VARIABLES = []
 MAPPING_VARIABLES = QUERY_MAPPING_VARIABLES + RESULT_MAPPING_VARIABLES
 
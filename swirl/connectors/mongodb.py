@@ -21,6 +21,7 @@ from celery.utils.log import get_task_logger
 logger = get_task_logger(__name__)
 
 from swirl.connectors.connector import Connector
+from swirl.connection_pool import connection_pool, get_connection_key
 from swirl.processors.utils import get_tag
 from swirl.connectors.utils import bind_query_mappings
 
@@ -90,16 +91,28 @@ class MongoDB(Connector):
         collection_name = config[1]
 
         try:
-            client = MongoClient(mongo_uri, server_api=ServerApi('1'))
+            # the client is shared by every search of this provider in this process
+            with connection_pool.client(get_connection_key(self.provider), lambda: MongoClient(mongo_uri, server_api=ServerApi('1')),
+                                        check=lambda client: client.admin.command('ping')) as client:
+                self.query_client(client, database_name, collection_name)
+        except Exception as err:
+            connection_pool.invalidate(self.provider.id)
+            self.error(f"{err} connecting to {self.type}")
+            self.status = 'ERR'
+        return
+
+    def query_client(self, client, database_name, collection_name):
+
+        try:
             db = client[database_name]
             collection = db[collection_name]
             # warning: query to provider is a json object
             found = collection.count_documents(self.query_to_provider)
 
         except Exception as err:
+            connection_pool.invalidate(self.provider.id)
             self.error(f"{err} connecting to {self.type}")
             self.status = 'ERR'
-            client.close()
             return
  
         logger.debug(f"{self}: count {found}")
@@ -125,10 +138,7 @@ class MongoDB(Connector):
         except Exception as err:
             self.error(f"{err} querying {self.type}")
             self.status = 'ERR'
-            client.close()
             return
-        finally:
-            client.close()
 
         self.found = found
         self.retrieved = len(self.response)
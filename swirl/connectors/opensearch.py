@@ -20,6 +20,7 @@ logger = get_task_logger(__name__)
 
 from swirl.connectors.utils import bind_query_mappings
 from swirl.connectors.verify_ssl_common import VerifyCertsCommon
+from swirl.connection_pool import connection_pool, get_connection_key
 import json
 
 from opensearchpy import OpenSearch as opensearch
@@ -81,7 +82,7 @@ class OpenSearch(VerifyCertsCommon):
 
         logger.debug(f"{self}: host: {host}, port: {port}")
 
-        client = None
+        verify_certs = ca_certs = None
         if self.provider.credentials:
             bearer = None
             (username,password,verify_certs,ca_certs,bearer)=self.get_creds()
@@ -95,8 +96,8 @@ class OpenSearch(VerifyCertsCommon):
             # Optional client certificates if you don't want to use HTTP basic authentication.
             # client_cert_path = '/full/path/to/client.pem'
             # client_key_path = '/full/path/to/client-key.pem'
-            try:
-                client = opensearch(
+            def new_client():
+                return opensearch(
                     hosts = [{'host': host, 'port': port}],
                     http_compress = True, # enables gzip compression for request bodies
                     http_auth = auth,
@@ -108,19 +109,11 @@ class OpenSearch(VerifyCertsCommon):
                     ssl_show_warn = False,
                     ca_certs = ca_certs
                 )
-            except SSLError:
-                self.error(f"client.search reports SSL Error")
-            except ConnectionError as err:
-                self.error(f"client.search reports: {err}")
-            except NameError as err:
-                self.error(f'NameError: {err}')
-            except TypeError as err:
-                self.error(f'TypeError: {err}')
         else:
             # no credentials!
             logger.debug("no credentials!")
-            try:
-                client = opensearch(
+            def new_client():
+                return opensearch(
                     hosts = [{'host': host, 'port': port}],
                     http_compress = True, # enables gzip compression for request bodies
                     use_ssl = False,
@@ -128,25 +121,14 @@ class OpenSearch(VerifyCertsCommon):
                     ssl_assert_hostname = False,
                     ssl_show_warn = False
                 )
-            except SSLError as err:
-                self.error(f"client.search reports SSL Error: {err}")
-            except ConnectionError as err:
-                self.error(f"client.search reports: {err}")
-            except NameError as err:
-                self.error(f'NameError: {err}')
-            except TypeError as err:
-                self.error(f'TypeError: {err}')
         # end if
 
-        if not client:
-            self.error("client failed to initialize")
-            self.status = "ERR_CLIENT_INIT_FAILED"
-            return
-
         response = None
         try:
-            # security review 1.7 - OK - limited to Elasticsearch
-            response = client.search(size=self.provider.results_per_query, index=self.query_mappings['index_name'], body=self.query_to_provider)
+            # the client is shared by every search of this provider in this process
+            with connection_pool.client(get_connection_key(self.provider, verify_certs, ca_certs), new_client, check=lambda client: client.ping()) as client:
+                # security review 1.7 - OK - limited to Elasticsearch
+                response = client.search(size=self.provider.results_per_query, index=self.query_mappings['index_name'], body=self.query_to_provider)
         # to do: not sure we need this error
         except SSLError as err:
             self.error(f"client.search reports SSL Error: {err}")
@@ -159,9 +141,13 @@ class OpenSearch(VerifyCertsCommon):
         except AuthorizationException:
             self.error(f"client.search reports HTTP/403 (Access Denied)")
         except ConnectionError as err:
+            connection_pool.invalidate(self.provider.id)
             self.error(f"client.search reports: {err}")
         except TransportError as err:
             self.error(f"client.search reports Transport Error: {err}")
+        except (NameError, TypeError) as err:
+            self.error(f'{type(err).__name__}: {err}')
+            self.status = "ERR_CLIENT_INIT_FAILED"
 
         self.response = response
         return
@@ -21,6 +21,7 @@ from celery.utils.log import get_task_logger
 logger = get_task_logger(__name__)
 
 from swirl.connectors.db_connector import DBConnector
+from swirl.connection_pool import connection_pool, get_connection_key
 from swirl.connectors.utils import bind_query_mappings
 
 ########################################
@@ -49,8 +50,18 @@ class Oracle(DBConnector):
         dsn = self.provider.url
 
         try:
-            # Create a new connection
-            conn = oracledb.connect(username, password, dsn)
+            with connection_pool.connection(get_connection_key(self.provider), lambda: oracledb.connect(username, password, dsn), check=lambda conn: conn.ping()) as conn:
+                self.query_connection(conn)
+        except oracledb.DatabaseError as e:
+            error, = e.args
+            self.error(f"Database error: {error.code}, {error.message}")
+            self.status = 'ERR'
+        return
+
+    def query_connection(self, conn):
+
+        cursor = None
+        try:
             cursor = conn.cursor()
             cursor.execute(self.count_query)
             found = cursor.fetchone()[0]
@@ -59,6 +70,7 @@ class Oracle(DBConnector):
                 self.status = 'READY'
                 self.found = 0
                 self.retrieved = 0
+                cursor.close()
                 return
             
             cursor.execute(self.query_to_provider)
@@ -69,8 +81,8 @@ class Oracle(DBConnector):
             error, = e.args
             self.error(f"Database error: {error.code}, {error.message}")
             self.status = 'ERR'
-            cursor.close()
-            conn.close()
+            if cursor:
+                cursor.close()
             return
 
         try:
@@ -82,7 +94,6 @@ class Oracle(DBConnector):
             self.error(f"{err} converting JSON")
 
         cursor.close()
-        conn.close()
 
         self.found = found
         self.retrieved = self.provider.results_per_query
@@ -17,6 +17,7 @@ from celery.utils.log import get_task_logger
 logger = get_task_logger(__name__)
 
 from swirl.connectors.vdb_connector import VectorDBConnector
+from swirl.connection_pool import connection_pool, get_connection_key
 from pinecone import Pinecone
 
 class PineconeDB(VectorDBConnector):
@@ -38,10 +39,11 @@ class PineconeDB(VectorDBConnector):
             return 
 
         try:
-            pc = Pinecone(api_key=credentials)
-            index = pc.Index(index_name)
-            response = index.query(vector=self.vector_to_provider,top_k=self.provider.results_per_query, include_metadata=True, include_values=False)
+            # the index handle is shared by every search of this provider in this process
+            with connection_pool.client(get_connection_key(self.provider), lambda: Pinecone(api_key=credentials).Index(index_name)) as index:
+                response = index.query(vector=self.vector_to_provider,top_k=self.provider.results_per_query, include_metadata=True, include_values=False)
         except Exception as err:
+            connection_pool.invalidate(self.provider.id)
             self.error(f"{err} connecting to {self.type}")
             self.status = 'ERR'
             return
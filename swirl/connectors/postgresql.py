@@ -24,6 +24,7 @@ except ImportError as e:
     logger.error(f"postgresql.py: Error: can't load psycopg2: {e}, see https://docs.swirlaiconnect.com/Developer-Reference.html#postgresql")
 
 from swirl.connectors.db_connector import DBConnector
+from swirl.connection_pool import connection_pool, get_connection_key
 
 ########################################
 ########################################
@@ -45,12 +46,24 @@ class PostgreSQL(DBConnector):
             self.status = 'ERR_INVALID_CONFIG'
             return
 
-        connection = None
-        try:
+        def new_connection():
             connection = psycopg2.connect(host=config[0], port=config[1], database=config[2], user=config[3], password=config[4])
+            # read only queries, so a pooled connection never sits idle in a transaction
+            connection.autocommit = True
+            return connection
+
+        def check(connection):
+            with connection.cursor() as cursor:
+                cursor.execute('select 1')
+
+        try:
+            with connection_pool.connection(get_connection_key(self.provider), new_connection, check=check) as connection:
+                self.query_connection(connection)
         except Error as err:
             self.error(f"{err} connecting to {self.type}")
-            return
+        return
+
+    def query_connection(self, connection):
 
         # issue the count(*) query
         cursor = None
@@ -107,7 +120,6 @@ class PostgreSQL(DBConnector):
         self.response = rows
 
         cursor.close()
-        connection.close()
 
         self.column_names = column_names
         self.found = found
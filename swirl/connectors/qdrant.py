@@ -19,6 +19,7 @@ from celery.utils.log import get_task_logger
 logger = get_task_logger(__name__)
 
 from swirl.connectors.vdb_connector import VectorDBConnector
+from swirl.connection_pool import connection_pool, get_connection_key
 from qdrant_client import QdrantClient
 
 
@@ -37,15 +38,17 @@ class QdrantDB(VectorDBConnector):
             return
 
         try:
-            client = QdrantClient(url=qdrant_url, api_key=api_key)
-            response = client.search(
-                collection_name,
-                query_vector=self.vector_to_provider,
-                limit=self.provider.results_per_query,
-                with_payload=True,
-                with_vectors=False,
-            )
+            # the client is shared by every search of this provider in this process
+            with connection_pool.client(get_connection_key(self.provider), lambda: QdrantClient(url=qdrant_url, api_key=api_key)) as client:
+                response = client.search(
+                    collection_name,
+                    query_vector=self.vector_to_provider,
+                    limit=self.provider.results_per_query,
+                    with_payload=True,
+                    with_vectors=False,
+                )
         except Exception as err:
+            connection_pool.invalidate(self.provider.id)
             self.error(f"{err} connecting to {self.type}")
             self.status = "ERR"
             return
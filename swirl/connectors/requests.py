@@ -8,7 +8,9 @@ from sys import path
 from os import environ
 from datetime import datetime
 
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import django
 
@@ -17,6 +19,8 @@ path.append(swirl_setdir()) # path to settings.py file
 environ.setdefault('DJANGO_SETTINGS_MODULE', 'swirl_server.settings')
 django.setup()
 
+from django.conf import settings
+
 import requests
 
 from requests.auth import HTTPBasicAuth, HTTPDigestAuth, HTTPProxyAuth
@@ -27,6 +31,7 @@ from urllib3.exceptions import NewConnectionError
 
 from jsonpath_ng import parse
 from jsonpath_ng.exceptions import JsonPathParserError
+from swirl.processors.mapping_plan import get_jsonpath
 
 from http import HTTPStatus
 
@@ -38,9 +43,55 @@ from swirl.connectors.utils import bind_query_mappings
 
 from swirl.connectors.connector import Connector
 from swirl.connectors.verify_ssl_common import VerifyCertsCommon
+from swirl.connectors.stream_parser import StreamingJsonParser, StreamingXmlParser, get_simple_path
+from swirl.processors.utils import get_tag
 
 import xmltodict
 
+SWIRL_PAGE_FETCH_WORKERS = getattr(settings, 'SWIRL_PAGE_FETCH_WORKERS', 5)
+SWIRL_PAGE_RATE_LIMIT = getattr(settings, 'SWIRL_PAGE_RATE_LIMIT', 5)
+SWIRL_STREAMING_PARSE = getattr(settings, 'SWIRL_STREAMING_PARSE', False)
+SWIRL_STREAMING_PARSE_MAX_BYTES = getattr(settings, 'SWIRL_STREAMING_PARSE_MAX_BYTES', 10485760)
+SWIRL_STREAMING_PARSE_CHUNK_SIZE = 65536
+# per-provider switch, StreamingParse or StreamingParse:false
+SWIRL_STREAMING_PARSE_TAG = 'StreamingParse'
+
+########################################
+
+class PageRateLimiter:
+
+    '''
+    Spaces out page requests to the same provider to at most SWIRL_PAGE_RATE_LIMIT per second, across threads
+    '''
+
+    def __init__(self, rate=SWIRL_PAGE_RATE_LIMIT):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, provider_id):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next.get(provider_id, now))
+            self._next[provider_id] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+page_rate_limiter = PageRateLimiter()
+
+def close_page_response(future):
+    '''
+    Done callback for a page fetched ahead that was never read: closes the response, so its connection goes
+    back to the host pool
+    '''
+    if future.cancelled() or future.exception() is not None:
+        return
+    response = future.result()
+    if response is not None:
+        response.close()
+
 ########################################
 ########################################
 
@@ -102,6 +153,14 @@ class Requests(VerifyCertsCommon):
                 sort_query = sort_query + '&' + self.query_mappings['RELEVANCY_SORT'] + query_to_provider[query_to_provider.rfind('&'):]
                 query_to_provider = sort_query
 
+        if self.subscription and 'DATE_AFTER' in self.query_mappings:
+            # subscription update: only ask for results published since the last one retrieved
+            date_after = self.subscription.date_after()
+            amp_index = query_to_provider.rfind('&')
+            if date_after and amp_index >= 0:
+                date_query = self.query_mappings['DATE_AFTER'].replace('WATERMARK_DATE', urllib.parse.quote_plus(date_after))
+                query_to_provider = query_to_provider[:amp_index] + '&' + date_query + query_to_provider[amp_index:]
+
         self.query_to_provider = query_to_provider
 
         return
@@ -130,6 +189,146 @@ class Requests(VerifyCertsCommon):
             ret_headers.update(headers)
         return ret_headers
 
+    def get_page_queries(self, pages):
+        '''
+        Returns the query for each page, with the RESULT_INDEX, RESULT_ZERO_INDEX or PAGE_INDEX offset bound
+        '''
+        if not 'PAGE' in self.query_mappings:
+            return [self.query_to_provider]
+        page_queries = []
+        prefix = self.query_to_provider[:self.query_to_provider.rfind('&')]
+        suffix = self.query_to_provider[self.query_to_provider.rfind('&'):]
+        for page in range(0, pages):
+            start = 1 + page * 10
+            page_spec = None
+            if 'RESULT_INDEX' in self.query_mappings['PAGE']:
+                page_spec = self.query_mappings['PAGE'].replace('RESULT_INDEX',str(start))
+            if 'RESULT_ZERO_INDEX' in self.query_mappings['PAGE']:
+                page_spec = self.query_mappings['PAGE'].replace('RESULT_ZERO_INDEX',str(start-1))
+            if 'PAGE_INDEX' in self.query_mappings['PAGE']:
+                page_spec = self.query_mappings['PAGE'].replace('PAGE_INDEX',str(page+1))
+            if page_spec:
+                page_queries.append(prefix + '&' + page_spec + suffix)
+            else:
+                self.warning(f"failed to resolve PAGE query mapping: {self.query_mappings['PAGE']}")
+                page_queries.append(self.query_to_provider)
+        # end for
+        return page_queries
+
+    def get_request_kwargs(self, session=None):
+        '''
+        Returns the auth, headers and verify arguments for send_request, the same for every page
+        '''
+
+        # dictionary of authentication types permitted in the upcoming eval
+        http_auth_dispatch = {'HTTPBasicAuth': HTTPBasicAuth, 'HTTPDigestAuth': HTTPDigestAuth, 'HTTProxyAuth': HTTPProxyAuth}
+
+        if self.provider.credentials:
+            if session and self.provider.eval_credentials and '{credentials}' in self.provider.credentials:
+                credentials = session[self.provider.eval_credentials]
+                self.provider.credentials = self.provider.credentials.replace('{credentials}', credentials)
+            if self.provider.credentials.startswith('HTTP'):
+                # handle HTTPBasicAuth('user', 'pass') etc
+                http_auth = http_auth_parse(self.provider.credentials)
+                return {'auth': http_auth_dispatch.get(http_auth[0])(*http_auth[1]), 'headers': self._put_configured_headers()}
+            if self.provider.credentials.startswith('bearer='):
+                # populate with bearer token
+                (username,password,verify_certs,ca_certs,bearer)=self.get_creds(def_verify_certs=True)
+                headers = {
+                    "Authorization": f"Bearer {bearer}"
+                }
+                if ca_certs and os.path.exists(ca_certs):
+                    return {'headers': self._put_configured_headers(headers), 'verify': ca_certs}
+                return {'headers': self._put_configured_headers(headers), 'verify': verify_certs}
+            if self.provider.credentials.startswith('X-Api-Key='):
+                headers = {
+                    "X-Api-Key": f"{self.provider.credentials.split('X-Api-Key=')[1]}"
+                }
+                logger.debug(f"{self}: sending request with auth header X-Api-Key")
+                return {'headers': self._put_configured_headers(headers)}
+            # all others
+        # end if
+        return {'headers': self._put_configured_headers()}
+
+    def fetch_page(self, page_query, request_kwargs):
+        '''
+        Sends one page request, waiting for the provider's page rate limit first
+        '''
+        page_rate_limiter.wait(self.provider.id)
+        return self.send_request(page_query, query=self.query_string_to_provider, **request_kwargs)
+
+    def get_streaming_paths(self):
+        '''
+        Returns the RESULTS path and the FOUND/RETRIEVED paths if streaming parse is on for the provider and
+        they are plain dotted keys, otherwise None
+        '''
+        streaming = SWIRL_STREAMING_PARSE
+        tag = get_tag(SWIRL_STREAMING_PARSE_TAG, self.provider.tags)
+        if tag:
+            streaming = not tag.lower() in ('false', 'no', 'off', '0')
+        if not streaming:
+            return None
+        results_path = get_simple_path(self.response_mappings.get('RESULTS'))
+        other_paths = [get_simple_path(self.response_mappings.get(mapping)) for mapping in ('FOUND', 'RETRIEVED')]
+        if results_path is None or None in other_paths:
+            logger.debug(f"{self}: response_mappings are not plain dotted keys, not streaming")
+            return None
+        return results_path, other_paths
+
+    def parse_response(self, response, streaming_paths=None, limit=0):
+        '''
+        Returns the response as json_data: XML is converted with xmltodict, a list of lists (header row first)
+        and ThoughtSpot contents become a list of dicts
+        With streaming_paths the body is read incrementally, only up to the first limit results at the RESULTS path
+        and at most SWIRL_STREAMING_PARSE_MAX_BYTES
+        '''
+        content_type = response.headers['Content-Type']
+        is_xml = 'text/xml' in content_type or 'application/xml' in content_type or 'application/atom+xml' in content_type
+
+        if streaming_paths and (streaming_paths[0] or not is_xml):
+            results_path, other_paths = streaming_paths
+            parser_class = StreamingXmlParser if is_xml else StreamingJsonParser
+            parser = parser_class(results_path, other_paths, limit, SWIRL_STREAMING_PARSE_MAX_BYTES)
+            try:
+                json_data = parser.parse(response.iter_content(chunk_size=SWIRL_STREAMING_PARSE_CHUNK_SIZE))
+            except ValueError as err:
+                logger.warning(f"Error parsing response as JSON: {err}")
+                return None
+            finally:
+                # a partly read body can't go back to the pool, close it
+                response.close()
+            if parser.truncated:
+                self.warning(f"response from {self.provider.name} exceeded {SWIRL_STREAMING_PARSE_MAX_BYTES} bytes, kept {parser.count} results")
+            if parser.stopped:
+                logger.debug(f"{self}: stopped reading after {parser.count} results")
+            return json_data
+
+        if is_xml:
+            return xmltodict.parse(response.text)
+
+        if not 'application/json' in content_type:
+            logger.debug(f"content header not xml or explicitly json, assuming json")
+        json_data = None
+        try:
+            raw_json_data = response.json()
+            # Check for list of lists format
+            if isinstance(raw_json_data, list) and raw_json_data and isinstance(raw_json_data[0], list):
+                headers = raw_json_data[0]
+                json_data = [dict(zip(headers, sublist)) for sublist in raw_json_data[1:]]
+            # Check for Thoughtspot format
+            elif isinstance(raw_json_data, dict) and "contents" in raw_json_data:
+                json_data = []
+                for content in raw_json_data["contents"]:
+                    if "column_names" in content and "data_rows" in content:
+                        headers = [column_name.replace(" ", "_") for column_name in content["column_names"]]
+                        for row in content["data_rows"]:
+                            json_data.append(dict(zip(headers, row)))
+            else:
+                json_data = raw_json_data
+        except ValueError as err:
+            logger.warning(f"Error parsing response as JSON: {err}")
+        return json_data
+
     def execute_search(self, session=None):
 
         logger.debug(f"{self}: execute_search()")
@@ -144,275 +343,223 @@ class Requests(VerifyCertsCommon):
                 if (int(self.provider.results_per_query) % 10) > 0:
                     pages = pages + 1
 
-        # issue the query
-        start = 1
-        mapped_responses = []
-
-        for page in range(0, pages):
+        page_queries = self.get_page_queries(pages)
+        # check the query
+        if "" in page_queries:
+            self.error("page_query is blank")
+            return
 
-            if 'PAGE' in self.query_mappings:
-                page_query = self.query_to_provider[:self.query_to_provider.rfind('&')]
-                page_spec = None
-                if 'RESULT_INDEX' in self.query_mappings['PAGE']:
-                    page_spec = self.query_mappings['PAGE'].replace('RESULT_INDEX',str(start))
-                if 'RESULT_ZERO_INDEX' in self.query_mappings['PAGE']:
-                    page_spec = self.query_mappings['PAGE'].replace('RESULT_ZERO_INDEX',str(start-1))
-                if 'PAGE_INDEX' in self.query_mappings['PAGE']:
-                    page_spec = self.query_mappings['PAGE'].replace('PAGE_INDEX',page+1)
-                if page_spec:
-                    page_query = page_query + '&' + page_spec + self.query_to_provider[self.query_to_provider.rfind('&'):]
-                else:
-                    self.warning(f"failed to resolve PAGE query mapping: {self.query_mappings['PAGE']}")
-                    page_query = self.query_to_provider
-            else:
-                page_query = self.query_to_provider
+        request_kwargs = self.get_request_kwargs(session)
+        streaming_paths = self.get_streaming_paths()
+        if streaming_paths:
+            request_kwargs['stream'] = True
 
-            # check the query
-            if page_query == "":
-                self.error("page_query is blank")
-                return
+        # the first page is fetched alone; if it is full, the remaining pages are fetched concurrently
+        # and processed in order below, stopping at the first short page
+        mapped_responses = []
+        page_futures = {}
+        page_executor = None
 
-            # dictionary of authentication types permitted in the upcoming eval
-            http_auth_dispatch = {'HTTPBasicAuth': HTTPBasicAuth, 'HTTPDigestAuth': HTTPDigestAuth, 'HTTProxyAuth': HTTPProxyAuth}
+        try:
+            for page, page_query in enumerate(page_queries):
 
-            response = None
-            # issue the query
-            try:
-                if self.provider.credentials:
-                    if session and self.provider.eval_credentials and '{credentials}' in self.provider.credentials:
-                        credentials = session[self.provider.eval_credentials]
-                        self.provider.credentials = self.provider.credentials.replace('{credentials}', credentials)
-                    if self.provider.credentials.startswith('HTTP'):
-                        # handle HTTPBasicAuth('user', 'pass') etc
-                        http_auth = http_auth_parse(self.provider.credentials)
-
-                        response = self.send_request(page_query, auth=http_auth_dispatch.get(http_auth[0])(*http_auth[1]),query=self.query_string_to_provider,
-                                                     headers=self._put_configured_headers())
+                response = None
+                # issue the query
+                try:
+                    if page in page_futures:
+                        response = page_futures.pop(page).result()
                     else:
-                        if self.provider.credentials.startswith('bearer='):
-                            # populate with bearer token
-                            (username,password,verify_certs,ca_certs,bearer)=self.get_creds(def_verify_certs=True)
-                            headers = {
-                                "Authorization": f"Bearer {bearer}"
-                            }
-                            if ca_certs and os.path.exists(ca_certs):
-                                response = self.send_request(page_query, headers=self._put_configured_headers(headers), query=self.query_string_to_provider, verify=ca_certs)
+                        response = self.fetch_page(page_query, request_kwargs)
+                except NewConnectionError as err:
+                    self.error(f"requests.{self.get_method()} reports {err} from: {self.provider.connector} -> {page_query}", NewConnectionError)
+                    return
+                except ConnectionError as err:
+                    self.error(f"requests.{self.get_method()} reports {err} from: {self.provider.connector} -> {page_query}")
+                    return
+                except requests.exceptions.InvalidURL as err:
+                    self.error(f"requests.{self.get_method()} reports {err} from: {self.provider.connector} -> {page_query}")
+                    return
+                if response.status_code != HTTPStatus.OK:
+                    self.error(f"request.{self.get_method()} returned: {response.status_code} {response.reason} from: {self.provider.name} for: {page_query}")
+                    return
+                # end if
+
+                page_start = len(mapped_responses)
+
+                # normalize the response
+                json_data = self.parse_response(response, streaming_paths, int(self.provider.results_per_query) - page_start)
+
+                mapped_response = {}
+                if not json_data and page_start > 0:
+                    # an empty page after full ones ends the result set
+                    break
+                if not json_data:
+                    self.message(f"Retrieved 0 of 0 results from: {self.provider.name}")
+                    self.retrieved = 0
+                    self.found = 0
+                    self.status = 'READY'
+                    return
+                # extract results using mappings
+                for mapping in RESPONSE_MAPPING_KEYS:
+                    if mapping == 'RESULT':
+                        # skip for now
+                        continue
+                    if mapping in self.response_mappings:
+                        jxp_key = f"$.{self.response_mappings[mapping]}"
+                        try:
+                            jxp = get_jsonpath(jxp_key)
+                            matches = [match.value for match in jxp.find(json_data)]
+                        except JsonPathParserError as err:
+                            self.error(f'JsonPathParser: {err} in provider.self.response_mappings: {self.provider.response_mappings}')
+                            return
+                        except (NameError, TypeError, ValueError) as err:
+                            self.error(f'{err.args}, {err} in provider.self.response_mappings: {self.provider.response_mappings}')
+                            return
+                        # end try
+                        if matches:
+                            if len(matches) == 0:
+                                # no matches
+                                continue
+                            if len(matches) == 1:
+                                mapped_response[mapping] = matches[0]
                             else:
-                                response = self.send_request(page_query, headers=self._put_configured_headers(headers), query=self.query_string_to_provider, verify=verify_certs)
-                        elif self.provider.credentials.startswith('X-Api-Key='):
-                            headers = {
-                                "X-Api-Key": f"{self.provider.credentials.split('X-Api-Key=')[1]}"
-                            }
-                            logger.debug(f"{self}: sending request with auth header X-Api-Key")
-                            response = self.send_request(page_query, headers=self._put_configured_headers(headers), query=self.query_string_to_provider)
-                            # all others
+                                self.error(f'{mapping} is matched {len(matches)} expected 1')
+                                return
                         else:
-                            response = self.send_request(page_query, query=self.query_string_to_provider, headers=self._put_configured_headers())
-                        # end if
+                            # no match, maybe ok
+                            pass
                     # end if
+                # end for
+                # count results etc
+                found = retrieved = -1
+                if 'RETRIEVED' in mapped_response:
+                    retrieved = int(mapped_response['RETRIEVED'])
+                    self.retrieved = retrieved
+                if 'FOUND' in mapped_response:
+                    found = int(mapped_response['FOUND'])
+                    self.found = found
+                # check for 0 response
+                is_empty_list = False
+                if 'RESULTS' in mapped_response:
+                    is_empty_list = 'RESULTS' in mapped_response and type(mapped_response['RESULTS']) == list and len(mapped_response['RESULTS']) == 0
                 else:
-                    # response = requests.get(page_query)
-                    response = self.send_request(page_query, query=self.query_string_to_provider, headers=self._put_configured_headers())
-            except NewConnectionError as err:
-                self.error(f"requests.{self.get_method()} reports {err} from: {self.provider.connector} -> {page_query}", NewConnectionError)
-                return
-            except ConnectionError as err:
-                self.error(f"requests.{self.get_method()} reports {err} from: {self.provider.connector} -> {page_query}")
-                return
-            except requests.exceptions.InvalidURL as err:
-                self.error(f"requests.{self.get_method()} reports {err} from: {self.provider.connector} -> {page_query}")
-                return
-            if response.status_code != HTTPStatus.OK:
-                self.error(f"request.{self.get_method()} returned: {response.status_code} {response.reason} from: {self.provider.name} for: {page_query}")
-                return
-            # end if
-
-            # normalize the response
-            content_type = response.headers['Content-Type']
-            json_data = None
-
-            if 'text/xml' in content_type or 'application/xml' in content_type or 'application/atom+xml' in content_type:
-                json_data = xmltodict.parse(response.text)
-            else:
-                if not 'application/json' in content_type:
-                    logger.debug(f"content header not xml or explicitly json, assuming json")
-                try:
-                    raw_json_data = response.json()
-                    # Check for list of lists format
-                    if isinstance(raw_json_data, list) and raw_json_data and isinstance(raw_json_data[0], list):
-                        headers = raw_json_data[0]
-                        json_data = [dict(zip(headers, sublist)) for sublist in raw_json_data[1:]]
-                    # Check for Thoughtspot format
-                    elif isinstance(raw_json_data, dict) and "contents" in raw_json_data:
-                        json_data = []
-                        for content in raw_json_data["contents"]:
-                            if "column_names" in content and "data_rows" in content:
-                                headers = [column_name.replace(" ", "_") for column_name in content["column_names"]]
-                                for row in content["data_rows"]:
-                                    json_data.append(dict(zip(headers, row)))
+                    if json_data:
+                        is_empty_list = False
                     else:
-                        json_data = raw_json_data
-                except ValueError as err:
-                    logger.warning(f"Error parsing response as JSON: {err}")
-            # end if
-
-            mapped_response = {}
-            if not json_data:
-                self.message(f"Retrieved 0 of 0 results from: {self.provider.name}")
-                self.retrieved = 0
-                self.found = 0
-                self.status = 'READY'
-                return
-            # extract results using mappings
-            for mapping in RESPONSE_MAPPING_KEYS:
-                if mapping == 'RESULT':
-                    # skip for now
-                    continue
-                if mapping in self.response_mappings:
-                    jxp_key = f"$.{self.response_mappings[mapping]}"
-                    try:
-                        jxp = parse(jxp_key)
-                        matches = [match.value for match in jxp.find(json_data)]
-                    except JsonPathParserError as err:
-                        self.error(f'JsonPathParser: {err} in provider.self.response_mappings: {self.provider.response_mappings}')
-                        return
-                    except (NameError, TypeError, ValueError) as err:
-                        self.error(f'{err.args}, {err} in provider.self.response_mappings: {self.provider.response_mappings}')
-                        return
-                    # end try
-                    if matches:
-                        if len(matches) == 0:
-                            # no matches
-                            continue
-                        if len(matches) == 1:
-                            mapped_response[mapping] = matches[0]
+                        is_empty_list = True
+                if is_empty_list and page_start > 0:
+                    break
+                if found == 0 or retrieved == 0 or is_empty_list:
+                    # no results, not an error
+                    self.message(f"Retrieved 0 of 0 results from: {self.provider.name}")
+                    self.retrieved = 0
+                    self.found = 0
+                    self.status = 'READY'
+                    return
+                # process the results
+
+                if 'RESULTS' in mapped_response:
+                    if not mapped_response['RESULTS']:
+                        mapped_response['RESULTS'] = json_data
+                    if not type(mapped_response['RESULTS']) == list:
+                        # nlresearch single result
+                        if type(mapped_response['RESULTS']) == dict:
+                            tmp_list = []
+                            tmp_list.append(mapped_response['RESULTS'])
+                            mapped_response['RESULTS'] = tmp_list
                         else:
-                            self.error(f'{mapping} is matched {len(matches)} expected 1')
+                            self.error(f"mapped results was type: {type(mapped_response['RESULTS'])}")
                             return
-                    else:
-                        # no match, maybe ok
-                        pass
-                # end if
-            # end for
-            # count results etc
-            found = retrieved = -1
-            if 'RETRIEVED' in mapped_response:
-                retrieved = int(mapped_response['RETRIEVED'])
-                self.retrieved = retrieved
-            if 'FOUND' in mapped_response:
-                found = int(mapped_response['FOUND'])
-                self.found = found
-            # check for 0 response
-            is_empty_list = False
-            if 'RESULTS' in mapped_response:
-                is_empty_list = 'RESULTS' in mapped_response and type(mapped_response['RESULTS']) == list and len(mapped_response['RESULTS']) == 0
-            else:
-                if json_data:
-                    is_empty_list = False
+                    # end if
                 else:
-                    is_empty_list = True
-            if found == 0 or retrieved == 0 or is_empty_list:
-                # no results, not an error
-                self.message(f"Retrieved 0 of 0 results from: {self.provider.name}")
-                self.retrieved = 0
-                self.found = 0
-                self.status = 'READY'
-                return
-            # process the results
-
-            if 'RESULTS' in mapped_response:
-                if not mapped_response['RESULTS']:
-                    mapped_response['RESULTS'] = json_data
-                if not type(mapped_response['RESULTS']) == list:
-                    # nlresearch single result
-                    if type(mapped_response['RESULTS']) == dict:
-                        tmp_list = []
-                        tmp_list.append(mapped_response['RESULTS'])
-                        mapped_response['RESULTS'] = tmp_list
+                    # check json_data, if it is already a result set, just go with that
+                    if type(json_data) == list:
+                        if len(json_data) > 0:
+                            if type(json_data[0]) == dict:
+                                mapped_response['RESULTS'] = json_data
                     else:
-                        self.error(f"mapped results was type: {type(mapped_response['RESULTS'])}")
-                        return
+                        if type(json_data) == dict:
+                            mapped_response['RESULTS'] = [json_data]
+                        else:
+                            self.error(f'{self}: RESULTS missing from mapped_response')
+                            return
+                    # end if
                 # end if
-            else:
-                # check json_data, if it is already a result set, just go with that
-                if type(json_data) == list:
-                    if len(json_data) > 0:
-                        if type(json_data[0]) == dict:
-                            mapped_response['RESULTS'] = json_data
+                if 'RESULT' in self.response_mappings:
+                    for result in mapped_response['RESULTS']:
+                        try:
+                            jxp_key = f"$.{self.response_mappings['RESULT']}"
+                            jxp = get_jsonpath(jxp_key)
+                            matches = [match.value for match in jxp.find(result)]
+                        except JsonPathParserError:
+                            self.error(f'JsonPathParser: {err} in self.response_mappings: {self.provider.response_mappings}')
+                            return
+                        except (NameError, TypeError, ValueError) as err:
+                            self.error(f'{err.args}, {err} in self.response_mappings: {self.provider.response_mappings}')
+                            return
+                        # end try
+                        if matches:
+                            if len(matches) == 1:
+                                for match in matches:
+                                    mapped_responses.append(match)
+                            else:
+                                self.error(f'control mapping RESULT matched {len(matches)}, expected {self.provider.results_per_query}')
+                                return
+                        else:
+                            # no match, maybe ok
+                            pass
                 else:
-                    if type(json_data) == dict:
-                        mapped_response['RESULTS'] = [json_data]
+                    # no RESULT key specified
+                    if mapped_response:
+                        for res in mapped_response['RESULTS']:
+                            mapped_responses.append(res)
                     else:
-                        self.error(f'{self}: RESULTS missing from mapped_response')
-                        return
-                # end if
-            # end if
-            if 'RESULT' in self.response_mappings:
-                for result in mapped_response['RESULTS']:
-                    try:
-                        jxp_key = f"$.{self.response_mappings['RESULT']}"
-                        jxp = parse(jxp_key)
-                        matches = [match.value for match in jxp.find(result)]
-                    except JsonPathParserError:
-                        self.error(f'JsonPathParser: {err} in self.response_mappings: {self.provider.response_mappings}')
-                        return
-                    except (NameError, TypeError, ValueError) as err:
-                        self.error(f'{err.args}, {err} in self.response_mappings: {self.provider.response_mappings}')
-                        return
-                    # end try
-                    if matches:
-                        if len(matches) == 1:
-                            for match in matches:
-                                mapped_responses.append(match)
-                        else:
-                            self.error(f'control mapping RESULT matched {len(matches)}, expected {self.provider.results_per_query}')
-                            return
+                        self.error("Unexpected missing mapped_response 1")
+                # check retrieved
+                if not mapped_responses:
+                    self.error(f"no results extracted from response! found:{found}")
+                    if found != 0:
+                        found = retrieved = 0
+                    # end if
+                if retrieved == -1:
+                    if mapped_responses:
+                        retrieved = len(mapped_responses)
+                        self.retrieved = retrieved
                     else:
-                        # no match, maybe ok
-                        pass
-            else:
-                # no RESULT key specified
-                if mapped_response:
-                    for res in mapped_response['RESULTS']:
-                        mapped_responses.append(res)
-                else:
-                    self.error("Unexpected missing mapped_response 1")
-            # check retrieved
-            if not mapped_responses:
-                self.error(f"no results extracted from response! found:{found}")
-                if found != 0:
-                    found = retrieved = 0
+                        self.error(f"Unexpected missing mapped_response 2")
+                if found == -1:
+                    # for now, assume the source delivered what it found
+                    if mapped_responses:
+                        found = len(mapped_responses)
+                        self.found = found
+                    else:
+                        self.error(f"Unexpected missing mapped_response 3")
+                # check for 0 delivered results (different from above)
+                if found == 0 or retrieved == 0:
+                    # no results, not an error
+                    self.message(f"Retrieved 0 of 0 results from: {self.provider.name}")
+                    self.status = 'READY'
+                    return
+
+                # check count
+                if retrieved < 10 or len(mapped_responses) - page_start < 10:
+                    # no more pages, so don't request any
+                    break
+
+                if page == 0 and len(page_queries) > 1:
+                    page_executor = ThreadPoolExecutor(max_workers=min(len(page_queries) - 1, SWIRL_PAGE_FETCH_WORKERS))
+                    for next_page in range(1, len(page_queries)):
+                        page_futures[next_page] = page_executor.submit(self.fetch_page, page_queries[next_page], request_kwargs)
                 # end if
-            if retrieved == -1:
-                if mapped_responses:
-                    retrieved = len(mapped_responses)
-                    self.retrieved = retrieved
-                else:
-                    self.error(f"Unexpected missing mapped_response 2")
-            if found == -1:
-                # for now, assume the source delivered what it found
-                if mapped_responses:
-                    found = len(mapped_responses)
-                    self.found = found
-                else:
-                    self.error(f"Unexpected missing mapped_response 3")
-            # check for 0 delivered results (different from above)
-            if found == 0 or retrieved == 0:
-                # no results, not an error
-                self.message(f"Retrieved 0 of 0 results from: {self.provider.name}")
-                self.status = 'READY'
-                return
-
-            # check count
-            if retrieved < 10:
-                # no more pages, so don't request any
-                break
-
-            start = start + 10 # get only as many pages as required to satisfy provider results_per_query setting, in increments of 10
 
-            time.sleep(1)
-
-        # end for
+            # end for
+        finally:
+            if page_executor:
+                # pages after a short one are not needed
+                page_executor.shutdown(wait=False, cancel_futures=True)
+                for future in page_futures.values():
+                    future.add_done_callback(close_page_response)
+        # end try
 
         self.found = found
         self.retrieved = retrieved
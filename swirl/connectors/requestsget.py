@@ -38,4 +38,5 @@ class RequestsGet(Requests):
         return 'get'
 
     def send_request(self, url, params=None, query=None, **kwargs):
-        return requests.get(url, params=params, **kwargs)
+        kwargs.setdefault('timeout', self._swirl_timeout)
+        return self.http_session.get(url, params=params, **kwargs)
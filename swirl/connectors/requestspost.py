@@ -73,4 +73,5 @@ class RequestsPost(Requests):
             post_json=query
 
         logger.debug(f"post_json_str:{post_json_str} query:{query} post_json:{post_json}")
-        return requests.post(url, params=params, json=post_json, **kwargs)
+        kwargs.setdefault('timeout', self._swirl_timeout)
+        return self.http_session.post(url, params=params, json=post_json, **kwargs)
@@ -22,6 +22,7 @@ from celery.utils.log import get_task_logger
 logger = get_task_logger(__name__)
 
 from swirl.connectors.db_connector import DBConnector
+from swirl.connection_pool import connection_pool, get_connection_key
 from swirl.connectors.utils import bind_query_mappings
 
 ########################################
@@ -51,13 +52,30 @@ class Snowflake(DBConnector):
             self.warning("No credentials!")
         account = self.provider.url
 
-        try:
-            # Create a new connection
+        def new_connection():
             conn = snowflake.connector.connect(user=username, password=password, account=account)
             cursor = conn.cursor()
             cursor.execute(f"USE WAREHOUSE {warehouse}")
             cursor.execute(f"USE DATABASE {database}")
+            cursor.close()
+            return conn
+
+        def check(conn):
+            return not conn.is_closed()
+
+        try:
+            with connection_pool.connection(get_connection_key(self.provider), new_connection, check=check) as conn:
+                self.query_connection(conn)
+        except ProgrammingError as err:
+            self.error(f"{err} connecting to {self.type}")
+            self.status = 'ERR'
+        return
+
+    def query_connection(self, conn):
 
+        cursor = None
+        try:
+            cursor = conn.cursor()
             cursor.execute(self.count_query)
             count_result = cursor.fetchone()
             found = count_result[0] if count_result else 0
@@ -66,6 +84,7 @@ class Snowflake(DBConnector):
                 self.status = 'READY'
                 self.found = 0
                 self.retrieved = 0
+                cursor.close()
                 return
             
             cursor.execute(self.query_to_provider)
@@ -75,14 +94,13 @@ class Snowflake(DBConnector):
         except ProgrammingError as err:
             self.error(f"{err} querying {self.type}")
             self.status = 'ERR'
-            cursor.close()
-            conn.close()
+            if cursor:
+                cursor.close()
             return
 
         self.response = list(results)
 
         cursor.close()
-        conn.close()
 
         self.found = found
         self.retrieved = self.provider.results_per_query
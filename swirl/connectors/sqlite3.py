@@ -23,6 +23,7 @@ from celery.utils.log import get_task_logger
 logger = get_task_logger(__name__)
 
 from swirl.connectors.db_connector import DBConnector
+from swirl.connection_pool import connection_pool, get_connection_key
 
 ########################################
 ########################################
@@ -43,13 +44,20 @@ class Sqlite3(DBConnector):
             self.error(f"db_path does not exist")
             return
 
-        connection = None
-        try:
-            connection = sqlite3.connect(db_path)
+        def new_connection():
+            # borrowed by one search at a time, but not always on the thread that opened it
+            connection = sqlite3.connect(db_path, check_same_thread=False)
             connection.row_factory = sqlite3.Row
+            return connection
+
+        try:
+            with connection_pool.connection(get_connection_key(self.provider), new_connection, check=lambda connection: connection.execute('select 1')) as connection:
+                self.query_connection(connection)
         except Error as err:
             self.error(f"{err} connecting to {self.type}: {db_path}")
-            return
+        return
+
+    def query_connection(self, connection):
 
         # issue the count(*) query
         cursor = None
@@ -93,7 +101,6 @@ class Sqlite3(DBConnector):
             self.error(f"execute_count_query: {err}")
             self.status = 'ERR'
             cursor.close()
-            connection.close()
             return
 
         if rows == None:
@@ -108,7 +115,6 @@ class Sqlite3(DBConnector):
         self.status = 'READY'
 
         cursor.close()
-        connection.close()
 
         return
     
\ No newline at end of file
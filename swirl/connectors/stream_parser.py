@@ -0,0 +1,449 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import codecs
+import json
+import re
+
+import xmltodict
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+# a RESULTS/FOUND/RETRIEVED mapping the streaming parser can follow: plain dotted keys, no wildcards or indexes
+SIMPLE_PATH = re.compile(r'^[\w\-:@#]+(\.[\w\-:@#]+)*$')
+
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_STRING_END = re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL)
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+#############################################
+
+class ParseLimitReached(Exception):
+    pass
+
+def get_simple_path(mapping):
+    '''
+    The list of keys of a plain dotted mapping, None if the mapping needs full JSONPath
+    '''
+    if not mapping:
+        return []
+    if not SIMPLE_PATH.match(mapping):
+        return None
+    return mapping.split('.')
+
+def set_path(tree, path, value):
+    node = tree
+    for key in path[:-1]:
+        node = node.setdefault(key, {})
+        if not isinstance(node, dict):
+            return
+    node[path[-1]] = value
+
+#############################################
+
+class JsonStream:
+
+    '''
+    Reads JSON text from an iterator of byte chunks a little at a time; stops reading after max_bytes
+    '''
+
+    def __init__(self, chunks, max_bytes):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._json = json.JSONDecoder()
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.truncated = False
+        self.eof = False
+        self.buf = ''
+        self.pos = 0
+
+    def fill(self):
+        '''
+        Append the next chunk to the buffer, False at the end of the body or the byte cap
+        '''
+        if self.eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.eof = True
+            self.buf = self.buf[self.pos:] + self._decoder.decode(b'', final=True)
+            self.pos = 0
+            return False
+        if self.max_bytes and self.bytes_read + len(chunk) > self.max_bytes:
+            chunk = chunk[:self.max_bytes - self.bytes_read]
+            self.truncated = True
+            self.eof = True
+        self.bytes_read = self.bytes_read + len(chunk)
+        self.buf = self.buf[self.pos:] + self._decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        c = self.peek()
+        if not c or not c in chars:
+            raise ValueError(f"expected {chars} at byte {self.bytes_read}, found {c!r}")
+        self.pos = self.pos + 1
+        return c
+
+    def read_value(self):
+        '''
+        Decode the next complete value
+        '''
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buf, self.pos)
+                # a number at the end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof or not isinstance(value, (int, float)):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def skip_value(self):
+        '''
+        Move past the next value without decoding it
+        '''
+        c = self.peek()
+        if not c in ('{', '['):
+            self.read_value()
+            return
+        depth = 0
+        while True:
+            match = _STRUCTURE.search(self.buf, self.pos)
+            if not match:
+                self.pos = len(self.buf)
+                if not self.fill():
+                    raise ValueError("unexpected end of JSON")
+                continue
+            self.pos = match.end()
+            token = match.group(0)
+            if token == '"':
+                while True:
+                    end = _STRING_END.match(self.buf, self.pos)
+                    if end and (end.end() < len(self.buf) or self.eof):
+                        self.pos = end.end()
+                        break
+                    if not self.fill():
+                        raise ValueError("unexpected end of JSON string")
+            elif token in ('{', '['):
+                depth = depth + 1
+            else:
+                depth = depth - 1
+                if depth == 0:
+                    return
+
+#############################################
+
+class StreamingJsonParser:
+
+    '''
+    Walks a JSON body to the RESULTS path and decodes only the first limit items there, plus the values of the
+    other mappings (FOUND, RETRIEVED...) that come before it; everything else is skipped without being decoded
+    A top level list of lists (header row first) and ThoughtSpot "contents" become a list of dicts, as in
+    Requests.execute_search
+    Returns a skeleton of the document holding just those values, so the mappings find them where they'd be
+    '''
+
+    def __init__(self, results_path, other_paths, limit, max_bytes):
+        self.results_path = results_path
+        self.other_paths = [path for path in other_paths if path]
+        self.limit = limit
+        self.max_bytes = max_bytes
+        self.count = 0
+        self.truncated = False
+        self.stopped = False
+
+    def _wanted(self, path):
+        for other in self.other_paths:
+            if other == path:
+                return 'value'
+        for other in self.other_paths + [self.results_path]:
+            if len(other) > len(path) and other[:len(path)] == path:
+                return 'descend'
+        return None
+
+    def _add(self, items, item):
+        items.append(item)
+        self.count = self.count + 1
+        if self.limit and self.count >= self.limit:
+            raise ParseLimitReached()
+
+    def _stream_array(self, stream, items):
+        stream.expect('[')
+        while True:
+            c = stream.peek()
+            if c == ']':
+                stream.pos = stream.pos + 1
+                return
+            if c == ',':
+                stream.pos = stream.pos + 1
+                continue
+            if not c:
+                raise ValueError("unexpected end of JSON array")
+            self._add(items, stream.read_value())
+
+    def _stream_table(self, stream, items):
+        # list of lists: the first row holds the column names
+        stream.expect('[')
+        headers = None
+        while True:
+            c = stream.peek()
+            if c == ']':
+                stream.pos = stream.pos + 1
+                return
+            if c == ',':
+                stream.pos = stream.pos + 1
+                continue
+            if not c:
+                raise ValueError("unexpected end of JSON array")
+            row = stream.read_value()
+            if headers is None:
+                headers = row
+                continue
+            self._add(items, dict(zip(headers, row)))
+
+    def _stream_contents(self, stream, items):
+        # ThoughtSpot: {"contents": [{"column_names": [...], "data_rows": [[...], ...]}, ...]}
+        stream.expect('[')
+        while True:
+            c = stream.peek()
+            if c == ']':
+                stream.pos = stream.pos + 1
+                return
+            if c == ',':
+                stream.pos = stream.pos + 1
+                continue
+            if c != '{':
+                stream.skip_value()
+                continue
+            stream.expect('{')
+            headers = None
+            rows = None
+            while True:
+                c = stream.peek()
+                if c == '}':
+                    stream.pos = stream.pos + 1
+                    break
+                if c == ',':
+                    stream.pos = stream.pos + 1
+                    continue
+                key = stream.read_value()
+                stream.expect(':')
+                if key == 'column_names':
+                    headers = [column_name.replace(" ", "_") for column_name in stream.read_value()]
+                elif key == 'data_rows' and headers is not None:
+                    rows = []
+                    stream.expect('[')
+                    while True:
+                        c = stream.peek()
+                        if c == ']':
+                            stream.pos = stream.pos + 1
+                            break
+                        if c == ',':
+                            stream.pos = stream.pos + 1
+                            continue
+                        self._add(items, dict(zip(headers, stream.read_value())))
+                elif key == 'data_rows':
+                    # column_names comes later in this object
+                    rows = stream.read_value()
+                else:
+                    stream.skip_value()
+            # end while
+            if headers is not None and rows and isinstance(rows[0], list):
+                for row in rows:
+                    self._add(items, dict(zip(headers, row)))
+
+    def _walk_object(self, stream, tree, path):
+        stream.expect('{')
+        while True:
+            c = stream.peek()
+            if c == '}':
+                stream.pos = stream.pos + 1
+                return
+            if c == ',':
+                stream.pos = stream.pos + 1
+                continue
+            if not c:
+                raise ValueError("unexpected end of JSON object")
+            key = stream.read_value()
+            stream.expect(':')
+            key_path = path + [key]
+            if key_path == self.results_path:
+                if stream.peek() == '[':
+                    items = []
+                    set_path(tree, key_path, items)
+                    self._stream_array(stream, items)
+                else:
+                    set_path(tree, key_path, stream.read_value())
+                continue
+            wanted = self._wanted(key_path)
+            if wanted == 'value':
+                set_path(tree, key_path, stream.read_value())
+            elif wanted == 'descend' and stream.peek() == '{':
+                set_path(tree, key_path, {})
+                self._walk_object(stream, tree, key_path)
+            else:
+                stream.skip_value()
+
+    def parse(self, chunks):
+        stream = JsonStream(chunks, self.max_bytes)
+        tree = {}
+        result = tree
+        try:
+            c = stream.peek()
+            if self.results_path:
+                if c != '{':
+                    # no path to follow, decode it all
+                    return stream.read_value()
+                self._walk_object(stream, tree, [])
+            elif c == '[':
+                stream.pos = stream.pos + 1
+                first = stream.peek()
+                stream.pos = stream.pos - 1
+                result = []
+                if first == '[':
+                    self._stream_table(stream, result)
+                else:
+                    self._stream_array(stream, result)
+            elif c == '{':
+                # a ThoughtSpot answer, or a single result that is needed in full
+                result = {}
+                stream.expect('{')
+                rows = None
+                while True:
+                    c = stream.peek()
+                    if c == '}':
+                        stream.pos = stream.pos + 1
+                        break
+                    if c == ',':
+                        stream.pos = stream.pos + 1
+                        continue
+                    key = stream.read_value()
+                    stream.expect(':')
+                    if key == 'contents' and stream.peek() == '[':
+                        rows = []
+                        result[key] = rows
+                        self._stream_contents(stream, rows)
+                    else:
+                        result[key] = stream.read_value()
+                if rows is not None:
+                    result = rows
+            else:
+                result = stream.read_value()
+        except ParseLimitReached:
+            self.stopped = True
+            if not self.results_path and isinstance(result, dict) and 'contents' in result:
+                result = result['contents']
+        except (ValueError, json.JSONDecodeError) as err:
+            if not stream.truncated:
+                raise
+            logger.warning(f"stream_parser: body cut at {stream.bytes_read} bytes: {err}")
+            if not self.results_path and isinstance(result, dict) and 'contents' in result:
+                result = result['contents']
+        self.truncated = stream.truncated
+        return result
+
+#############################################
+
+class StreamingXmlParser:
+
+    '''
+    Pull-parses an XML body, converting only the first limit elements at the RESULTS path (and the elements at the
+    other mapping paths) with xmltodict; the rest of the document is discarded as it is read
+    '''
+
+    def __init__(self, results_path, other_paths, limit, max_bytes):
+        self.results_path = results_path
+        self.other_paths = [path for path in other_paths if path]
+        self.limit = limit
+        self.max_bytes = max_bytes
+        self.count = 0
+        self.truncated = False
+        self.stopped = False
+
+    def _name(self, elem):
+        from lxml import etree
+        local = etree.QName(elem).localname
+        if elem.prefix:
+            return f'{elem.prefix}:{local}'
+        return local
+
+    def _to_dict(self, elem):
+        from lxml import etree
+        value = xmltodict.parse(etree.tostring(elem))
+        value = next(iter(value.values())) if value else None
+        parent = elem.getparent()
+        if isinstance(value, dict) and parent is not None:
+            # xmlns declarations lxml repeats on the element because it is serialized alone
+            for prefix, uri in (parent.nsmap or {}).items():
+                attr = '@xmlns' if prefix is None else f'@xmlns:{prefix}'
+                if value.get(attr) == uri:
+                    del value[attr]
+            if not value:
+                return None
+            if list(value.keys()) == ['#text']:
+                return value['#text']
+        return value
+
+    def parse(self, chunks):
+        from lxml import etree
+        parser = etree.XMLPullParser(events=('start', 'end'), resolve_entities=False, no_network=True)
+        tree = {}
+        path = []
+        items = None
+        bytes_read = 0
+        try:
+            for chunk in chunks:
+                if self.max_bytes and bytes_read + len(chunk) > self.max_bytes:
+                    chunk = chunk[:self.max_bytes - bytes_read]
+                    self.truncated = True
+                bytes_read = bytes_read + len(chunk)
+                parser.feed(chunk)
+                for event, elem in parser.read_events():
+                    if event == 'start':
+                        path.append(self._name(elem))
+                        continue
+                    inside = [wanted for wanted in [self.results_path] + self.other_paths if len(path) > len(wanted) and path[:len(wanted)] == wanted]
+                    if path == self.results_path:
+                        if items is None:
+                            items = []
+                            set_path(tree, path, items)
+                        items.append(self._to_dict(elem))
+                        self.count = self.count + 1
+                    elif path in self.other_paths:
+                        set_path(tree, list(path), self._to_dict(elem))
+                    path.pop()
+                    # nothing at or below a finished element is needed again, unless it is part of a result
+                    if len(path) > 0 and not inside:
+                        elem.clear()
+                        while elem.getprevious() is not None:
+                            del elem.getparent()[0]
+                    if self.limit and self.count >= self.limit:
+                        raise ParseLimitReached()
+                # end for
+                if self.truncated:
+                    logger.warning(f"stream_parser: body cut at {bytes_read} bytes")
+                    break
+            # end for
+        except ParseLimitReached:
+            self.stopped = True
+        except etree.XMLSyntaxError:
+            if not self.truncated:
+                raise
+        return tree
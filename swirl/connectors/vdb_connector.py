@@ -19,9 +19,7 @@ logger = get_task_logger(__name__)
 
 from swirl.connectors.connector import Connector
 from swirl.processors.utils import get_tag
-
-from transformers import AutoModel, AutoTokenizer
-import torch
+from swirl.embeddings import embedding_pool
 
 ########################################
 
@@ -51,15 +49,7 @@ class VectorDBConnector(Connector):
             self.error("No model defined in SearchProvider")
             return False
 
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModel.from_pretrained(model_name)
-
-        inputs = tokenizer(self.query_string_to_provider, return_tensors="pt", padding=True, truncation=True)
-        with torch.no_grad():
-            outputs = model(**inputs)
-        # Mean pooling
-        embeddings = outputs.last_hidden_state.mean(dim=1)
-
-        self.vector_to_provider = embeddings[0].numpy().tolist()
+        # the pool keeps the model loaded between queries
+        self.vector_to_provider = embedding_pool.encode([self.query_string_to_provider], model_name)[0].tolist()
         
         return True
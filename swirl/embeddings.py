@@ -6,18 +6,122 @@
 import logging
 logger = logging.getLogger(__name__)
 
-from pinecone import Pinecone
-from transformers import AutoModel, AutoTokenizer
-import torch
-
-def get_embedding(text):
-    model_name = "intfloat/e5-small-v2"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModel.from_pretrained(model_name)
-    # Tokenize and get embeddings
-    inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True)
-    with torch.no_grad():
-        outputs = model(**inputs)
-    # Mean pooling
-    embeddings = outputs.last_hidden_state.mean(dim=1)
-    return embeddings[0].numpy()
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from swirl.model_registry import load_transformer
+
+SWIRL_EMBEDDING_MODEL = getattr(settings, 'SWIRL_EMBEDDING_MODEL', 'intfloat/e5-small-v2')
+SWIRL_EMBEDDING_POOL_MAX_MB = getattr(settings, 'SWIRL_EMBEDDING_POOL_MAX_MB', 2048)
+SWIRL_EMBEDDING_POOL_MAX_MODELS = getattr(settings, 'SWIRL_EMBEDDING_POOL_MAX_MODELS', 4)
+
+#############################################
+
+def model_size(model):
+    '''
+    Bytes held by the model's parameters and buffers
+    '''
+    size = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        size = size + tensor.numel() * tensor.element_size()
+    return size
+
+class EmbeddingModelPool:
+
+    '''
+    Per-process pool of transformer tokenizer/model pairs, keyed by model name
+    Each model is loaded and warmed up once; when the pool exceeds its memory cap or model count
+    the least recently used model is evicted. The most recently used model is always kept.
+    '''
+
+    def __init__(self, max_mb=SWIRL_EMBEDDING_POOL_MAX_MB, max_models=SWIRL_EMBEDDING_POOL_MAX_MODELS):
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_models = max_models
+        self._models = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def _evict(self):
+        # called with self._lock held
+        total = sum(entry[2] for entry in self._models.values())
+        while len(self._models) > 1 and (total > self.max_bytes or len(self._models) > self.max_models):
+            model_name, entry = self._models.popitem(last=False)
+            total = total - entry[2]
+            self._stats[model_name]['evictions'] = self._stats[model_name]['evictions'] + 1
+            logger.info(f"embedding_pool: evicted {model_name}")
+
+    def get(self, model_name):
+        '''
+        Returns (tokenizer, model) for model_name, loading and warming it up if needed
+        '''
+        with self._lock:
+            if model_name in self._models:
+                self._models.move_to_end(model_name)
+                self._stats[model_name]['hits'] = self._stats[model_name]['hits'] + 1
+                return self._models[model_name][:2]
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if model_name in self._models:
+                    # loaded by another thread while this one waited
+                    self._models.move_to_end(model_name)
+                    self._stats[model_name]['hits'] = self._stats[model_name]['hits'] + 1
+                    return self._models[model_name][:2]
+            start_time = time.time()
+            tokenizer, model = load_transformer(model_name)
+            # warm up, so the first real query doesn't pay for lazy initialization
+            self._forward(tokenizer, model, ['warm up'])
+            load_time = time.time() - start_time
+            size = model_size(model)
+            with self._lock:
+                self._models[model_name] = (tokenizer, model, size)
+                stats = self._stats.setdefault(model_name, {'name': model_name, 'loads': 0, 'hits': 0, 'evictions': 0})
+                stats['loads'] = stats['loads'] + 1
+                stats['load_time'] = round(load_time, 3)
+                stats['size'] = size
+                self._evict()
+            logger.info(f"embedding_pool: loaded {model_name} in {round(load_time, 3)}s, {round(size / (1024 * 1024), 1)} MB")
+        return tokenizer, model
+
+    def _forward(self, tokenizer, model, texts):
+        import torch
+        inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
+        with torch.no_grad():
+            outputs = model(**inputs)
+        # Mean pooling over the real tokens only, so a text embeds the same alone or in a padded batch
+        mask = inputs['attention_mask'].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+        summed = (outputs.last_hidden_state * mask).sum(dim=1)
+        return summed / mask.sum(dim=1).clamp(min=1)
+
+    def encode(self, texts, model_name=SWIRL_EMBEDDING_MODEL):
+        '''
+        Embeds a list of texts in a single forward pass, returns one numpy vector per text
+        '''
+        if not texts:
+            return []
+        tokenizer, model = self.get(model_name)
+        embeddings = self._forward(tokenizer, model, list(texts))
+        return [embedding.numpy() for embedding in embeddings]
+
+    def loaded(self):
+        with self._lock:
+            return list(self._models.keys())
+
+    def stats(self):
+        with self._lock:
+            return [dict(stats) for stats in self._stats.values()]
+
+embedding_pool = EmbeddingModelPool()
+
+#############################################
+
+def get_embeddings(texts, model_name=SWIRL_EMBEDDING_MODEL):
+    return embedding_pool.encode(texts, model_name)
+
+def get_embedding(text, model_name=SWIRL_EMBEDDING_MODEL):
+    return embedding_pool.encode([text], model_name)[0]
@@ -8,9 +8,11 @@ from os import environ
 import logging
 logger = logging.getLogger(__name__)
 
-from datetime import timedelta
+import time
 
 import django
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
 from swirl.utils import swirl_setdir
@@ -18,47 +20,62 @@ path.append(swirl_setdir()) # path to settings.py file
 environ.setdefault('DJANGO_SETTINGS_MODULE', 'swirl_server.settings')
 django.setup()
 
-from swirl.models import Search
+from swirl.models import Search, Result, ResultRow, SubscriptionState
 
 module_name = 'expirer.py'
 
+SWIRL_EXPIRE_BATCH_SIZE = getattr(settings, 'SWIRL_EXPIRE_BATCH_SIZE', 500)
+
 ##################################################
 ##################################################
 
+def expire_searches(search_ids):
+
+    '''
+    Deletes the searches and everything that references them, one QuerySet.delete() per model, children first
+    Models without delete signals or dependents are removed with a single DELETE, and Django still cascades to
+    anything else that references them
+    Returns the number of rows deleted per model
+    '''
+
+    deleted = {}
+    for model in [ResultRow, SubscriptionState, Result]:
+        count, counts = model.objects.filter(search_id__in=search_ids).delete()
+        deleted[model.__name__] = counts.get(model._meta.label, 0)
+    count, counts = Search.objects.filter(id__in=search_ids).delete()
+    deleted['Search'] = counts.get(Search._meta.label, 0)
+    return deleted
+
 def expirer():
 
     '''
     This fires whenever a Celery Beat event arrives
     Remove searches that are past expiration date, if expiration is not 0
+    Searches due are found by the expires_at index and deleted SWIRL_EXPIRE_BATCH_SIZE at a time, each batch in its
+    own transaction, so the tables are never locked for long
     '''
 
-    # security review for 1.7 - OK - system function
-    searches = Search.objects.filter(retention__gt=0)
-    for search in searches:
-        logger.debug(f"{module_name}: expirer checking: {search.id}")
-        if search.retention == 0:
-            # don't delete - this should not happen because of the filter above
-            logger.warning(f"{module_name}: filter error, reviewed a search with retention = {search.retention}")
-            continue
-        else:
-            expired = False
-            if search.retention == 1:
-                if search.date_updated + timedelta(hours=1) < timezone.now():
-                    expired = True
-            elif search.retention == 2:
-                if search.date_updated + timedelta(days=1) < timezone.now():
-                    expired = True
-            elif search.retention == 3:
-                if search.date_updated + timedelta(month=1) < timezone.now():
-                    expired = True
-            else:
-                logger.error(f"{module_name}: unexpected retention setting: {search.retention}")
-            if expired:
-                # to do: fix this to show local time, someday P4
-                logger.info(f"{module_name}: expirer deleted {search.id}")
-                search.delete()
-            # end if
-        # end if
-    # end for
-
-    return True
\ No newline at end of file
+    start_time = time.time()
+    now = timezone.now()
+    batches = 0
+    totals = {}
+    while True:
+        with transaction.atomic():
+            # security review for 1.7 - OK - system function
+            search_ids = list(Search.objects.select_for_update().filter(expires_at__lte=now).order_by('expires_at').values_list('id', flat=True)[:SWIRL_EXPIRE_BATCH_SIZE])
+            if not search_ids:
+                break
+            deleted = expire_searches(search_ids)
+        # end with
+        batches = batches + 1
+        for model in deleted:
+            totals[model] = totals.get(model, 0) + deleted[model]
+        logger.debug(f"{module_name}: expirer deleted {search_ids}")
+    # end while
+
+    if totals:
+        logger.info(f"{module_name}: expirer deleted {totals.get('Search', 0)} searches, {totals.get('Result', 0)} results, {totals.get('ResultRow', 0)} result rows in {batches} batches, {time.time() - start_time:.2f}s")
+    else:
+        logger.debug(f"{module_name}: expirer found nothing to delete, {time.time() - start_time:.2f}s")
+
+    return True
@@ -0,0 +1,113 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+module_name = 'federation.py'
+
+SWIRL_FEDERATION_EXECUTOR = getattr(settings, 'SWIRL_FEDERATION_EXECUTOR', 'celery')
+SWIRL_FEDERATION_THREAD_CONNECTORS = getattr(settings, 'SWIRL_FEDERATION_THREAD_CONNECTORS', [
+    'RequestsGet', 'RequestsPost', 'M365OutlookMessages', 'M365OneDrive', 'M365OutlookCalendar',
+    'M365SharePointSites', 'MicrosoftTeams', 'Elastic', 'OpenSearch'
+])
+SWIRL_FEDERATION_MAX_WORKERS = getattr(settings, 'SWIRL_FEDERATION_MAX_WORKERS', 32)
+
+#############################################
+
+class FutureProviderResult:
+
+    '''
+    Wraps the future of one in-process federate call so it can be polled like a Celery AsyncResult
+    '''
+
+    def __init__(self, future):
+        self._future = future
+
+    def ready(self):
+        return self._future.done()
+
+    def successful(self):
+        return self._future.done() and not self._future.cancelled() and self._future.exception() is None
+
+    @property
+    def result(self):
+        if not self.successful():
+            return None
+        return self._future.result()
+
+    def revoke(self):
+        # like AsyncResult.revoke(), only stops a call that hasn't started
+        self._future.cancel()
+
+#############################################
+
+class ThreadPoolFederationExecutor:
+
+    '''
+    Federates I/O-bound connectors inside the search process instead of dispatching a Celery task per provider
+    The connectors are synchronous, so each one runs on a thread of a bounded pool, blocking only that thread
+    while it waits on the provider; all of them share the process's HTTP pool (swirl/http_pool.py)
+    '''
+
+    def __init__(self, max_workers=SWIRL_FEDERATION_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _federate(self, search, provider, user, update, session, request_id, query_transforms=None, bypass_cache=False):
+        from swirl.connectors import alloc_connector
+        from swirl.connectors.connector import prefetched_objects
+        from swirl.performance_logger import ProviderQueryRequestLogger
+        try:
+            with ProviderQueryRequestLogger(provider.connector+'_'+str(provider.id), request_id):
+                # each connector gets its own copy of the search and provider, the objects themselves are only read once;
+                # connectors set attributes on both, e.g. the provider's credentials, and hedged attempts run concurrently
+                with prefetched_objects(provider=copy.copy(provider), search=copy.copy(search), user=user, query_transforms=query_transforms):
+                    connector = alloc_connector(connector=provider.connector)(provider.id, search.id, update, request_id=request_id)
+                connector.bypass_cache = bypass_cache
+                return connector.federate(session)
+        except NameError as err:
+            logger.error(f'{module_name}: Error: NameError: {err}')
+        except TypeError as err:
+            logger.error(f'{module_name}: Error: TypeError: {err}')
+        finally:
+            # threads are reused, don't leave a connection per thread open
+            connection.close()
+        return False
+
+    def submit(self, search, provider, user, update, session, request_id, query_transforms=None, bypass_cache=False):
+        '''
+        Schedule one provider, returns a FutureProviderResult
+        '''
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='swirl-federate')
+            future = self._pool.submit(self._federate, search, provider, user, update, session, request_id, query_transforms, bypass_cache)
+        return FutureProviderResult(future)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is None:
+                return
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+federation_executor = ThreadPoolFederationExecutor()
+
+#############################################
+
+def use_thread_executor(provider):
+    '''
+    True if this provider should be federated in-process rather than by a Celery task
+    '''
+    return SWIRL_FEDERATION_EXECUTOR == 'thread' and provider.connector in SWIRL_FEDERATION_THREAD_CONNECTORS
@@ -0,0 +1,173 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+# swirl.utils imports this module (through web_page) before django.setup(), so settings are read on first use
+def get_pool_settings():
+    return (
+        getattr(settings, 'SWIRL_HTTP_POOL_MAXSIZE', 20),
+        getattr(settings, 'SWIRL_HTTP_POOL_MAX_HOSTS', 100),
+        getattr(settings, 'SWIRL_HTTP_MAX_PER_HOST', 10)
+    )
+
+#############################################
+
+class HostPool:
+
+    '''
+    Keep-alive session for one scheme://host:port, with a limit on concurrent requests to it
+    The session is shared by every search and user, so its cookie jar accepts nothing; callers that need
+    cookies pass them with each request
+    '''
+
+    def __init__(self, host, maxsize, max_concurrent):
+        self.host = host
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.adapter = adapter
+        self._limit = threading.BoundedSemaphore(max_concurrent) if max_concurrent and max_concurrent > 0 else None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.wait_time = 0.0
+        self.last_used = time.time()
+
+    def request(self, method, url, **kwargs):
+        start_time = time.time()
+        if self._limit:
+            # waiting for a free slot counts against the request's timeout, so a saturated host can't hold a
+            # connector past its deadline; a (connect, read) timeout is waited on like a connect
+            timeout = kwargs.get('timeout') or getattr(settings, 'SWIRL_TIMEOUT', 10)
+            if isinstance(timeout, tuple):
+                timeout = timeout[0] or getattr(settings, 'SWIRL_TIMEOUT', 10)
+            if not self._limit.acquire(timeout=timeout):
+                with self._lock:
+                    self.errors = self.errors + 1
+                raise requests.exceptions.ConnectTimeout(f"no free connection to {self.host} after {timeout}s")
+        with self._lock:
+            self.wait_time = self.wait_time + time.time() - start_time
+            self.in_flight = self.in_flight + 1
+            self.requests = self.requests + 1
+            self.last_used = time.time()
+        try:
+            return self.session.request(method, url, **kwargs)
+        except Exception:
+            with self._lock:
+                self.errors = self.errors + 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight = self.in_flight - 1
+            if self._limit:
+                self._limit.release()
+
+    def connections(self):
+        # connections opened so far by the urllib3 pools behind this session
+        opened = 0
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool:
+                opened = opened + pool.num_connections
+        return opened
+
+    def stats(self):
+        with self._lock:
+            return {
+                'host': self.host,
+                'requests': self.requests,
+                'errors': self.errors,
+                'in_flight': self.in_flight,
+                'connections': self.connections(),
+                'wait_time': round(self.wait_time, 3)
+            }
+
+    def close(self):
+        self.session.close()
+
+#############################################
+
+class HttpPool:
+
+    '''
+    Per-process pool of keep-alive sessions, one per host, shared by the HTTP connectors and the page fetcher
+    Reusing a session skips the TCP and TLS handshake on every request after the first to the same host
+    The least recently used host is dropped once there are more than max_hosts
+    After a fork the child starts with an empty pool, sockets are not shared between processes
+    '''
+
+    def __init__(self, maxsize=None, max_hosts=None, max_per_host=None):
+        self.maxsize = maxsize
+        self.max_hosts = max_hosts
+        self.max_per_host = max_per_host
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _host_key(self, url):
+        parsed = urlparse(url)
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        return f'{parsed.scheme}://{parsed.hostname}:{port}'
+
+    def get_host_pool(self, url):
+        key = self._host_key(url)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._hosts = {}
+                self._pid = os.getpid()
+            host_pool = self._hosts.get(key)
+            if host_pool:
+                return host_pool
+            if self.maxsize is None or self.max_hosts is None or self.max_per_host is None:
+                maxsize, max_hosts, max_per_host = get_pool_settings()
+                self.maxsize = maxsize if self.maxsize is None else self.maxsize
+                self.max_hosts = max_hosts if self.max_hosts is None else self.max_hosts
+                self.max_per_host = max_per_host if self.max_per_host is None else self.max_per_host
+            host_pool = HostPool(key, maxsize=self.maxsize, max_concurrent=self.max_per_host)
+            self._hosts[key] = host_pool
+            if len(self._hosts) > self.max_hosts:
+                oldest = min(self._hosts.values(), key=lambda pool: pool.last_used)
+                if oldest.in_flight == 0:
+                    del self._hosts[oldest.host]
+                    oldest.close()
+        return host_pool
+
+    def request(self, method, url, **kwargs):
+        return self.get_host_pool(url).request(method, url, **kwargs)
+
+    def get(self, url, params=None, **kwargs):
+        return self.request('GET', url, params=params, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            host_pools = list(self._hosts.values())
+        return [host_pool.stats() for host_pool in host_pools]
+
+    def close(self):
+        with self._lock:
+            for host_pool in self._hosts.values():
+                host_pool.close()
+            self._hosts = {}
+
+http_pool = HttpPool()
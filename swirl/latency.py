@@ -0,0 +1,62 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import math
+import threading
+
+from cachetools import TTLCache
+
+from django.conf import settings
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+SWIRL_HEDGE_PERCENTILE = getattr(settings, 'SWIRL_HEDGE_PERCENTILE', 95)
+SWIRL_HEDGE_WINDOW = getattr(settings, 'SWIRL_HEDGE_WINDOW', 100)
+SWIRL_HEDGE_MIN_SAMPLES = getattr(settings, 'SWIRL_HEDGE_MIN_SAMPLES', 20)
+
+# observed percentiles are recomputed at most once a minute per provider
+_percentile_cache = TTLCache(maxsize=1024, ttl=60)
+_percentile_lock = threading.Lock()
+
+#############################################
+
+def get_provider_timeout(provider):
+    '''
+    The provider's latency budget in seconds, SWIRL_TIMEOUT if it has none
+    '''
+    if provider and provider.timeout and provider.timeout > 0:
+        return float(provider.timeout)
+    return float(getattr(settings, 'SWIRL_TIMEOUT', 10))
+
+def percentile(values, pct):
+    '''
+    Nearest-rank percentile of a list of numbers, None if the list is empty
+    '''
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100.0 * len(ordered)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+def get_provider_latency_percentile(provider_id, pct=SWIRL_HEDGE_PERCENTILE):
+    '''
+    The pct percentile of the provider's recent response times, from the last SWIRL_HEDGE_WINDOW Result objects
+    Returns None until there are at least SWIRL_HEDGE_MIN_SAMPLES of them
+    '''
+    key = (provider_id, pct)
+    with _percentile_lock:
+        if key in _percentile_cache:
+            return _percentile_cache[key]
+
+    from swirl.models import Result
+    times = list(Result.objects.filter(provider_id=provider_id).order_by('-date_created').values_list('time', flat=True)[:SWIRL_HEDGE_WINDOW])
+    value = None
+    if len(times) >= SWIRL_HEDGE_MIN_SAMPLES:
+        value = percentile([t for t in times if t is not None], pct)
+
+    with _percentile_lock:
+        _percentile_cache[key] = value
+    return value
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swirl', '0002_alter_result_query_string_to_provider_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='search',
+            name='provider_status',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
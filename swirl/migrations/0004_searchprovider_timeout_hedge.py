@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swirl', '0003_search_provider_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchprovider',
+            name='hedge',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='searchprovider',
+            name='timeout',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['provider_id', '-date_created'], name='swirl_result_latency_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swirl', '0004_searchprovider_timeout_hedge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultItem',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('provider_id', models.IntegerField(default=0)),
+                ('position', models.IntegerField(default=0)),
+                ('swirl_score', models.FloatField(default=0.0)),
+                ('date_published', models.CharField(blank=True, default=str, max_length=64)),
+                ('searchprovider_rank', models.IntegerField(default=0)),
+                ('url', models.CharField(blank=True, default=str, max_length=2048)),
+                ('result_block', models.CharField(blank=True, default=str, max_length=50)),
+                ('new', models.BooleanField(default=False)),
+                ('item', models.JSONField(default=dict)),
+                ('date_indexed', models.DateTimeField(default=django.utils.timezone.now)),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='swirl.result')),
+                ('search_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='swirl.search')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['search_id', '-swirl_score', '-date_published', 'searchprovider_rank'], name='swirl_item_relevancy_idx'), models.Index(fields=['search_id', '-date_published'], name='swirl_item_date_idx'), models.Index(fields=['search_id', 'new'], name='swirl_item_new_idx'), models.Index(fields=['search_id', 'provider_id'], name='swirl_item_provider_idx')],
+            },
+        ),
+    ]
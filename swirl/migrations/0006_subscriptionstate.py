@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swirl', '0005_resultitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriptionState',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('provider_id', models.IntegerField(default=0)),
+                ('date_published', models.CharField(blank=True, default=str, max_length=64)),
+                ('date_queried', models.DateTimeField(blank=True, null=True)),
+                ('seen', models.JSONField(default=list)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('search_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='swirl.search')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('search_id', 'provider_id'), name='swirl_subscription_state_unique')],
+            },
+        ),
+    ]
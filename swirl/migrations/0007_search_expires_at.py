@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:04
+
+from dateutil.relativedelta import relativedelta
+from django.db import migrations, models
+
+# the retention periods when this migration was written, kept here so later changes to swirl.models don't alter it
+RETENTION_PERIODS = {
+    1: relativedelta(hours=1),
+    2: relativedelta(days=1),
+    3: relativedelta(months=1)
+}
+
+
+def set_expires_at(apps, schema_editor):
+    # same as Search.save(), from the last update of each search that expires
+    Search = apps.get_model('swirl', 'Search')
+    searches = []
+    for search in Search.objects.filter(retention__in=RETENTION_PERIODS.keys()).only('id', 'retention', 'date_updated').iterator():
+        search.expires_at = search.date_updated + RETENTION_PERIODS[search.retention]
+        searches.append(search)
+    Search.objects.bulk_update(searches, ['expires_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swirl', '0006_subscriptionstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='search',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(set_expires_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:04
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swirl', '0007_search_expires_at'),
+    ]
+
+    operations = [
+        migrations.RenameModel(
+            old_name='ResultItem',
+            new_name='ResultRow',
+        ),
+    ]
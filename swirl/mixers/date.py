@@ -15,14 +15,13 @@ path.append(swirl_setdir()) # path to settings.py file
 environ.setdefault('DJANGO_SETTINGS_MODULE', 'swirl_server.settings')
 django.setup()
 
-from operator import itemgetter
-
 from django.urls import reverse
 
 import logging
 logger = logging.getLogger(__name__)
 
 from swirl.mixers.mixer import Mixer
+from swirl.result_items import mark_items_read
 from swirl.mixers.utils import *
 
 #############################################
@@ -32,22 +31,37 @@ class DateMixer(Mixer):
 
     type = 'DateMixer'
 
+    item_ordering = ['-date_published', 'id']
+
     def order(self):
 
+        if self.items is not None:
+            dated_items = self.items.exclude(date_published='unknown')
+            unknown = int(self.found) - dated_items.count()
+            self.mix_wrapper['messages'].append(f"[{datetime.now()}] DateMixer hid {unknown} results with date_published='unknown'")
+            self.found = int(self.found) - int(unknown)
+            self.mix_wrapper['info']['results']['retrieved_total'] = self.found
+            self.order_items(dated_items)
+            return
+
         # remove and count date_published == unknown
         unknown = 0
-        dated_results = []
-        for result in self.all_results:
-            if result['date_published'] == 'unknown':
-                unknown = unknown + 1
-                continue
-            dated_results.append(result)
+        dated_lists = []
+        for results in self.get_result_lists():
+            dated_results = []
+            for result in results:
+                if result['date_published'] == 'unknown':
+                    unknown = unknown + 1
+                    continue
+                dated_results.append(result)
+            dated_lists.append(dated_results)
+        # end for
 
         self.mix_wrapper['messages'].append(f"[{datetime.now()}] DateMixer hid {unknown} results with date_published='unknown'")
         self.found = int(self.found) - int(unknown)
         self.mix_wrapper['info']['results']['retrieved_total'] = self.found
 
-        self.mixed_results = sorted(dated_results, key=itemgetter('date_published'), reverse=True)
+        self.mixed_results = self.merge(dated_lists, date_key)
 
 #############################################
 
@@ -55,8 +69,30 @@ class DateNewItemsMixer(Mixer):
 
     type = 'DateNewItemsMixer'
 
+    item_ordering = ['-date_published', 'id']
+
     def order(self):
 
+        if self.items is not None:
+            # same as below: orders the dated results
+            total = self.found
+            dated_items = self.items.exclude(date_published='unknown')
+            unknown = int(self.found) - dated_items.count()
+            self.mix_wrapper['messages'].append(f"[{datetime.now()}] DateNewItemsMixer hid {unknown} results with date_published='unknown'")
+            self.found = int(self.found) - int(unknown)
+            self.mix_wrapper['info']['results']['retrieved_total'] = self.found
+            if self.found == 0:
+                self.mix_wrapper['messages'].append(f"[{datetime.now()}] DateNewItemsMixer found 0 new results")
+            else:
+                self.mix_wrapper['messages'].append(f"[{datetime.now()}] DateNewItemsMixer hid {total - int(self.found)} old results")
+            self.order_items(dated_items)
+            if self.mark_all_read:
+                marked = mark_items_read(self.items)
+                for item in self.mixed_results:
+                    item.pop('new', None)
+                self.mix_wrapper['messages'].append(f"[{datetime.now()}] DateNewItemsMixer marked {marked} results as read")
+            return
+
         # filter to new=True
         self.new_results = [result for result in self.all_results if 'new' in result]
 
@@ -79,12 +115,16 @@ class DateNewItemsMixer(Mixer):
 
         # remove and count date_published == unknown
         unknown = 0
-        dated_results = []
-        for result in self.all_results:
-            if result['date_published'] == 'unknown':
-                unknown = unknown + 1
-                continue
-            dated_results.append(result)
+        dated_lists = []
+        for results in self.get_result_lists():
+            dated_results = []
+            for result in results:
+                if result['date_published'] == 'unknown':
+                    unknown = unknown + 1
+                    continue
+                dated_results.append(result)
+            dated_lists.append(dated_results)
+        # end for
 
         self.mix_wrapper['messages'].append(f"[{datetime.now()}] DateNewItemsMixer hid {unknown} results with date_published='unknown'")
         self.found = int(self.found) - int(unknown)
@@ -95,4 +135,4 @@ class DateNewItemsMixer(Mixer):
         else:
             self.mix_wrapper['messages'].append(f"[{datetime.now()}] DateNewItemsMixer hid {len(self.all_results) - int(self.found)} old results")
 
-        self.mixed_results = sorted(dated_results, key=itemgetter('date_published'), reverse=True)
+        self.mixed_results = self.merge(dated_lists, date_key)
@@ -3,7 +3,10 @@
 @contact:    sid@swirl.today
 @version:    Swirl 1.3
 '''
+import copy
+import heapq
 import json
+from itertools import islice
 from urllib.parse import urlparse
 
 from sys import path
@@ -13,7 +16,6 @@ from datetime import datetime
 import django
 from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
-from django.contrib.auth.models import User
 
 from swirl.utils import get_url_details, swirl_setdir
 path.append(swirl_setdir()) # path to settings.py file
@@ -27,6 +29,8 @@ logger = logging.getLogger(__name__)
 from natsort import natsorted
 
 from swirl.models import Search, Result
+from swirl.result_items import SWIRL_RESULT_ITEMS, get_result_items, get_item
+from swirl.ranking_cache import ranking_cache, get_ranking_key
 from swirl.banner import SWIRL_BANNER_TEXT
 
 ########################################
@@ -36,6 +40,9 @@ class Mixer:
 
     type = "SWIRL Mixer"
 
+    # mixers that can order the ResultRow table set the order_by fields, see order_items()
+    item_ordering = None
+
     ########################################
 
     def __init__(self, search_id, results_requested, page, explain=False, provider=None, mark_all_read=False, request=None):
@@ -57,6 +64,13 @@ class Mixer:
         self.mark_all_read = mark_all_read
         self.status = "INIT"
         self.request = request
+        # the ResultRows, when the mixer orders and pages in the database
+        self.items = None
+        # the position of mixed_results[0] in the ordered results
+        self.offset = 0
+        # the cached ranking, see swirl/ranking_cache.py
+        self.ranking_key = None
+        self.ranking = None
 
         try:
             if self.provider:
@@ -73,11 +87,29 @@ class Mixer:
             else:
                 # security review for 1.7 - OK, filtered by search ID
                 self.results = Result.objects.filter(search_id=search_id)
-            self.search = Search.objects.get(id=self.search_id)
+            self.search = Search.objects.select_related('owner').get(id=self.search_id)
         except ObjectDoesNotExist as err:
             self.error(f'Search does not exist: {search_id}')
             return
 
+        if ranking_cache.enabled and not self.mark_all_read and self.results is not None and self.search.status.endswith('_READY'):
+            self.ranking_key = get_ranking_key(self.search, self.results, self.type, self.provider, self.explain,
+                                               generation=ranking_cache.get_generation(self.search_id))
+            self.ranking = ranking_cache.get(self.ranking_key)
+            if self.ranking:
+                # mix() pages the cached ranking
+                self.result_mixer = self.type
+                self.found = self.ranking['found']
+                self.status = 'READY'
+                return
+
+        if SWIRL_RESULT_ITEMS and self.item_ordering and self.results is not None:
+            # the items are read from the ResultRow table, not the json_results
+            results = self.results.defer('json_results')
+            self.items = get_result_items(self.search_id, results)
+            if self.items is not None:
+                self.results = results
+
         self.result_mixer = self.type
 
         self.mix_wrapper = {}
@@ -122,14 +154,20 @@ class Mixer:
             self.mix_wrapper['info']['search']['searchprovider_list'] = self.search.searchprovider_list
         self.mix_wrapper['info']['search']['query_string'] = self.search.query_string
         self.mix_wrapper['info']['search']['query_string_processed'] = self.search.query_string_processed
+        # PARTIAL_RESULTS_READY while streaming federation is still waiting on some providers
+        self.mix_wrapper['info']['search']['status'] = self.search.status
+        if self.search.provider_status:
+            self.mix_wrapper['info']['search']['provider_status'] = self.search.provider_status
         self.mix_wrapper['info']['search']['rerun_url'] = f'{scheme}://{hostname}:{port}/swirl/search/?rerun={self.search.id}'
 
-        # join json_results
-        for result in self.results:
-            if type(result.json_results) == list:
-                self.all_results = self.all_results + result.json_results
-
-        self.found = len(self.all_results)
+        if self.items is not None:
+            self.found = self.items.count()
+        else:
+            # join json_results
+            for result in self.results:
+                if type(result.json_results) == list:
+                    self.all_results = self.all_results + result.json_results
+            self.found = len(self.all_results)
 
         self.mix_wrapper['info']['results']['retrieved_total'] = self.found
         # set the order in the dict
@@ -161,8 +199,28 @@ class Mixer:
         Executes the workflow for a given mixer
         '''
 
+        if self.ranking:
+            return self.mix_ranking()
         self.order()
         self.finalize()
+        if self.mark_all_read:
+            ranking_cache.invalidate(self.search_id)
+        return self.mix_wrapper
+
+    def mix_ranking(self):
+
+        '''
+        Returns the requested page of the cached ranking
+        '''
+
+        self.mix_wrapper = copy.deepcopy(self.ranking['mix_wrapper'])
+        self.mixed_results = self.ranking['results']
+        if (int(self.page)-1)*int(self.results_requested) > self.ranking['mixed']:
+            self.error("Page not found, results exhausted")
+            self.mix_wrapper['results'] = []
+            self.mix_wrapper['messages'].append(f"[{datetime.now()}] Results exhausted for {self.search_id}")
+            return self.mix_wrapper
+        self.paginate()
         return self.mix_wrapper
 
     ########################################
@@ -176,6 +234,53 @@ class Mixer:
 
         self.mixed_results = self.all_results[(self.page-1)*self.results_requested:(self.page)*self.results_requested]
 
+    def get_result_lists(self):
+
+        '''
+        The json_results of each Result, in the order all_results joins them
+        '''
+
+        return [result.json_results for result in self.results if type(result.json_results) == list]
+
+    def merge(self, result_lists, key):
+
+        '''
+        Returns the results in key order, ties in all_results order, as sorted(all_results, key=key) would
+        Each list is sorted on its own, which is linear if it was saved in key order (see presort()), then they are
+        merged with a heap; only the first results_needed are merged, plus all result block items, unless the whole
+        ranking is being cached for later pages
+        '''
+
+        block_lists = []
+        ranked_lists = []
+        for results in result_lists:
+            ranked = sorted(results, key=key)
+            block_lists.append([result for result in ranked if 'result_block' in result])
+            ranked_lists.append([result for result in ranked if not 'result_block' in result])
+        # end for
+        merged = heapq.merge(*ranked_lists, key=key)
+        if self.ranking_key is None:
+            merged = islice(merged, int(self.results_needed))
+        # finalize() moves the block items out of the ranking
+        return list(heapq.merge(*block_lists, key=key)) + list(merged)
+
+    def order_items(self, items):
+
+        '''
+        Orders the ResultRows by item_ordering in the database, loading only the requested page into mixed_results,
+        after any result block items, which are moved out of the page by finalize()
+        '''
+
+        items = items.order_by(*self.item_ordering)
+        block_items = [get_item(row) for row in items.exclude(result_block='')]
+        items = items.filter(result_block='')
+        start = (int(self.page)-1)*int(self.results_requested)
+        page_items = []
+        if items.count() >= start:
+            self.offset = start
+            page_items = [get_item(row) for row in items[start:int(self.results_needed)]]
+        self.mixed_results = block_items + page_items
+
     ########################################
 
     def finalize(self):
@@ -185,14 +290,14 @@ class Mixer:
         '''
 
         # check for overrun
-        if (int(self.page)-1)*int(self.results_requested) > len(self.mixed_results):
+        if (int(self.page)-1)*int(self.results_requested) > self.offset + len(self.mixed_results):
             self.error("Page not found, results exhausted")
             self.mix_wrapper['results'] = []
             self.mix_wrapper['messages'].append(f"[{datetime.now()}] Results exhausted for {self.search_id}")
             return
 
         # number all result blocks
-        mixed_result_number = 1
+        mixed_result_number = self.offset + 1
         mixed_results = []
         block_dict = {}
         for result in self.mixed_results:
@@ -245,9 +350,26 @@ class Mixer:
             if self.mix_wrapper['info']['results']['retrieved_total'] < 0:
                 self.warning("Block count exceeds result count")
 
-        # extract the page of mixed results
+        if self.ranking_key and self.items is None and self.status != 'ERROR':
+            # the whole ranking, later pages are sliced from it
+            ranking_cache.set(self.ranking_key, {'mix_wrapper': copy.deepcopy(self.mix_wrapper), 'results': mixed_results,
+                                                 'found': self.found, 'mixed': len(self.mixed_results)})
+
         self.mixed_results = mixed_results
-        self.mix_wrapper['results'] = self.mixed_results[(int(self.page)-1)*int(self.results_requested):int(self.results_needed)]
+        self.paginate()
+
+    ########################################
+
+    def paginate(self):
+
+        '''
+        Extracts the requested page of mixed_results into mix_wrapper, with the page links
+        '''
+
+        self.mix_wrapper['results'] = self.mixed_results[(int(self.page)-1)*int(self.results_requested)-self.offset:int(self.results_needed)-self.offset]
+        if self.ranking_key:
+            # the cached ranking is shared
+            self.mix_wrapper['results'] = copy.deepcopy(self.mix_wrapper['results'])
         self.mix_wrapper['info']['results']['retrieved'] = len(self.mix_wrapper['results'])
 
         scheme, hostname, port = get_url_details(self.request)
@@ -274,5 +396,5 @@ class Mixer:
                 self.mix_wrapper['messages'].append(f"[{datetime.now()}] Results ordered by: {self.type}")
 
         # log info
-        user = User.objects.get(id=self.search.owner.id)
+        user = self.search.owner
         logger.info(f"{user} results {self.search_id} {self.type} {self.mix_wrapper['info']['results']['retrieved_total']}")
\ No newline at end of file
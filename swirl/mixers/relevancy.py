@@ -18,9 +18,8 @@ django.setup()
 import logging
 logger = logging.getLogger(__name__)
 
-from operator import itemgetter
-
 from swirl.mixers.mixer import Mixer
+from swirl.result_items import mark_items_read
 from swirl.mixers.utils import *
 
 #############################################
@@ -30,10 +29,16 @@ class RelevancyMixer(Mixer):
 
     type = 'RelevancyMixer'
 
+    item_ordering = ['-swirl_score', '-date_published', 'searchprovider_rank', 'id']
+
     def order(self):
 
-        # sort by score
-        self.mixed_results = sorted(sorted(sorted(self.all_results, key=itemgetter('searchprovider_rank')), key=itemgetter('date_published'), reverse=True), key=itemgetter('swirl_score'), reverse=True)
+        if self.items is not None:
+            self.order_items(self.items)
+            return
+
+        # merge by score
+        self.mixed_results = self.merge(self.get_result_lists(), relevancy_key)
 
 #############################################
 
@@ -41,10 +46,30 @@ class RelevancyNewItemsMixer(Mixer):
 
     type = 'RelevancyNewItemsMixer'
 
+    item_ordering = ['-swirl_score', '-date_published', 'searchprovider_rank', 'id']
+
     def order(self):
 
+        if self.items is not None:
+            new_items = self.items.filter(new=True)
+            total = self.found
+            self.found = new_items.count()
+            self.mix_wrapper['info']['results']['retrieved_total'] = self.found
+            if self.found == 0:
+                self.mix_wrapper['messages'].append(f"[{datetime.now()}] RelevancyNewItemsMixer found 0 new results")
+            else:
+                self.mix_wrapper['messages'].append(f"[{datetime.now()}] RelevancyNewItemsMixer hid {total - int(self.found)} old results")
+            self.order_items(new_items)
+            if self.mark_all_read:
+                marked = mark_items_read(new_items)
+                for item in self.mixed_results:
+                    item.pop('new', None)
+                self.mix_wrapper['messages'].append(f"[{datetime.now()}] RelevancyNewItemsMixer marked {marked} results as read")
+            return
+
         # filter to new=True
-        self.new_results = [result for result in self.all_results if 'new' in result]
+        new_lists = [[result for result in results if 'new' in result] for results in self.get_result_lists()]
+        self.new_results = [result for results in new_lists for result in results]
 
         # clear new flag if requested
         if self.mark_all_read:
@@ -70,5 +95,6 @@ class RelevancyNewItemsMixer(Mixer):
         else:
             self.mix_wrapper['messages'].append(f"[{datetime.now()}] RelevancyNewItemsMixer hid {len(self.all_results) - int(self.found)} old results")
 
-        # sort by score
-        self.mixed_results = sorted(sorted(sorted(self.new_results, key=itemgetter('searchprovider_rank')), key=itemgetter('date_published'), reverse=True), key=itemgetter('swirl_score'), reverse=True)
+        # merge by score
+        self.mixed_results = self.merge(new_lists, relevancy_key)
+
@@ -31,56 +31,62 @@ class StackNMixer(Mixer):
 
     def order(self):
 
-        # sort the json_results by score
-        ranked_results = sorted(sorted(self.all_results, key=itemgetter('searchprovider_rank')), key=itemgetter('swirl_score'), reverse=True)
-        # organize results by provider
+        # organize results by provider, then sort each provider's results by score
+        # the providers are ranked by their top result, ties in the order of all_results
         dict_ranked_by_provider = {}
-        for result in ranked_results:
+        dict_first_position = {}
+        for position, result in enumerate(self.all_results):
             if 'searchprovider' in result:
                 if not result['searchprovider'] in dict_ranked_by_provider:
                     dict_ranked_by_provider[result['searchprovider']] = []
-                dict_ranked_by_provider[result['searchprovider']].append(result)
-        # generate list of ranked providers
-        list_top_each_provider = []
+                dict_ranked_by_provider[result['searchprovider']].append((stack_key(result), position, result))
+        # end for
         for provider in dict_ranked_by_provider:
-            list_top_each_provider.append(dict_ranked_by_provider[provider][0])
-        list_ranked_providers = sorted(list_top_each_provider, key=itemgetter('swirl_score'), reverse=True)
+            ranked = sorted(dict_ranked_by_provider[provider], key=itemgetter(0, 1))
+            dict_first_position[provider] = ranked[0][:2]
+            dict_ranked_by_provider[provider] = [result for key, position, result in ranked]
+        # end for
         dict_ranked_providers = {}
-        for provider in list_ranked_providers:
-            dict_ranked_providers[provider['searchprovider']] = provider['swirl_score']
+        for provider in sorted(dict_first_position, key=dict_first_position.get):
+            dict_ranked_providers[provider] = dict_ranked_by_provider[provider][0]['swirl_score']
 
         if self.stack == 0:
             self.stack = int(int(self.results_requested)/len(dict_ranked_providers))
 
-        # mix the results
+        # mix the results, each provider's position is a cursor into its ranked results
+        # the page is enough, unless the whole ranking is being cached for later pages
+        results_needed = int(self.results_needed)
+        if self.ranking_key:
+            results_needed = sum(len(dict_ranked_by_provider[provider]) for provider in dict_ranked_by_provider)
         stacked_results = []
         position = 0
         last_len = 0
-        while len(stacked_results) < self.results_needed:
+        while len(stacked_results) < results_needed:
             for searchprovider in dict_ranked_providers:
                 for p in range(0,self.stack):
                     if len(dict_ranked_by_provider[searchprovider]) > position + p:
                         stacked_results.append(dict_ranked_by_provider[searchprovider][position + p])
                     # done if we now have enough
                     # w/o the below, we add one per source until exceeding that might be OK but should be deliberate
-                    if len(stacked_results) == self.results_needed:
+                    if len(stacked_results) == results_needed:
                         break
                 else:
                     # out of results for that provider
                     pass
                 # end for
-                if len(stacked_results) == self.results_needed:
+                if len(stacked_results) == results_needed:
                     break
             # end for
             if len(stacked_results) == last_len:
                 # no more results
-                self.warning(f'results exhausted')
                 break
             else:
                 last_len = len(stacked_results)
             # end if
             position = position + self.stack
         # end while
+        if len(stacked_results) < int(self.results_needed):
+            self.warning(f'results exhausted')
 
         self.mixed_results = stacked_results
 
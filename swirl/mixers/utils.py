@@ -37,3 +37,42 @@ def create_mix_wrapper(result_sets):
         mix_wrapper['info'][result_set.searchprovider]['result_processor']=result_set.result_processor
     mix_wrapper['results'] = None
     return mix_wrapper
+
+#############################################
+
+class Descending:
+
+    '''
+    Reverses the order of a value in a sort key, for the descending parts of a mixed order
+    '''
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+def relevancy_key(result):
+    # swirl_score descending, then date_published descending, then searchprovider_rank
+    return (-result['swirl_score'], Descending(result['date_published']), result['searchprovider_rank'])
+
+def date_key(result):
+    return Descending(result['date_published'])
+
+def stack_key(result):
+    return (-result['swirl_score'], result['searchprovider_rank'])
+
+def presort(results, key=relevancy_key):
+
+    # accepts: a list of results
+    # returns: the list in key order, so a mixer merging it later only has to check it; unchanged if a result can't be keyed
+
+    try:
+        return sorted(results, key=key)
+    except (KeyError, TypeError):
+        return results
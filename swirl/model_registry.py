@@ -0,0 +1,217 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+SWIRL_PRELOAD_MODELS = getattr(settings, 'SWIRL_PRELOAD_MODELS', False)
+
+#############################################
+
+def get_rss():
+    '''
+    Resident set size of this process in bytes, 0 if it can't be determined
+    '''
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        import sys
+        # peak, not current; bytes on macOS, kilobytes elsewhere
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+    except (ImportError, ValueError):
+        return 0
+
+#############################################
+# loaders - each imports its own library, so nothing heavy is imported until a model is needed
+
+def load_spacy():
+    import spacy
+    return spacy.load('en_core_web_lg')
+
+def load_presidio_analyzer():
+    from presidio_analyzer import AnalyzerEngine
+    return AnalyzerEngine()
+
+def load_presidio_anonymizer():
+    from presidio_anonymizer import AnonymizerEngine
+    return AnonymizerEngine()
+
+def load_textblob():
+    from textblob import TextBlob
+    # the spelling model is read on first correct()
+    TextBlob('swirl').correct()
+    return TextBlob
+
+def load_tiktoken(model):
+    import tiktoken
+    return tiktoken.encoding_for_model(model)
+
+def load_transformer(model_name):
+    from transformers import AutoModel, AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+    return tokenizer, model
+
+#############################################
+
+class ModelRegistry:
+
+    '''
+    Loads each registered model on first use, once per process, and records how long it took and how much memory it added
+    Models that take an argument (a tiktoken model name) are loaded and reported once per argument
+    Transformer models are not kept here, see EmbeddingModelPool in swirl/embeddings.py
+    '''
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def register(self, name, loader):
+        self._loaders[name] = loader
+
+    def names(self):
+        return list(self._loaders.keys())
+
+    def _label(self, name, arg):
+        if arg is None:
+            return name
+        return f'{name}:{arg}'
+
+    def is_loaded(self, name, arg=None):
+        return (name, arg) in self._models
+
+    def get(self, name, arg=None):
+        key = (name, arg)
+        if key in self._models:
+            return self._models[key]
+        if not name in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key in self._models:
+                return self._models[key]
+            label = self._label(name, arg)
+            logger.info(f"model_registry: loading {label}")
+            rss_before = get_rss()
+            start_time = time.time()
+            if arg is None:
+                model = self._loaders[name]()
+            else:
+                model = self._loaders[name](arg)
+            load_time = time.time() - start_time
+            self._stats[label] = {
+                'name': label,
+                'load_time': round(load_time, 3),
+                'rss_delta': max(get_rss() - rss_before, 0)
+            }
+            self._models[key] = model
+            logger.info(f"model_registry: loaded {label} in {round(load_time, 3)}s")
+        return model
+
+    def unload(self, name, arg=None):
+        with self._lock:
+            self._models.pop((name, arg), None)
+            self._stats.pop(self._label(name, arg), None)
+
+    def stats(self):
+        return list(self._stats.values())
+
+model_registry = ModelRegistry()
+model_registry.register('spacy', load_spacy)
+model_registry.register('presidio_analyzer', load_presidio_analyzer)
+model_registry.register('presidio_anonymizer', load_presidio_anonymizer)
+model_registry.register('textblob', load_textblob)
+model_registry.register('tiktoken', load_tiktoken)
+
+def get_model(name, arg=None):
+    return model_registry.get(name, arg)
+
+#############################################
+# processors and connectors that need a model
+
+PROCESSOR_MODELS = {
+    'CosineRelevancyResultProcessor': ['spacy'],
+    'DedupeBySimilarityPostResultProcessor': ['spacy'],
+    'RemovePIIQueryProcessor': ['presidio_analyzer', 'presidio_anonymizer'],
+    'RedactPIIResultProcessor': ['presidio_analyzer', 'presidio_anonymizer'],
+    'RedactPIIPostResultProcessor': ['presidio_analyzer', 'presidio_anonymizer'],
+    'SpellcheckQueryProcessor': ['textblob']
+}
+
+VECTOR_DB_CONNECTORS = ['PineconeDB', 'QdrantDB']
+
+def get_configured_models():
+    '''
+    Returns the (name, arg) models needed by the processors and connectors of the active SearchProviders
+    and by the pre-query and post-result processors Search objects get by default
+    '''
+    from swirl.models import Search, SearchProvider
+    from swirl.processors.utils import get_tag
+
+    processors = set()
+    models = []
+    search = Search()
+    processors.update(search.pre_query_processors)
+    processors.update(search.post_result_processors)
+    for provider in SearchProvider.objects.filter(active=True):
+        processors.update(provider.query_processors or [])
+        processors.update(provider.result_processors or [])
+        if provider.connector in VECTOR_DB_CONNECTORS:
+            model_name = get_tag('model', provider.tags)
+            if model_name and not ('transformers', model_name) in models:
+                models.append(('transformers', model_name))
+    for processor in sorted(processors):
+        for name in PROCESSOR_MODELS.get(processor, []):
+            if not (name, None) in models:
+                models.append((name, None))
+    return models
+
+def preload_models(models=None):
+    '''
+    Load the given models, or the configured ones, now instead of on first use
+    '''
+    if models is None:
+        models = get_configured_models()
+    for name, arg in models:
+        try:
+            if name == 'transformers':
+                from swirl.embeddings import embedding_pool
+                embedding_pool.get(arg)
+            else:
+                model_registry.get(name, arg)
+        except Exception as err:
+            logger.warning(f"model_registry: failed to preload {model_registry._label(name, arg)}: {err}")
+    return get_model_stats()
+
+def get_model_stats():
+    '''
+    Load time and memory of every model loaded in this process, including the transformer models in the embedding pool
+    '''
+    from swirl.embeddings import embedding_pool
+    stats = model_registry.stats()
+    for pool_stats in embedding_pool.stats():
+        if pool_stats['name'] in embedding_pool.loaded():
+            stats.append({
+                'name': f"transformers:{pool_stats['name']}",
+                'load_time': pool_stats['load_time'],
+                'rss_delta': pool_stats['size']
+            })
+    return stats
@@ -5,6 +5,9 @@
 
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
+
+from dateutil.relativedelta import relativedelta
 
 def getSearchProviderQueryProcessorsDefault():
     return ["AdaptiveQueryProcessor"]
@@ -128,6 +131,10 @@ class SearchProvider(models.Model):
     result_processors = models.JSONField(default=getSearchProviderResultProcessorsDefault, blank=True)
     result_mappings = models.CharField(max_length=2048, default=str, blank=True)
     results_per_query = models.IntegerField(default=10)
+    # latency budget in seconds, 0 uses SWIRL_TIMEOUT
+    timeout = models.FloatField(default=0.0)
+    # send a duplicate request if this provider hasn't answered within its observed p95 latency
+    hedge = models.BooleanField(default=False)
     eval_credentials = models.CharField(max_length=100, default=str, blank=True)
     credentials = models.CharField(max_length=512, default=str, blank=True)
     tags = models.JSONField(default=list)
@@ -150,6 +157,18 @@ def getSearchPreQueryProcessorsDefault():
 def getSearchPostResultProcessorsDefault():
     return ["DedupeByFieldPostResultProcessor","CosineRelevancyPostResultProcessor"]
 
+# how long after its last update a search is kept, by retention
+RETENTION_PERIODS = {
+    1: relativedelta(hours=1),
+    2: relativedelta(days=1),
+    3: relativedelta(months=1)
+}
+
+def get_search_expiration(retention, date_updated):
+    if not retention in RETENTION_PERIODS:
+        return None
+    return date_updated + RETENTION_PERIODS[retention]
+
 class Search(models.Model):
     id = models.BigAutoField(primary_key=True)
     owner = models.ForeignKey('auth.User', on_delete=models.CASCADE)
@@ -166,6 +185,7 @@ class Search(models.Model):
     searchprovider_list = models.JSONField(default=list, blank=True)
     subscribe = models.BooleanField(default=False)
     status = models.CharField(max_length=50, default='NEW_SEARCH')
+    provider_status = models.JSONField(default=dict, blank=True)
     time = models.FloatField(default=0.0)
     PRE_QUERY_PROCESSOR_CHOICES = [
         ('ChatGPTQueryProcessor', 'ChatGPTQueryProcessor'),
@@ -206,10 +226,16 @@ class Search(models.Model):
     ]
     retention = models.IntegerField(default=0, choices=RETENTION_CHOICES)
     tags = models.JSONField(default=list)
+    # when the expirer deletes the search, set on save from retention; None if it never expires
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     class Meta:
         ordering = ['-date_updated']
 
+    def save(self, *args, **kwargs):
+        self.expires_at = get_search_expiration(self.retention, timezone.now())
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         # Returns the URL to access
         return reverse('model-detail-view', args=[str(self.id)])
@@ -241,6 +267,10 @@ class Result(models.Model):
 
     class Meta:
         ordering = ['-date_updated']
+        indexes = [
+            # a provider's most recent response times, see swirl/latency.py
+            models.Index(fields=['provider_id', '-date_created'], name='swirl_result_latency_idx'),
+        ]
 
     def get_absolute_url(self):
         # Returns the URL to access
@@ -250,6 +280,54 @@ class Result(models.Model):
         signature = str(self.id) + ':' + str(self.search_id) + ':' + str(self.searchprovider)
         return signature
 
+class ResultRow(models.Model):
+    # one row per json_results item, so mixers can order and page in the database; see swirl/result_items.py
+    id = models.BigAutoField(primary_key=True)
+    search_id = models.ForeignKey(Search, on_delete=models.CASCADE)
+    result = models.ForeignKey(Result, on_delete=models.CASCADE)
+    provider_id = models.IntegerField(default=0)
+    position = models.IntegerField(default=0)
+    swirl_score = models.FloatField(default=0.0)
+    date_published = models.CharField(max_length=64, default=str, blank=True)
+    searchprovider_rank = models.IntegerField(default=0)
+    url = models.CharField(max_length=2048, default=str, blank=True)
+    result_block = models.CharField(max_length=50, default=str, blank=True)
+    new = models.BooleanField(default=False)
+    item = models.JSONField(default=dict)
+    # when the search was indexed, Results updated after this aren't in the table yet
+    date_indexed = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['search_id', '-swirl_score', '-date_published', 'searchprovider_rank'], name='swirl_item_relevancy_idx'),
+            models.Index(fields=['search_id', '-date_published'], name='swirl_item_date_idx'),
+            models.Index(fields=['search_id', 'new'], name='swirl_item_new_idx'),
+            models.Index(fields=['search_id', 'provider_id'], name='swirl_item_provider_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.result_id}:{self.position}'
+
+class SubscriptionState(models.Model):
+    # where incremental subscription updates left off, per search and provider; see swirl/subscriptions.py
+    id = models.BigAutoField(primary_key=True)
+    search_id = models.ForeignKey(Search, on_delete=models.CASCADE)
+    provider_id = models.IntegerField(default=0)
+    # the latest date_published retrieved, and when the provider was last queried
+    date_published = models.CharField(max_length=64, default=str, blank=True)
+    date_queried = models.DateTimeField(null=True, blank=True)
+    # hashes of the dedupe keys of the items retrieved so far
+    seen = models.JSONField(default=list)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['search_id', 'provider_id'], name='swirl_subscription_state_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.search_id_id}:{self.provider_id}'
+
 class QueryTransform(models.Model) :
     id = models.BigAutoField(primary_key=True)
     name = models.CharField(max_length=255)
@@ -39,6 +39,17 @@ class ProviderQueryRequestLogger:
         elapsed_time = time.time() - self.start_time
         logger.debug(f'PLG_PXC|{self.request_id}|{round(elapsed_time,4)}|{self.name}')
 
+class ResultProcessorStageLogger:
+    def __init__(self, request_id, name, processor, items, elapsed_time):
+        self.request_id = request_id
+        self.name = name
+        self.processor = processor
+        self.items = items
+        self.elapsed_time = elapsed_time
+
+    def log(self):
+        logger.debug(f'PLG_RPS|{self.request_id}|{round(self.elapsed_time,4)}|{self.name}|{self.processor}|{self.items}')
+
 class SwirlRelevancyLogger:
     def __init__(self,  request_id, name="anonymous",log_sim=False):
         self.request_id = request_id
@@ -5,7 +5,9 @@
 
 from swirl.processors.processor import *
 from django.conf import settings
-from swirl.spacy import nlp
+from swirl.spacy import get_vector, SpacyVectorBatch
+from swirl.processors.near_duplicates import NearDuplicateIndex
+from swirl.processors.utils import get_tag
 
 from celery.utils.log import get_task_logger
 logger = get_task_logger(__name__)
@@ -16,6 +18,10 @@ logger = get_task_logger(__name__)
 SWIRL_DEDUPE_FIELD = getattr(settings, 'SWIRL_DEDUPE_FIELD', 'url')
 SWIRL_DEDUPE_SIMILARITY_FIELDS = getattr(settings, 'SWIRL_DEDUPE_SIMILARITY_FIELDS', ['title', 'body'])
 SWIRL_DEDUPE_SIMILARITY_MINIMUM = getattr(settings, 'SWIRL_DEDUPE_SIMILARITY_MINIMUM', 0.95)
+# 'pairwise' compares each result with every result kept so far, 'lsh' only with the near duplicates found by NearDuplicateIndex
+SWIRL_DEDUPE_SIMILARITY_ENGINE = getattr(settings, 'SWIRL_DEDUPE_SIMILARITY_ENGINE', 'pairwise')
+# search tag that selects the engine for one search, e.g. DedupeEngine:lsh
+SWIRL_DEDUPE_ENGINE_TAG = 'DedupeEngine'
 
 def _get_field_value_top_level_or_payload (item, field):
     """
@@ -43,6 +49,16 @@ def _dedup_results (results, dedupe_key_dict, deduped_item_list, grouping_field)
     # end for
     return n_dups
 
+def _get_similarity_content(item):
+    content = ""
+    for field in SWIRL_DEDUPE_SIMILARITY_FIELDS:
+        if field in item:
+            if field:
+                content = content + ' ' + item[field].strip()
+            # end if
+    # end for
+    return content.strip()
+
 class DedupeByFieldResultProcessor(ResultProcessor):
     """
     This is meant to remove duplcates from a single source, this is what differentiates from a post result processor
@@ -86,7 +102,7 @@ class DedupeByFieldPostResultProcessor(PostResultProcessor):
             deduped_item_list = []
             dupes = dupes + _dedup_results(result.json_results, dedupe_key_dict, deduped_item_list, SWIRL_DEDUPE_FIELD)
             result.json_results = deduped_item_list
-            result.save()
+            self.save_result(result)
         # end for
 
         if dupes > 0:
@@ -102,22 +118,22 @@ class DedupeBySimilarityPostResultProcessor(PostResultProcessor):
 
     type="DedupeBySimilarityPostResultProcessor"
 
+    def get_engine(self):
+        engine = get_tag(SWIRL_DEDUPE_ENGINE_TAG, self.search.tags) or SWIRL_DEDUPE_SIMILARITY_ENGINE
+        return str(engine).strip().lower()
+
     def process(self):
 
+        if self.get_engine() == 'lsh':
+            return self.process_lsh()
+
         dupes = 0
         nlp_list = []
         for result in self.results:
             deduped_item_list = []
             for item in result.json_results:
-                content = ""
-                for field in SWIRL_DEDUPE_SIMILARITY_FIELDS:
-                    if field in item:
-                        if field:
-                            content = content + ' ' + item[field].strip()
-                        # end if
-                # end for
-                content = content.strip()
-                nlp_content = nlp(content)
+                content = _get_similarity_content(item)
+                nlp_content = get_vector(content)
                 dupe = False
                 max_sim = 0.0
                 for n in nlp_list:
@@ -139,7 +155,7 @@ class DedupeBySimilarityPostResultProcessor(PostResultProcessor):
             # end for
             result.json_results = deduped_item_list
             logger.debug(f"{self}: result.save()")
-            result.save()
+            self.save_result(result)
         # end for
 
         if dupes > 0:
@@ -147,4 +163,58 @@ class DedupeBySimilarityPostResultProcessor(PostResultProcessor):
         else:
             self.results_updated = 0
             
-        return self.results_updated
\ No newline at end of file
+        return self.results_updated
+
+    def process_lsh(self):
+
+        '''
+        Same as process(), but each result is only compared with the kept results NearDuplicateIndex finds as
+        candidates, and all the vectors are computed in one batch
+        '''
+
+        dupes = 0
+        batch = SpacyVectorBatch()
+        contents = []
+        for result in self.results:
+            for item in result.json_results:
+                content = _get_similarity_content(item)
+                contents.append((content, batch.add(content)))
+            # end for
+        # end for
+        batch.compute()
+
+        index = NearDuplicateIndex()
+        kept_rows = []
+        compared = 0
+        position = 0
+        for result in self.results:
+            deduped_item_list = []
+            for item in result.json_results:
+                content, row = contents[position]
+                position = position + 1
+                signature = index.signature(content)
+                dupe = False
+                for kept in index.candidates(signature):
+                    compared = compared + 1
+                    if batch.similarity(row, kept_rows[kept]) > SWIRL_DEDUPE_SIMILARITY_MINIMUM:
+                        dupe = True
+                        dupes = dupes + 1
+                        break
+                # end for
+                if not dupe:
+                    index.add(len(kept_rows), signature)
+                    kept_rows.append(row)
+                    deduped_item_list.append(item)
+                # end if
+            # end for
+            result.json_results = deduped_item_list
+            self.save_result(result)
+        # end for
+        logger.debug(f"{self}: compared {compared} candidate pairs for {position} results")
+
+        if dupes > 0:
+            self.results_updated = -1 * dupes
+        else:
+            self.results_updated = 0
+
+        return self.results_updated
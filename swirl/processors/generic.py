@@ -13,7 +13,8 @@ logger = get_task_logger(__name__)
 from django.conf import settings
 
 from swirl.processors.processor import *
-from swirl.processors.utils import get_tag, clean_string, create_result_dictionary, get_mappings_dict
+from swirl.processors.utils import get_tag, clean_string, get_mappings_dict
+from swirl.processors.result_batch import ResultItem, ResultBatch
 
 #############################################
 #############################################
@@ -55,11 +56,11 @@ class GenericResultProcessor(ResultProcessor):
         # if 'BLOCK' in self.provider.result_mappings:
         #     result_block = get_mappings_dict(self.provider.result_mappings)['BLOCK']
 
-        list_results = []
+        list_results = ResultBatch()
         result_number = 1
 
         for result in self.results:
-            swirl_result = create_result_dictionary()
+            swirl_result = ResultItem()
             # payload = {}
             # report searchprovider rank, not ours
             swirl_result['searchprovider_rank'] = result_number
@@ -142,7 +143,9 @@ class LenLimitingResultProcessor(ResultProcessor):
     def __init__(self, results, provider, query_string, request_id='', **kwargs):
         super().__init__(results, provider, query_string, request_id=request_id, **kwargs)
 
-    def process(self):
+    per_item = True
+
+    def prepare(self):
 
         max_length = get_tag('max_length', self.provider_tags)
         if max_length:
@@ -151,32 +154,33 @@ class LenLimitingResultProcessor(ResultProcessor):
                     max_length=int(max_length)
                 else:
                     self.error(f"Can't extract max_length from tag: {max_length}")
-                    return 0
+                    return False
         else:
             max_length = SWIRL_MAX_FIELD_LEN
+        self.max_length = max_length
+        self.query_terms = self.query_string.split()
+        return True
+
+    def process_item(self, item):
 
         modified = 0
-        for item in self.results:
-            for field in FIELDS_TO_LIMIT:
-                if field in item:
-                    if type(item[field]) == str:
-                        if len(item[field]) > max_length:
-                            # copy to payload
-                            item['payload'][field+'_full'] = item[field]
-                            snippet = match_any(self.query_string.split(), item[field], max_length)
-                            if snippet:
-                                item[field] = '...' + snippet + '...'
-                            else:
-                                # no match, so just take first N
-                                item[field] = item[field][:max_length-3] + '...'
-                            # end if
-                            modified = modified + 1
-                    else:
-                        self.warning(f"Field {field} is not str, found type: {type(item[field])}")
-
-        self.processed_results = self.results
-        self.modified = modified
-        return self.modified
+        for field in FIELDS_TO_LIMIT:
+            if field in item:
+                if type(item[field]) == str:
+                    if len(item[field]) > self.max_length:
+                        # copy to payload
+                        item['payload'][field+'_full'] = item[field]
+                        snippet = match_any(self.query_terms, item[field], self.max_length)
+                        if snippet:
+                            item[field] = '...' + snippet + '...'
+                        else:
+                            # no match, so just take first N
+                            item[field] = item[field][:self.max_length-3] + '...'
+                        # end if
+                        modified = modified + 1
+                else:
+                    self.warning(f"Field {field} is not str, found type: {type(item[field])}")
+        return modified
 
 #############################################
 
@@ -209,19 +213,17 @@ class CleanTextResultProcessor(ResultProcessor):
     def __init__(self, results, provider, query_string, request_id='', **kwargs):
         super().__init__(results, provider, query_string, request_id=request_id, **kwargs)
 
-    def process(self):
+    per_item = True
 
-        modified = 0
-        for item in self.results:
-            for field in FIELDS_TO_CLEAN:
-                if field in item:
-                    if type(item[field]) == str:
-                        modified = modified + 1
-                        item[field] = remove_non_alphanumeric(item[field])
+    def process_item(self, item):
 
-        self.processed_results = self.results
-        self.modified = modified
-        return self.modified
+        modified = 0
+        for field in FIELDS_TO_CLEAN:
+            if field in item:
+                if type(item[field]) == str:
+                    modified = modified + 1
+                    item[field] = remove_non_alphanumeric(item[field])
+        return modified
 
 #############################################
 
@@ -234,21 +236,18 @@ class RequireQueryStringInTitleResultProcessor(ResultProcessor):
     def __init__(self, results, provider, query_string, request_id='', **kwargs):
         super().__init__(results, provider, query_string, request_id=request_id, **kwargs)
 
-    def process(self):
-        
-        self.processed_results = []
-        self.modified = 0
+    per_item = True
 
-        for item in self.results:
-            if 'title' in item:
-                if match_all(remove_non_alphanumeric(remove_tags(self.query_string)).lower().split(),remove_non_alphanumeric(remove_tags(item['title'])).lower().split()):
-                    self.processed_results.append(item)
-                else:
-                    self.modified = self.modified - 1
-            else:
-                self.modified = self.modified - 1
+    def prepare(self):
+        self.query_terms = remove_non_alphanumeric(remove_tags(self.query_string)).lower().split()
+        return True
 
-        return self.modified
+    def process_item(self, item):
+
+        if 'title' in item:
+            if match_all(self.query_terms, remove_non_alphanumeric(remove_tags(item['title'])).lower().split()):
+                return 0
+        return -1
      
 #############################################
 
@@ -259,15 +258,13 @@ class TestResultProcessor(ResultProcessor):
     def __init__(self, results, provider, query_string, request_id='', **kwargs):
         super().__init__(results, provider, query_string, request_id=request_id, **kwargs)
 
-    def process(self):
+    per_item = True
 
-        # to do: test to ensure operation on a Swirl result, i.e. after Generic or MappingResultProcessor
-        for item in self.results:
-            item['test'] = True
+    def process_item(self, item):
 
-        self.processed_results = self.results
-        self.modified = len(self.processed_results)
-        return self.modified
+        # to do: test to ensure operation on a Swirl result, i.e. after Generic or MappingResultProcessor
+        item['test'] = True
+        return 1
 
 #############################################
 
@@ -6,13 +6,11 @@ import json as stdjson
 
 
 from datetime import datetime
-from jsonpath_ng import parse
-from jsonpath_ng.exceptions import JsonPathParserError
 
 from swirl.processors.processor import ResultProcessor
-from swirl.processors.result_map_converter import ResultMapConverter
-from swirl.processors.utils import create_result_dictionary, extract_text_from_tags, str_safe_format, result_processor_feedback_provider_query_terms,date_str_to_timestamp
-from swirl.swirl_common import RESULT_MAPPING_COMMANDS
+from swirl.processors.mapping_plan import get_mapping_plan
+from swirl.processors.result_batch import ResultItem, ResultBatch
+from swirl.processors.utils import extract_text_from_tags, str_safe_format, result_processor_feedback_provider_query_terms,date_str_to_timestamp
 
 from celery.utils.log import get_task_logger
 logger = get_task_logger(__name__)
@@ -22,9 +20,6 @@ logger = get_task_logger(__name__)
 #############################################
 
 
-import re
-from re import error as re_error
-
 class MappingResultProcessor(ResultProcessor):
 
     type="MappingResultProcessor"
@@ -48,93 +43,43 @@ class MappingResultProcessor(ResultProcessor):
 
         logger.debug(f'mapping processor called with logger name {logger.name}')
 
-        list_results = []
+        list_results = ResultBatch()
         provider_query_term_results = []
         # result_block = ""
 
         json_types = [str,int,float,list,dict]
-        use_payload = True
-        file_system = False
-        if 'NO_PAYLOAD' in self.provider.result_mappings:
-            use_payload = False
-        if 'FILE_SYSTEM' in self.provider.result_mappings:
-            file_system = True
+        # splitting and parsing the mappings is done once per result_mappings string, see mapping_plan.py
+        plan = get_mapping_plan(self.provider.result_mappings)
+        if plan.error and self.results:
+            self.error(plan.error)
+            return []
+        use_payload = plan.use_payload
+        file_system = plan.file_system
 
         result_number = 1
         for result in self.results:
-            swirl_result = create_result_dictionary()
+            swirl_result = ResultItem()
             payload = {}
             # report searchprovider rank, not ours
             swirl_result['searchprovider_rank'] = result_number
             swirl_result['date_retrieved'] = str(datetime.now())
             #############################################
             # mappings are in form swirl_key=source_key, where source_key can be a json_string e.g. _source.customer_full_name
-            if self.provider.result_mappings:
-                mappings = self.provider.result_mappings.split(',')
-                for mapping in mappings:
-                    stripped_mapping = mapping.strip()
-                    # control codez NO_PAYLOAD, FILE_SYSTEM
-                    if stripped_mapping in RESULT_MAPPING_COMMANDS:
-                        # ignore, values were set above
-                        continue
-                    # extract source_key=swirl_key
-                    swirl_key = ""
-                    if '=' in stripped_mapping:
-                        # no need to switch to rfind, since multiple = is not allowed
-                        # source key may be a json path
-                        swirl_key = stripped_mapping[:stripped_mapping.find('=')]
-                        source_key = stripped_mapping[stripped_mapping.find('=')+1:]
-                    else:
-                        source_key = stripped_mapping
-                    # control codez
-                    if swirl_key.isupper():
-                        # to do: check the result mappings list???
-                        # if swirl_key == 'BLOCK':
-                        #     result_block = source_key
-                        # else:
-                            # ignore for now
-                        continue
-                    # check for field list |
-                    source_field_list = []
-                    if '|' in source_key:
-                        source_field_list = source_key.split('|')
-                        # self.warning(f"source_field_list! {source_field_list}")
-                    if len(source_field_list) == 0:
-                        source_field_list.append(source_key)
-                    #############################################
-                    # check for template
-                    template_list = []
-                    if source_key.startswith("'"):
-                        try:
-                            template_list = re.findall(r'\{.*?\}', source_key)
-                        except re_error as err:
-                            self.error(f"re: {err} while finding all in source key : {source_key}")
-                            return []
-                        # end try
-                    else:
-                        for key in source_field_list:
-                            template_list.append('{' + key + '}')
+            if plan.steps:
+                for step in plan.steps:
+                    swirl_key = step.swirl_key
+                    source_key = step.source_key
+                    source_field_list = step.source_field_list
                     # search for source_keys & construct a result_dict
                     result_dict = {}
-                    # self.warning(f"template_list: {template_list}")
-                    for k in template_list:
-                        uc = ResultMapConverter(f'$.{k[1:-1]}')  # Use the new combined class
-                        jxp_key = uc.get_key()
+                    for template_key in step.template_keys:
                         try:
-                            jxp = parse(jxp_key)
                             # search result for this
-                            matches = [uc.get_value(match.value) for match in jxp.find(result)]
-                        except JsonPathParserError as err:
-                            self.error(f'JsonPathParser: {err} in jsonpath_ng.find: {jxp_key}')
-                            return []
+                            result_dict[template_key.name] = template_key.find(result)
                         except (NameError, TypeError, ValueError) as err:
-                            self.error(f'{err.args}, {err} in jsonpath_ng.find: {jxp_key}')
+                            self.error(f'{err.args}, {err} in jsonpath_ng.find: {template_key.jxp_key}')
                             return []
                         # end try
-                        if len(matches) == 1:
-                            result_dict[k[1:-1]] = matches[0]
-                        else:
-                            result_dict[k[1:-1]] = matches
                     if source_key.startswith("'"):
                         # template
                         bound_template =  str_safe_format(source_key, result_dict)
@@ -251,7 +196,7 @@ class MappingResultProcessor(ResultProcessor):
                 swirl_result['title'] = swirl_result['title'].replace('<matched_term>', '')
                 swirl_result['title'] = swirl_result['title'].replace('</matched_term>', '')
 
-            if 'LC_URL' in self.provider.result_mappings:
+            if plan.lc_url:
                 self.warning("LC_URL!")
                 swirl_result['url'] = swirl_result['url'].lower()
 
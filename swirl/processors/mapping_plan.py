@@ -0,0 +1,143 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import hashlib
+import re
+import threading
+
+from cachetools import LRUCache
+from jsonpath_ng import parse
+from jsonpath_ng.exceptions import JsonPathParserError
+
+from swirl.processors.result_map_converter import ResultMapConverter
+from swirl.swirl_common import RESULT_MAPPING_COMMANDS
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+#############################################
+
+_jsonpath_cache = LRUCache(maxsize=4096)
+_jsonpath_lock = threading.Lock()
+
+def get_jsonpath(jxp_key):
+    '''
+    Cached jsonpath_ng.parse(); raises JsonPathParserError like parse() does
+    '''
+    with _jsonpath_lock:
+        jxp = _jsonpath_cache.get(jxp_key)
+    if jxp is None:
+        jxp = parse(jxp_key)
+        with _jsonpath_lock:
+            _jsonpath_cache[jxp_key] = jxp
+    return jxp
+
+#############################################
+
+class TemplateKey:
+
+    '''
+    One {source.key} of a mapping: the parsed JSONPath and the converter (sw_btcconvert, sw_urlencode) for its values
+    '''
+
+    __slots__ = ('name', 'jxp_key', 'jxp', 'converter')
+
+    def __init__(self, name):
+        self.name = name
+        self.converter = ResultMapConverter(f'$.{name}')
+        self.jxp_key = self.converter.get_key()
+        self.jxp = get_jsonpath(self.jxp_key)
+
+    def find(self, result):
+        '''
+        Values of this key in the result; a single match is returned as is, otherwise the list
+        '''
+        matches = [self.converter.get_value(match.value) for match in self.jxp.find(result)]
+        if len(matches) == 1:
+            return matches[0]
+        return matches
+
+class MappingStep:
+
+    '''
+    One swirl_key=source_key mapping, split and parsed once
+    '''
+
+    __slots__ = ('swirl_key', 'source_key', 'source_field_list', 'is_template', 'template_keys')
+
+    def __init__(self, swirl_key, source_key):
+        self.swirl_key = swirl_key
+        self.source_key = source_key
+        # check for field list |
+        self.source_field_list = source_key.split('|') if '|' in source_key else [source_key]
+        self.is_template = source_key.startswith("'")
+        if self.is_template:
+            names = [k[1:-1] for k in re.findall(r'\{.*?\}', source_key)]
+        else:
+            names = list(self.source_field_list)
+        self.template_keys = [TemplateKey(name) for name in names]
+
+class MappingPlan:
+
+    '''
+    A provider's result_mappings compiled once: the mapping steps in order and the payload policy
+    If a JSONPath doesn't parse, error holds the message and steps is empty
+    '''
+
+    def __init__(self, result_mappings):
+        self.result_mappings = result_mappings or ''
+        self.use_payload = not 'NO_PAYLOAD' in self.result_mappings
+        self.file_system = 'FILE_SYSTEM' in self.result_mappings
+        self.lc_url = 'LC_URL' in self.result_mappings
+        self.steps = []
+        self.error = None
+        if not self.result_mappings:
+            return
+        for mapping in self.result_mappings.split(','):
+            stripped_mapping = mapping.strip()
+            # control codez NO_PAYLOAD, FILE_SYSTEM
+            if stripped_mapping in RESULT_MAPPING_COMMANDS:
+                continue
+            # extract source_key=swirl_key
+            swirl_key = ""
+            if '=' in stripped_mapping:
+                # no need to switch to rfind, since multiple = is not allowed
+                # source key may be a json path
+                swirl_key = stripped_mapping[:stripped_mapping.find('=')]
+                source_key = stripped_mapping[stripped_mapping.find('=')+1:]
+            else:
+                source_key = stripped_mapping
+            # control codez
+            if swirl_key.isupper():
+                continue
+            try:
+                self.steps.append(MappingStep(swirl_key, source_key))
+            except JsonPathParserError as err:
+                self.error = f'JsonPathParser: {err} in jsonpath_ng.parse: {source_key}'
+                self.steps = []
+                return
+            except (NameError, TypeError, ValueError) as err:
+                self.error = f'{err.args}, {err} in jsonpath_ng.parse: {source_key}'
+                self.steps = []
+                return
+        # end for
+
+#############################################
+
+_plan_cache = LRUCache(maxsize=1024)
+_plan_lock = threading.Lock()
+
+def get_mapping_plan(result_mappings):
+    '''
+    The compiled MappingPlan for a result_mappings string, cached by a hash of the string
+    '''
+    key = hashlib.sha256((result_mappings or '').encode('utf-8')).digest()
+    with _plan_lock:
+        plan = _plan_cache.get(key)
+    if plan is None:
+        plan = MappingPlan(result_mappings)
+        with _plan_lock:
+            _plan_cache[key] = plan
+    return plan
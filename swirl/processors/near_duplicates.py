@@ -0,0 +1,78 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import hashlib
+import re
+
+import numpy as np
+
+from django.conf import settings
+
+SWIRL_DEDUPE_LSH_PERMUTATIONS = getattr(settings, 'SWIRL_DEDUPE_LSH_PERMUTATIONS', 64)
+SWIRL_DEDUPE_LSH_BANDS = getattr(settings, 'SWIRL_DEDUPE_LSH_BANDS', 16)
+SWIRL_DEDUPE_LSH_SHINGLE_SIZE = getattr(settings, 'SWIRL_DEDUPE_LSH_SHINGLE_SIZE', 3)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = (1 << 32) - 1
+
+#############################################
+
+def get_shingles(text, size=SWIRL_DEDUPE_LSH_SHINGLE_SIZE):
+    '''
+    The set of lowercased word n-grams in text; a text shorter than size is one shingle
+    '''
+    words = re.findall(r'\w+', text.lower())
+    if len(words) <= size:
+        return {' '.join(words)}
+    return {' '.join(words[i:i+size]) for i in range(len(words) - size + 1)}
+
+class NearDuplicateIndex:
+
+    '''
+    MinHash signatures of word shingles, split into bands for locality sensitive hashing
+    Two texts are candidates if all the rows of any band match, which is likely when their shingle sets overlap by
+    more than about (1/bands)^(1/rows), e.g. 0.5 for 16 bands of 4; other pairs are never compared
+    Identical texts always have identical signatures, so they are always candidates
+    '''
+
+    def __init__(self, permutations=SWIRL_DEDUPE_LSH_PERMUTATIONS, bands=SWIRL_DEDUPE_LSH_BANDS, shingle_size=SWIRL_DEDUPE_LSH_SHINGLE_SIZE):
+        if permutations % bands != 0:
+            raise ValueError(f"permutations ({permutations}) must be a multiple of bands ({bands})")
+        self.bands = bands
+        self.rows = permutations // bands
+        self.shingle_size = shingle_size
+        # fixed seed, signatures don't depend on the process
+        generator = np.random.RandomState(1)
+        self._a = generator.randint(1, _MAX_HASH, size=permutations, dtype=np.uint64)
+        self._b = generator.randint(0, _MAX_HASH, size=permutations, dtype=np.uint64)
+        self._buckets = {}
+        self.size = 0
+
+    def signature(self, text):
+        hashes = np.array([int.from_bytes(hashlib.blake2b(shingle.encode('utf-8', errors='surrogatepass'), digest_size=4).digest(), 'little')
+                           for shingle in get_shingles(text, self.shingle_size)], dtype=np.uint64)
+        # (a * h + b) mod p for every shingle and permutation, a and h < 2^32 so it doesn't overflow
+        return ((np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME).min(axis=0)
+
+    def _bands(self, signature):
+        for band in range(self.bands):
+            yield (band, signature[band*self.rows:(band+1)*self.rows].tobytes())
+
+    def candidates(self, signature):
+        '''
+        The keys added with a signature sharing a band with this one, in the order they were added
+        '''
+        found = set()
+        for band in self._bands(signature):
+            found.update(self._buckets.get(band, ()))
+        return sorted(found)
+
+    def add(self, key, signature):
+        '''
+        Adds a key, which must sort after the ones already added
+        '''
+        for band in self._bands(signature):
+            self._buckets.setdefault(band, []).append(key)
+        self.size = self.size + 1
@@ -0,0 +1,134 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import time
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+from swirl.processors import alloc_processor
+from swirl.processors.result_batch import ResultBatch
+from swirl.performance_logger import ResultProcessorStageLogger
+
+#############################################
+
+class ResultProcessorPipeline:
+
+    '''
+    Runs a provider's result_processors over its results
+    Consecutive per_item processors are fused into one pass: each result goes through all of them before the next,
+    and a result dropped by one is not seen by the rest. Batch processors run as before, with process() and
+    get_results(). Results are modified in place, nothing is copied between stages
+    Each processor's wall time, items seen and modified count are kept in stages
+    item_filter, if given, runs on the results of the first processor, which maps the response into SWIRL results,
+    so the results it drops don't go through the rest
+    '''
+
+    def __init__(self, processor_names, provider, query_string, request_id='', result_processor_json_feedback=None, skip=None, item_filter=None):
+        self.processor_names = []
+        for name in processor_names:
+            if name in (skip or []):
+                logger.debug(f"{provider.name}: skipping processor {name} because it was in a skip tag of the search")
+                continue
+            self.processor_names.append(name)
+        # end for
+        self.provider = provider
+        self.query_string = query_string
+        self.request_id = request_id
+        self.result_processor_json_feedback = result_processor_json_feedback
+        self.item_filter = item_filter
+        # the processor(s) running, for error messages
+        self.current = None
+        self.stages = []
+
+    def _alloc(self, name, results):
+        return alloc_processor(processor=name)(results, self.provider, self.query_string, request_id=self.request_id,
+                                               result_processor_json_feedback=self.result_processor_json_feedback)
+
+    def _record(self, name, modified, items, elapsed):
+        self.stages.append({'processor': name, 'modified': modified, 'items': items, 'time': elapsed})
+        ResultProcessorStageLogger(self.request_id, self.provider.name, name, items, elapsed).log()
+        logger.debug(f'provider : {self.provider.name} processor: {name} modified : {modified}')
+
+    def _run_batch(self, name, results):
+        self.current = name
+        start = time.perf_counter()
+        proc = self._alloc(name, results)
+        modified = proc.process()
+        processed = proc.get_results()
+        ## Check if this processor generated feed back and if so, remember it and merge it in to the exsiting
+        if processed and 'result_processor_feedback' in processed[-1]:
+            self.result_processor_json_feedback = processed.pop(-1)
+        self._record(name, modified, len(results) if results else 0, time.perf_counter() - start)
+        return processed
+
+    def _run_fused(self, names, results):
+        self.current = ', '.join(names)
+        procs = []
+        for name in names:
+            start = time.perf_counter()
+            proc = self._alloc(name, results)
+            proc.processed_results = results
+            if proc.prepare() is False:
+                self._record(name, 0, 0, time.perf_counter() - start)
+                continue
+            procs.append([name, proc, 0, 0, time.perf_counter() - start])
+        # end for
+        if not procs:
+            return results
+
+        processed = ResultBatch()
+        for item in results:
+            keep = True
+            for stage in procs:
+                start = time.perf_counter()
+                modified = stage[1].process_item(item)
+                stage[4] = stage[4] + time.perf_counter() - start
+                stage[2] = stage[2] + 1
+                if modified < 0:
+                    stage[3] = stage[3] - 1
+                    keep = False
+                    break
+                stage[3] = stage[3] + modified
+            # end for
+            if keep:
+                processed.append(item)
+        # end for
+
+        for name, proc, items, modified, elapsed in procs:
+            self._record(name, modified, items, elapsed)
+        return processed
+
+    def _run_filter(self, results):
+        self.current = getattr(self.item_filter, '__qualname__', 'item_filter')
+        start = time.perf_counter()
+        items = len(results) if results else 0
+        results = self.item_filter(results)
+        self._record(self.current, (len(results) if results else 0) - items, items, time.perf_counter() - start)
+        return results
+
+    def run(self, results):
+
+        '''
+        Returns the processed results; raises whatever a processor raises, with current set to its name
+        '''
+
+        i = 0
+        while i < len(self.processor_names):
+            name = self.processor_names[i]
+            if getattr(alloc_processor(processor=name), 'per_item', False):
+                names = [name]
+                while i + 1 < len(self.processor_names) and not (i == 0 and self.item_filter) and getattr(alloc_processor(processor=self.processor_names[i + 1]), 'per_item', False):
+                    i = i + 1
+                    names.append(self.processor_names[i])
+                results = self._run_fused(names, results if results else [])
+            else:
+                results = self._run_batch(name, results)
+            if i == 0 and self.item_filter:
+                results = self._run_filter(results)
+            i = i + 1
+        # end while
+        self.current = None
+        return results
@@ -120,6 +120,10 @@ class ResultProcessor(Processor):
 
     type = "ResultProcessor"
 
+    # per-item processors implement prepare() and process_item() instead of process(); the pipeline runs consecutive
+    # per-item processors in one pass over the results, see swirl/processors/pipeline.py
+    per_item = False
+
     ########################################
 
     def __init__(self, results, provider, query_string, request_id='', **kwargs):
@@ -160,13 +164,49 @@ class ResultProcessor(Processor):
 
         '''
         Executes the workflow for a result processor; TBD by derived classes
+        Per-item processors get this loop over process_item()
         Returns: # of results modified
         '''
 
+        if not self.per_item:
+            return self.modified
+
+        if self.prepare() is False:
+            self.processed_results = self.results
+            return 0
+        self.processed_results = []
+        for item in self.results:
+            modified = self.process_item(item)
+            if modified < 0:
+                self.modified = self.modified - 1
+                continue
+            self.modified = self.modified + modified
+            self.processed_results.append(item)
+        # end for
         return self.modified
 
     ########################################
 
+    def prepare(self):
+
+        '''
+        Per-item processors: set up before the first process_item()
+        Returns: False to skip the processor
+        '''
+
+        return True
+
+    def process_item(self, item):
+
+        '''
+        Per-item processors: process one result in place
+        Returns: the number of changes made to it, 0 for none, or -1 to drop it
+        '''
+
+        return 0
+
+    ########################################
+
     def get_results(self):
         return self.processed_results
 
@@ -181,7 +221,7 @@ class PostResultProcessor(Processor):
 
     ########################################
 
-    def __init__(self, search_id, request_id='', should_get_results=False, rag_query_items=False):
+    def __init__(self, search_id, request_id='', should_get_results=False, rag_query_items=False, search=None, results=None):
 
         self.search_id = search_id
         self.search = None
@@ -189,15 +229,24 @@ class PostResultProcessor(Processor):
         self.result_count = -1
         self.request_id = request_id
         self.rag_query_items = rag_query_items
+        # pipeline mode: the Search and its Results were loaded once for all the post result processors,
+        # which change them in memory; run_post_result_processors() saves them once at the end
+        self.pipeline = results is not None
 
-        # security review for 1.7 - OK, filtered by search ID
-        if not Search.objects.filter(id=search_id).exists():
-            self.error(f"Search not found {search_id}")
-            return 0
-        self.search = Search.objects.get(id=search_id)
-        if self.search.status == 'POST_RESULT_PROCESSING' or self.search.status == 'RESCORING' or should_get_results:
+        if search:
+            self.search = search
+        else:
             # security review for 1.7 - OK, filtered by search ID
-            self.results = Result.objects.filter(search_id=search_id)
+            if not Search.objects.filter(id=search_id).exists():
+                self.error(f"Search not found {search_id}")
+                return 0
+            self.search = Search.objects.get(id=search_id)
+        if self.search.status == 'POST_RESULT_PROCESSING' or self.search.status == 'RESCORING' or should_get_results:
+            if self.pipeline:
+                self.results = results
+            else:
+                # security review for 1.7 - OK, filtered by search ID
+                self.results = Result.objects.filter(search_id=search_id)
             # count the number retrieved across all result sets
             self.result_count = 0
             for result in self.results:
@@ -237,3 +286,15 @@ class PostResultProcessor(Processor):
         '''
 
         return self.results_updated
+
+    ########################################
+
+    def save_result(self, result):
+
+        '''
+        Saves a Result the processor changed; in pipeline mode they are saved together after the last processor
+        '''
+
+        if self.pipeline:
+            return
+        result.save()
@@ -12,9 +12,10 @@ from django.conf import settings
 # to do: detect language and load all stopwords? P1
 from swirl.nltk import sent_tokenize
 from swirl.processors.utils import capitalize, capitalize_search, clean_string, has_numeric, highlight_list, match_any, match_all, json_to_flat_string, parse_query, position_dict, remove_numeric, remove_tags, result_processor_feedback_empty_record, result_processor_feedback_merge_records, stem_string
-from swirl.spacy import nlp
+from swirl.spacy import SpacyVectorBatch
 
 from swirl.processors.processor import PostResultProcessor, ResultProcessor
+from swirl.mixers.utils import presort
 
 from swirl.performance_logger import SwirlRelevancyLogger
 
@@ -46,6 +47,77 @@ class CosineRelevancyResultProcessor(ResultProcessor):
     def __init__(self, results, provider, query_string, request_id='', **kwargs):
         super().__init__(results, provider, query_string, request_id=request_id, **kwargs)
 
+    def _prepare_field(self, result_field, parsed_query, batch):
+
+        '''
+        Extract everything pass 1 needs from a result field - lists, stems, sentences and match windows -
+        and register every text that needs a vector with the batch
+        '''
+
+        prep = {}
+        prep['result_field'] = result_field
+        prep['nlp'] = batch.add(result_field)
+        prep['result_field_list'] = result_field.strip().split()
+        # fix for https://github.com/swirlai/swirl-search/issues/34
+        result_field_stemmed = stem_string(result_field)
+        prep['result_field_stemmed_list'] = result_field_stemmed.strip().split()
+        result_field_list = prep['result_field_list']
+        result_field_stemmed_list = prep['result_field_stemmed_list']
+        if len(result_field_list) != len(result_field_stemmed_list):
+            pass # (f"result field [un]stemmed mismatch : {result_field_list} != {result_field_stemmed_list}")
+
+        # query vs result_field
+        prep['query_nlp'] = None
+        prep['sentences'] = []
+        if match_any(parsed_query.query_stemmed_list, result_field_stemmed_list):
+            # capitalize search terms that are capitalied in the result field
+            query = ' '.join(capitalize_search(parsed_query.query_list, result_field_list))
+            prep['query_nlp'] = batch.add(query)
+            sentences = sent_tokenize(result_field)
+            if len(sentences) > 1:
+                prep['sentences'] = [batch.add(sent) for sent in sentences]
+
+        # match windows for each query target
+        prep['targets'] = []
+        for stemmed_query_target, query_target in zip(parsed_query.query_stemmed_target_list, parsed_query.query_target_list):
+            query_slice_stemmed_list = stemmed_query_target
+            query_slice_stemmed_len = len(query_slice_stemmed_list)
+            # match_all returns a list of result_field_list indexes that match
+            match_list = match_all(query_slice_stemmed_list, result_field_stemmed_list)
+            # truncate the match list, if longer than configured
+            if len(match_list) > SWIRL_MAX_MATCHES:
+                match_list = match_list[:SWIRL_MAX_MATCHES-1]
+            qw_list = query_target
+            windows = []
+            for match in match_list:
+                extracted_match_list = result_field_list[match:match+query_slice_stemmed_len]
+                # if the extracted match is capitalized, then capitalize the query
+                qw_list = capitalize(qw_list, extracted_match_list)
+                key = '_'.join(extracted_match_list)+'_'+str(match)
+                # extract query window qw around the match
+                if (match-(2*query_slice_stemmed_len)-1) < 0:
+                    rw_list = result_field_list[match:match+(3*query_slice_stemmed_len)+1]
+                else:
+                    rw_list = result_field_list[match-(2*query_slice_stemmed_len)-1:match+(2*query_slice_stemmed_len)+1]
+                # end if
+                if not parsed_query.query_has_numeric and has_numeric(rw_list):
+                    rw_list = remove_numeric(rw_list)
+                    if not rw_list:
+                        rw_list = result_field_list[match:match+(3*query_slice_stemmed_len)+1]
+                # end if
+                windows.append({
+                    'key': key,
+                    'extracted_match_list': extracted_match_list,
+                    'qw_list': qw_list,
+                    'rw_nlp': batch.add(' '.join(rw_list)),
+                    'qw_nlp': batch.add(' '.join(qw_list))
+                })
+            # end for
+            prep['targets'].append((query_target, query_slice_stemmed_list, windows))
+        # end for
+
+        return prep
+
     def process(self):
 
         logger.debug(f'{self}  processor called with logger name {logger.name}')
@@ -65,6 +137,48 @@ class CosineRelevancyResultProcessor(ResultProcessor):
             pass # self.info(f"parsed query [un]stemmed mismatch : {parsed_query.query_stemmed_target_list} != {parsed_query.query_target_list}")
 
         list_query_lens.append(len(parsed_query.query_list))
+
+        ############################################
+        # gather every field, sentence and window text, then vectorize them in one batch
+
+        batch = SpacyVectorBatch()
+        item_preps = []
+        for item in self.results:
+            if 'explain' in item:
+                continue
+            field_preps = {}
+            for field in RELEVANCY_CONFIG:
+                if field in item:
+                    if type(item[field]) == list:
+                        # to do: handle this better
+                        item[field] = item[field][0]
+                    # result_field is shorthand for item[field]
+                    # item[field] needs to be a string from this point forward.
+                    # code expects this and blows up otherwise.
+                    item[field] = json_to_flat_string(item[field],deadman=100)
+                    result_field = clean_string(item[field]).strip()
+                    # check for zero-length result
+                    if result_field:
+                        if len(result_field) == 0:
+                            continue
+                    # prepare result field
+                    if result_field.startswith('http'):
+                        # the field is a URL, split it on -
+                        if '-' in result_field:
+                            result_field = result_field.replace('-', ' ')
+                    field_preps[field] = self._prepare_field(result_field, parsed_query, batch)
+                # end if
+            # end for
+            item_preps.append(field_preps)
+        # end for
+
+        swrel_logger.start_nlp(batch.chars)
+        batch.compute()
+        swrel_logger.end_nlp()
+
+        ############################################
+
+        item_preps = iter(item_preps)
         for item in self.results:
             dict_score = {}
             if 'explain' in item:
@@ -108,6 +222,8 @@ class CosineRelevancyResultProcessor(ResultProcessor):
             ############################################
             # result item
 
+            field_preps = next(item_preps)
+
             if not 'hits' in item:
                 item['hits'] = {}
 
@@ -115,33 +231,10 @@ class CosineRelevancyResultProcessor(ResultProcessor):
             dict_len = {}
             notted = ""
             for field in RELEVANCY_CONFIG:
-                if field in item:
-                    if type(item[field]) == list:
-                        # to do: handle this better
-                        item[field] = item[field][0]
-                    # result_field is shorthand for item[field]
-                    # item[field] needs to be a string from this point forward.
-                    # code expects this and blows up otherwise.
-                    item[field] = json_to_flat_string(item[field],deadman=100)
-                    result_field = clean_string(item[field]).strip()
-                    # check for zero-length result
-                    if result_field:
-                        if len(result_field) == 0:
-                            continue
-                    # prepare result field
-                    if result_field.startswith('http'):
-                        # the field is a URL, split it on -
-                        if '-' in result_field:
-                            result_field = result_field.replace('-', ' ')
-                    swrel_logger.start_nlp(len(result_field))
-                    result_field_nlp = nlp(result_field)
-                    swrel_logger.end_nlp()
-                    result_field_list = result_field.strip().split()
-                    # fix for https://github.com/swirlai/swirl-search/issues/34
-                    result_field_stemmed = stem_string(result_field)
-                    result_field_stemmed_list = result_field_stemmed.strip().split()
-                    if len(result_field_list) != len(result_field_stemmed_list):
-                        pass # (f"result field [un]stemmed mismatch : {result_field_list} != {result_field_stemmed_list}")
+                if field in field_preps:
+                    prep = field_preps[field]
+                    result_field = prep['result_field']
+                    result_field_list = prep['result_field_list']
                     # NOT test
                     for t in parsed_query.not_list:
                         if t.lower() in (result_field.lower() for result_field in result_field_list):
@@ -164,19 +257,15 @@ class CosineRelevancyResultProcessor(ResultProcessor):
                     match_stems = []
                     ###########################################
                     # query vs result_field
-                    if match_any(parsed_query.query_stemmed_list, result_field_stemmed_list):
-                        # capitalize search terms that are capitalied in the result field
-                        query = ' '.join(capitalize_search(parsed_query.query_list, result_field_list))
-                        swrel_logger.start_nlp(len(query))
-                        query_nlp = nlp(query)
-                        swrel_logger.end_nlp()
+                    if prep['query_nlp'] is not None:
+                        query_nlp = prep['query_nlp']
                         # check for zero vector
                         empty_query_vector = False
-                        if query_nlp.vector.all() == 0:
+                        if batch.has_zero(query_nlp):
                             empty_query_vector = True
                         qvr = 0.0
                         label = '_*'
-                        if empty_query_vector or result_field_nlp.vector.all() == 0:
+                        if empty_query_vector or batch.has_zero(prep['nlp']):
                             if len(result_field_list) == 0:
                                 qvr = 0.0
                             else:
@@ -184,22 +273,21 @@ class CosineRelevancyResultProcessor(ResultProcessor):
                             # end if
                         else:
                             swrel_logger.start_sim()
-                            if len(sent_tokenize(result_field)) > 1:
+                            if prep['sentences']:
                                 # by sentence, take highest
                                 max_similarity = 0.0
-                                for sent in sent_tokenize(result_field):
-                                    result_sent_nlp = nlp(sent)
-                                    if not result_sent_nlp.has_vector:
+                                for result_sent_nlp in prep['sentences']:
+                                    if not batch.has_vector(result_sent_nlp):
                                         qvs = 0.0
                                     else:
-                                        qvs = query_nlp.similarity(result_sent_nlp)
+                                        qvs = batch.similarity(query_nlp, result_sent_nlp)
                                     if qvs > max_similarity:
                                         max_similarity = qvs
                                 # end for
                                 qvr = max_similarity
                                 label = '_s*'
                             else:
-                                qvr = query_nlp.similarity(result_field_nlp)
+                                qvr = batch.similarity(query_nlp, prep['nlp'])
                             swrel_logger.end_sim()
                         # end if
                         if qvr >= float(SWIRL_MIN_SIMILARITY):
@@ -208,68 +296,41 @@ class CosineRelevancyResultProcessor(ResultProcessor):
                             logger.debug(f"{self}: item below SWIRL_MIN_SIMILARITY: {'_'.join(parsed_query.query_list)+label} ~?= {item}")
                     ############################################
                     # score each query target
-                    for stemmed_query_target, query_target in zip(parsed_query.query_stemmed_target_list, parsed_query.query_target_list):
-                        query_slice_stemmed_list = stemmed_query_target
-                        query_slice_stemmed_len = len(query_slice_stemmed_list)
+                    for query_target, query_slice_stemmed_list, windows in prep['targets']:
                         if '_'.join(query_target) in dict_score[field]:
                             # already have this query slice in dict_score - should not happen?
                             self.warning(f"{query_target} already in dict_score")
                             continue
                         ####### MATCH
                         # iterate across all matches, match on stem
-                        # match_all returns a list of result_field_list indexes that match
-                        match_list = match_all(query_slice_stemmed_list, result_field_stemmed_list)
-                        # truncate the match list, if longer than configured
-                        if len(match_list) > SWIRL_MAX_MATCHES:
-                            match_list = match_list[:SWIRL_MAX_MATCHES-1]
-                        qw_list = query_target
-                        if match_list:
-                            key = ''
-                            for match in match_list:
-                                extracted_match_list = result_field_list[match:match+query_slice_stemmed_len]
-                                # if the extracted match is capitalized, then capitalize the query
-                                qw_list = capitalize(qw_list, extracted_match_list)
-                                key = '_'.join(extracted_match_list)+'_'+str(match)
-                                # extract query window qw around the match
-                                if (match-(2*query_slice_stemmed_len)-1) < 0:
-                                #     if (match-query_slice_stemmed_len-1) < 0:
-                                #         rw_list = result_field_list_rel[match-query_slice_stemmed_len-1:match+(2*query_slice_stemmed_len)+1]
-                                #     else:
-                                    rw_list = result_field_list[match:match+(3*query_slice_stemmed_len)+1]
-                                else:
-                                    rw_list = result_field_list[match-(2*query_slice_stemmed_len)-1:match+(2*query_slice_stemmed_len)+1]
-                                # end if
-                                if not parsed_query.query_has_numeric and has_numeric(rw_list):
-                                    rw_list = remove_numeric(rw_list)
-                                    if not rw_list:
-                                        rw_list = result_field_list[match:match+(3*query_slice_stemmed_len)+1]
-                                # end if
-                                dict_score[field][key] = 0.0
-                                ######## SIMILARITY vs WINDOW
-                                rw_nlp = nlp(' '.join(rw_list))
-                                if rw_nlp.vector.all() == 0:
-                                    dict_score[field][key] = 0.31 + 1/3
-                                qw_nlp = nlp(' '.join(qw_list))
-                                if qw_nlp.vector.all() == 0:
-                                    dict_score[field][key] = 0.32 + 1/3
-                                if dict_score[field][key] == 0.0:
-                                    qw_nlp_sim = qw_nlp.similarity(rw_nlp)
-                                    if qw_nlp_sim:
-                                        if qw_nlp_sim >= float(SWIRL_MIN_SIMILARITY):
-                                            dict_score[field][key] = qw_nlp_sim
-                                        else:
-                                            logger.debug(f"{self}: item below SWIRL_MIN_SIMILARITY: {' '.join(qw_list)} ~?= {item}")
-                                if dict_score[field][key] == 0.0:
-                                    del dict_score[field][key]
-                                ######### COLLECT MATCHES FOR HIGHLIGHTING
-                                for extract in extracted_match_list:
-                                    if extract in extracted_highlights:
-                                        continue
-                                    extracted_highlights.append(extract)
-                                if '_'.join(query_slice_stemmed_list) not in match_stems:
-                                    match_stems.append('_'.join(query_slice_stemmed_list))
-                            # end for
-                        # end if match_list
+                        for window in windows:
+                            key = window['key']
+                            extracted_match_list = window['extracted_match_list']
+                            dict_score[field][key] = 0.0
+                            ######## SIMILARITY vs WINDOW
+                            rw_nlp = window['rw_nlp']
+                            if batch.has_zero(rw_nlp):
+                                dict_score[field][key] = 0.31 + 1/3
+                            qw_nlp = window['qw_nlp']
+                            if batch.has_zero(qw_nlp):
+                                dict_score[field][key] = 0.32 + 1/3
+                            if dict_score[field][key] == 0.0:
+                                qw_nlp_sim = batch.similarity(qw_nlp, rw_nlp)
+                                if qw_nlp_sim:
+                                    if qw_nlp_sim >= float(SWIRL_MIN_SIMILARITY):
+                                        dict_score[field][key] = qw_nlp_sim
+                                    else:
+                                        logger.debug(f"{self}: item below SWIRL_MIN_SIMILARITY: {' '.join(window['qw_list'])} ~?= {item}")
+                            if dict_score[field][key] == 0.0:
+                                del dict_score[field][key]
+                            ######### COLLECT MATCHES FOR HIGHLIGHTING
+                            for extract in extracted_match_list:
+                                if extract in extracted_highlights:
+                                    continue
+                                extracted_highlights.append(extract)
+                            if '_'.join(query_slice_stemmed_list) not in match_stems:
+                                match_stems.append('_'.join(query_slice_stemmed_list))
+                        # end for
                     # end for
                     if dict_score[field] == {}:
                         del dict_score[field]
@@ -322,9 +383,9 @@ class CosineRelevancyPostResultProcessor(PostResultProcessor):
 
     ############################################
 
-    def __init__(self, search_id, request_id = ''):
+    def __init__(self, search_id, request_id = '', **kwargs):
         self.include_pass_1 = False
-        return super().__init__(search_id, request_id=request_id)
+        return super().__init__(search_id, request_id=request_id, **kwargs)
 
 
     def _pass_2_extract_result_len_stats(self):
@@ -474,7 +535,9 @@ class CosineRelevancyPostResultProcessor(PostResultProcessor):
                 # save highlighted version
                 highlighted_json_results.append(item)
             # end for
-            results.save()
+            # saved in relevancy order, so the mixers only merge the Results
+            results.json_results = presort(results.json_results)
+            self.save_result(results)
         # end for
         ############################################
 
@@ -508,6 +571,6 @@ class DropIrrelevantPostResultProcessor(PostResultProcessor):
                     modified = modified - 1
 
             results.json_results = relevant_results
-            results.save()
+            self.save_result(results)
 
         return modified
@@ -10,12 +10,9 @@ logger = get_task_logger(__name__)
 
 from swirl.processors.generic import QueryProcessor, ResultProcessor, PostResultProcessor
 
-from presidio_analyzer import AnalyzerEngine
-from presidio_anonymizer import AnonymizerEngine, OperatorConfig
+from swirl.model_registry import get_model
 
-# Instantiate Presidio Analyzer and Anonymizer
-analyzer = AnalyzerEngine()
-anonymizer = AnonymizerEngine()
+# Presidio Analyzer and Anonymizer are instantiated on first use
 
 #############################################
 
@@ -43,6 +40,10 @@ def remove_pii(text: str, query_string=None, redact=False) -> str:
     :return: The text with PII removed.
     """
 
+    from presidio_anonymizer import OperatorConfig
+    analyzer = get_model('presidio_analyzer')
+    anonymizer = get_model('presidio_anonymizer')
+
     untagged_text = remove_tags(text)
     pii_entities = analyzer.analyze(text=untagged_text, language='en')
 
@@ -100,46 +101,37 @@ class RedactPIIResultProcessor(ResultProcessor):
 
     type = "RemovePIIResultProcessor"
 
-    def process(self) -> int:
+    per_item = True
+
+    def process_item(self, item) -> int:
         """
-        :return: The number of modified results.
+        :return: 1 if PII was removed from the result, 0 if not.
         """
-        logger.debug(f"Processing {len(self.results)} results for PII removal.")
-
-        modified = 0
-        for item in self.results:
-            pii_modified = False
-
-            # Remove PII from 'title' and 'body' fields of each result
-            if 'title' in item:
-                cleaned_title = redact_pii(item['title'], self.query_string)
-                if cleaned_title != item['title']:
-                    item['title'] = cleaned_title
+        pii_modified = False
+
+        # Remove PII from 'title' and 'body' fields of each result
+        if 'title' in item:
+            cleaned_title = redact_pii(item['title'], self.query_string)
+            if cleaned_title != item['title']:
+                item['title'] = cleaned_title
+                pii_modified = True
+
+        if 'body' in item:
+            cleaned_body = redact_pii(item['body'], self.query_string)
+            if cleaned_body != item['body']:
+                item['body'] = cleaned_body
+                pii_modified = True
+
+        if 'payload' in item:
+            for key in item['payload']:
+                if type(item['payload'][key]) is not str:
+                    continue
+                cleaned_payload = redact_pii(item['payload'][key], self.query_string)
+                if cleaned_payload != item['payload'][key]:
+                    item['payload'][key] = cleaned_payload
                     pii_modified = True
 
-            if 'body' in item:
-                cleaned_body = redact_pii(item['body'], self.query_string)
-                if cleaned_body != item['body']:
-                    item['body'] = cleaned_body
-                    pii_modified = True
-
-            if 'payload' in item:
-                for key in item['payload']:
-                    if type(item['payload'][key]) is not str:
-                        continue
-                    cleaned_payload = redact_pii(item['payload'][key], self.query_string)
-                    if cleaned_payload != item['payload'][key]:
-                        item['payload'][key] = cleaned_payload
-                        pii_modified = True
-
-            if pii_modified:
-                modified += 1
-
-        self.processed_results = self.results
-        self.modified = modified
-        logger.debug(f"PII removal complete. {self.modified} results modified.")
-
-        return self.modified
+        return 1 if pii_modified else 0
 
 #############################################
 
@@ -180,7 +172,7 @@ class RedactPIIPostResultProcessor(PostResultProcessor):
                             pii_modified = True
                 if pii_modified:
                     modified += 1
-            result.save()
+            self.save_result(result)
 
         self.results_updated = modified
         return self.results_updated
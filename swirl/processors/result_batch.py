@@ -0,0 +1,144 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+from collections.abc import MutableMapping
+
+# the fields of create_result_dictionary(), in json_results order; payload follows them, then any other keys
+RESULT_FIELDS = ('swirl_rank', 'swirl_score', 'searchprovider', 'searchprovider_rank', 'title', 'url', 'body', 'date_published',
+                 'date_published_display', 'date_retrieved', 'author', 'title_hit_highlights', 'body_hit_highlights')
+RESULT_KEYS = RESULT_FIELDS + ('payload',)
+RESULT_KEY_SET = frozenset(RESULT_KEYS)
+
+# a core field that was deleted
+_MISSING = object()
+
+#############################################
+
+class ResultItem(MutableMapping):
+
+    '''
+    One result between the connector and save_results(), with the core fields in slots instead of a dict per item
+    Other keys (explain, hits, dict_score, ...) go in a side table that is only allocated when one is set
+    Behaves like the dict from create_result_dictionary(), so processors can keep using item['title'], 'x' in item,
+    item.get() and item.items(); to_dict() returns the json_results form
+    '''
+
+    __slots__ = RESULT_KEYS + ('_extra',)
+
+    def __init__(self, *args, **kwargs):
+        self.swirl_rank = 0
+        self.swirl_score = 0.0
+        self.searchprovider = ""
+        self.searchprovider_rank = 0
+        self.title = ""
+        self.url = ""
+        self.body = ""
+        self.date_published = ""
+        self.date_published_display = ""
+        self.date_retrieved = ""
+        self.author = ""
+        self.title_hit_highlights = []
+        self.body_hit_highlights = []
+        self.payload = {}
+        self._extra = None
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        if key in RESULT_KEY_SET:
+            value = getattr(self, key)
+            if value is _MISSING:
+                raise KeyError(key)
+            return value
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in RESULT_KEY_SET:
+            setattr(self, key, value)
+            return
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in RESULT_KEY_SET:
+            if getattr(self, key) is _MISSING:
+                raise KeyError(key)
+            setattr(self, key, _MISSING)
+            return
+        if self._extra is None:
+            raise KeyError(key)
+        del self._extra[key]
+
+    def __contains__(self, key):
+        if key in RESULT_KEY_SET:
+            return getattr(self, key) is not _MISSING
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key in RESULT_KEYS:
+            if getattr(self, key) is not _MISSING:
+                yield key
+        if self._extra:
+            yield from list(self._extra)
+
+    def __len__(self):
+        return len([key for key in RESULT_KEYS if getattr(self, key) is not _MISSING]) + (len(self._extra) if self._extra else 0)
+
+    def get(self, key, default=None):
+        if key in RESULT_KEY_SET:
+            value = getattr(self, key)
+            return default if value is _MISSING else value
+        if self._extra is None:
+            return default
+        return self._extra.get(key, default)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def __getstate__(self):
+        # the values in RESULT_KEYS order, no key names; deleted fields are listed by name since _MISSING doesn't pickle
+        values = tuple(getattr(self, key) for key in RESULT_KEYS)
+        missing = tuple(key for key, value in zip(RESULT_KEYS, values) if value is _MISSING)
+        if missing:
+            values = tuple(None if value is _MISSING else value for value in values)
+        return (values, self._extra, missing)
+
+    def __setstate__(self, state):
+        for key, value in zip(RESULT_KEYS, state[0]):
+            setattr(self, key, value)
+        self._extra = state[1]
+        for key in state[2]:
+            setattr(self, key, _MISSING)
+
+    def to_dict(self):
+        '''
+        The result as stored in Result.json_results
+        '''
+        result = {key: getattr(self, key) for key in RESULT_KEYS if getattr(self, key) is not _MISSING}
+        if self._extra:
+            result.update(self._extra)
+        return result
+
+class ResultBatch(list):
+
+    '''
+    The list of ResultItems a result processor returns; plain dicts may be mixed in, e.g. processor feedback
+    '''
+
+    __slots__ = ()
+
+    def to_json(self):
+        return to_json_results(self)
+
+def to_json_results(results):
+    '''
+    Returns results in the json_results format, converting any ResultItems to dicts
+    '''
+    if not results:
+        return results
+    return [item.to_dict() if isinstance(item, ResultItem) else item for item in results]
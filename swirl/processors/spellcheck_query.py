@@ -7,7 +7,7 @@
 from celery.utils.log import get_task_logger
 logger = get_task_logger(__name__)
 
-from textblob import TextBlob
+from swirl.model_registry import get_model
 
 #############################################    
 #############################################     
@@ -20,6 +20,7 @@ def SpellcheckQueryProcessor(query_string):
         return query_string
 
     try:
+        TextBlob = get_model('textblob')
         corrected_query_string = "{0}".format(TextBlob(query_string).correct())
     except NameError as err:
         logger.warning(f'{module_name}: Error: NameError: {err}')
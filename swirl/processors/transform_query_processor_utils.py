@@ -9,22 +9,26 @@ from swirl.processors.transform_query_processor import TransformQueryProcessorFa
 from swirl.processors import alloc_processor
 
 module_name = 'transform_query_processor_utils'
-def __find_query_transform(name, type, user=None):
+def __find_query_transform(name, type, user=None, query_transforms=None):
     """
-    Atttempt to find the trasnform in the DB
+    Atttempt to find the trasnform in the DB, or in query_transforms if the caller loaded them already
     """
     try:
         if user:
             if not user.has_perm('swirl.view_querytransform'):
                 logger.warning(f"User {user} needs permission view_querytransform")
                 return False
+        if query_transforms is not None:
+            if not (name, type) in query_transforms:
+                raise ObjectDoesNotExist(f'QueryTransform {name}.{type} not found')
+            return QueryTransform(name=name, qrx_type=type, config_content=query_transforms[(name, type)])
         return QueryTransform.objects.get(name=name,qrx_type=type)
     except ObjectDoesNotExist as err:
         # It's okay for it to not be there, just warning
         logger.warn(f'{module_name}_{id}: ObjectDoesNotExist: {err}')
         return False
 
-def __fall_back_to_query_transform(processor, query, err, user=None):
+def __fall_back_to_query_transform(processor, query, err, user=None, query_transforms=None):
         """
         To be called after we failed to find a processor using eval
         """
@@ -34,7 +38,7 @@ def __fall_back_to_query_transform(processor, query, err, user=None):
             raise err # throw the original error
         name = tmp[0].strip()
         qrx_type = tmp[1].strip()
-        if not (qxr := __find_query_transform(name=name, type=qrx_type, user=user)):
+        if not (qxr := __find_query_transform(name=name, type=qrx_type, user=user, query_transforms=query_transforms)):
             raise err # throw the original error
         return TransformQueryProcessorFactory.alloc_query_transform(query, name, qrx_type,
                                                                                  qxr.config_content)
@@ -51,13 +55,13 @@ def get_pre_query_processor_or_transform(processor, query_temp, tags, user=None
 
     return pre_query_processor
 
-def get_query_processor_or_transform(processor, query_temp, mappings, tags, user=None):
+def get_query_processor_or_transform(processor, query_temp, mappings, tags, user=None, query_transforms=None):
     """
     Get the query processed based on an entry from from the query_processor(s) fields
     """
     try:
         query_processor = alloc_processor(processor=processor)(query_temp, mappings, tags)
     except (Exception) as err:
-        query_processor = __fall_back_to_query_transform(processor, query_temp, err, user)
+        query_processor = __fall_back_to_query_transform(processor, query_temp, err, user, query_transforms)
 
     return query_processor
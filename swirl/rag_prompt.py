@@ -5,7 +5,7 @@ import re
 
 from urllib.parse import urlparse
 
-import tiktoken
+from swirl.model_registry import get_model
 
 MODEL_DEFAULT_SYSTEM_GUIDE = "You are a helpful assistant who considers recent information when responding. You are positive and do not report negative or upsetting things, like poor ratings."
 
@@ -27,7 +27,7 @@ class RagPrompt():
         self._is_full = False
         self._num_tokens = 0
         self._last_chunk_status = RAG_PROMPT_CHUNK_OK
-        self._model_encoding = tiktoken.encoding_for_model(model)
+        self._model_encoding = get_model('tiktoken', model)
 
         self._prompt_footer = (
         f"\n\n\n\n--- Final Instructions ---\nIn your response do not assume people with vastly different work histories are the same person. "
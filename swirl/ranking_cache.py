@@ -0,0 +1,143 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import hashlib
+import json
+import threading
+import time
+
+from cachetools import LRUCache
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+SWIRL_RANKING_CACHE = getattr(settings, 'SWIRL_RANKING_CACHE', True)
+SWIRL_RANKING_CACHE_TTL = getattr(settings, 'SWIRL_RANKING_CACHE_TTL', 300)
+SWIRL_RANKING_CACHE_SIZE = getattr(settings, 'SWIRL_RANKING_CACHE_SIZE', 100)
+SWIRL_RANKING_CACHE_REDIS_URL = getattr(settings, 'SWIRL_RANKING_CACHE_REDIS_URL', '')
+
+#############################################
+
+def get_ranking_key(search, results, mixer, provider, explain, generation=0):
+    '''
+    (search, mixer, provider filter, explain) plus what changes when the search's Results do: the Search's and the
+    latest Result's date_updated, the number of Results and the search's invalidation generation
+    '''
+    state = results.aggregate(count=Count('id'), updated=Max('date_updated'))
+    key = [search.id, mixer, provider, bool(explain), search.date_updated, state['count'], state['updated'], generation]
+    return f'swirl:ranking:{search.id}:' + hashlib.sha256(json.dumps(key, default=str).encode('utf-8')).hexdigest()
+
+class RankingCache:
+
+    '''
+    Cache of mixed rankings: the ordered results and info block of a mixed search, so later pages are a slice
+    The in-process LRU holds the ranking itself, callers must copy what they change; Redis, if configured, holds
+    it as JSON for the other processes
+    invalidate() bumps the search's generation, which is part of the key, so its cached rankings are not used again
+    '''
+
+    def __init__(self, enabled=SWIRL_RANKING_CACHE, ttl=SWIRL_RANKING_CACHE_TTL, maxsize=SWIRL_RANKING_CACHE_SIZE,
+                 redis_url=SWIRL_RANKING_CACHE_REDIS_URL, redis_client=None):
+        self.enabled = enabled
+        self.ttl = ttl
+        self._l1 = LRUCache(maxsize=maxsize)
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._redis = redis_client
+        self._redis_url = redis_url
+        self.hits = 0
+        self.misses = 0
+
+    def _get_redis(self):
+        if self._redis is None and self._redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(self._redis_url)
+            except Exception as err:
+                logger.warning(f"ranking_cache: redis unavailable at {self._redis_url}: {err}")
+                self._redis_url = ''
+        return self._redis
+
+    def get_generation(self, search_id):
+        client = self._get_redis()
+        if client is not None:
+            try:
+                return int(client.get(f'swirl:ranking:{search_id}:generation') or 0)
+            except Exception as err:
+                logger.warning(f"ranking_cache: redis get failed: {err}")
+        with self._lock:
+            return self._generations.get(search_id, 0)
+
+    def invalidate(self, search_id):
+        with self._lock:
+            self._generations[search_id] = self._generations.get(search_id, 0) + 1
+        client = self._get_redis()
+        if client is not None:
+            try:
+                client.incr(f'swirl:ranking:{search_id}:generation')
+                client.expire(f'swirl:ranking:{search_id}:generation', max(int(self.ttl), 1))
+            except Exception as err:
+                logger.warning(f"ranking_cache: redis incr failed: {err}")
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry:
+                if entry[0] > now:
+                    self.hits = self.hits + 1
+                    return entry[1]
+                del self._l1[key]
+        client = self._get_redis()
+        if client is not None:
+            try:
+                data = client.get(key)
+                if data:
+                    ranking = json.loads(data)
+                    with self._lock:
+                        self._l1[key] = (now + self.ttl, ranking)
+                        self.hits = self.hits + 1
+                    return ranking
+            except Exception as err:
+                logger.warning(f"ranking_cache: redis get failed: {err}")
+        with self._lock:
+            self.misses = self.misses + 1
+        return None
+
+    def set(self, key, ranking):
+        if not self.enabled or self.ttl <= 0:
+            return
+        with self._lock:
+            self._l1[key] = (time.time() + self.ttl, ranking)
+        client = self._get_redis()
+        if client is not None:
+            try:
+                client.set(key, json.dumps(ranking, default=str), ex=int(self.ttl))
+            except Exception as err:
+                logger.warning(f"ranking_cache: redis set failed: {err}")
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+            self._generations.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._l1), 'maxsize': self._l1.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+ranking_cache = RankingCache()
+
+def invalidate_search_rankings(sender, instance, **kwargs):
+    '''
+    post_save/post_delete receiver: a changed Result invalidates its search's cached rankings
+    '''
+    ranking_cache.invalidate(instance.search_id_id)
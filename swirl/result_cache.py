@@ -0,0 +1,151 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import hashlib
+import json
+import threading
+import time
+
+from cachetools import LRUCache
+
+from django.conf import settings
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+SWIRL_RESULT_CACHE_TTL = getattr(settings, 'SWIRL_RESULT_CACHE_TTL', 0)
+SWIRL_RESULT_CACHE_SIZE = getattr(settings, 'SWIRL_RESULT_CACHE_SIZE', 1000)
+SWIRL_RESULT_CACHE_REDIS_URL = getattr(settings, 'SWIRL_RESULT_CACHE_REDIS_URL', '')
+
+# per-provider TTL in seconds, e.g. CacheTTL:600; CacheTTL:0 turns the cache off for the provider
+SWIRL_RESULT_CACHE_TTL_TAG = 'CacheTTL'
+
+# the SearchProvider fields that change what a provider returns for a query
+PROVIDER_CONFIG_FIELDS = [
+    'connector', 'authenticator', 'url', 'query_template', 'query_template_json', 'post_query_template', 'http_request_headers', 'query_processors',
+    'query_mappings', 'result_grouping_field', 'result_processors', 'response_mappings', 'result_mappings',
+    'results_per_query', 'credentials', 'eval_credentials', 'tags'
+]
+
+#############################################
+
+def get_provider_config_hash(provider):
+    '''
+    Hash of the provider's configuration, so editing a SearchProvider invalidates its cached results
+    '''
+    config = {field: getattr(provider, field, None) for field in PROVIDER_CONFIG_FIELDS}
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def get_provider_cache_ttl(provider):
+    '''
+    The provider's CacheTTL tag in seconds if it has one, otherwise SWIRL_RESULT_CACHE_TTL; 0 means don't cache
+    '''
+    from swirl.processors.utils import get_tag
+    ttl = get_tag(SWIRL_RESULT_CACHE_TTL_TAG, provider.tags)
+    if ttl:
+        try:
+            return max(int(ttl), 0)
+        except ValueError:
+            logger.warning(f"result_cache: ignoring invalid {SWIRL_RESULT_CACHE_TTL_TAG} tag: {ttl}")
+    return SWIRL_RESULT_CACHE_TTL
+
+def get_result_cache_key(provider, query_to_provider, sort, query_string_to_provider='', user_id=None, skip=None):
+    '''
+    (provider id, provider config hash, query_to_provider, sort) plus what else changes the processed results:
+    the processed query string, result processors skipped by search tags and, for providers that search with
+    the user's own credentials, the user
+    '''
+    key = [provider.id, get_provider_config_hash(provider), query_to_provider, sort, query_string_to_provider, sorted(skip or []), user_id]
+    return 'swirl:result_cache:' + hashlib.sha256(json.dumps(key, default=str).encode('utf-8')).hexdigest()
+
+#############################################
+
+class ResultCache:
+
+    '''
+    Two level cache of processed provider results: an in-process LRU (L1) in front of Redis (L2)
+    Entries expire after the TTL they were stored with; Redis errors are logged and treated as misses
+    Both levels hold JSON, so each hit gets its own copy of the results
+    Pass redis_client to use another Redis-compatible client, e.g. fakeredis in tests
+    '''
+
+    def __init__(self, maxsize=SWIRL_RESULT_CACHE_SIZE, redis_url=SWIRL_RESULT_CACHE_REDIS_URL, redis_client=None):
+        self._l1 = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._redis = redis_client
+        self._redis_url = redis_url
+        self.hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+
+    def _get_redis(self):
+        if self._redis is None and self._redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(self._redis_url)
+            except Exception as err:
+                logger.warning(f"result_cache: redis unavailable at {self._redis_url}: {err}")
+                self._redis_url = ''
+        return self._redis
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry:
+                if entry[0] > now:
+                    self.hits = self.hits + 1
+                    return json.loads(entry[1])
+                del self._l1[key]
+        client = self._get_redis()
+        if client is not None:
+            try:
+                data = client.get(key)
+                if data:
+                    ttl = client.ttl(key)
+                    with self._lock:
+                        if ttl and ttl > 0:
+                            self._l1[key] = (now + ttl, data)
+                        self.hits = self.hits + 1
+                        self.l2_hits = self.l2_hits + 1
+                    return json.loads(data)
+            except Exception as err:
+                logger.warning(f"result_cache: redis get failed: {err}")
+        with self._lock:
+            self.misses = self.misses + 1
+        return None
+
+    def set(self, key, value, ttl):
+        if not ttl or ttl <= 0:
+            return
+        data = json.dumps(value, default=str)
+        with self._lock:
+            self._l1[key] = (time.time() + ttl, data)
+        client = self._get_redis()
+        if client is not None:
+            try:
+                client.set(key, data, ex=int(ttl))
+            except Exception as err:
+                logger.warning(f"result_cache: redis set failed: {err}")
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+            self.hits = 0
+            self.l2_hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._l1),
+                'maxsize': self._l1.maxsize,
+                'hits': self.hits,
+                'l2_hits': self.l2_hits,
+                'misses': self.misses,
+                'redis': bool(self._redis_url or self._redis is not None)
+            }
+
+result_cache = ResultCache()
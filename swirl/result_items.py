@@ -0,0 +1,136 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+from swirl.models import Result, ResultRow
+
+# store each result item in the ResultRow table too, so mixers can order and page in the database
+SWIRL_RESULT_ITEMS = getattr(settings, 'SWIRL_RESULT_ITEMS', False)
+SWIRL_RESULT_ITEMS_BATCH_SIZE = 500
+
+#############################################
+
+def get_item_row(search_id, result, position, item, date_indexed):
+
+    try:
+        swirl_score = float(item.get('swirl_score', 0.0) or 0.0)
+    except (TypeError, ValueError):
+        swirl_score = 0.0
+    try:
+        searchprovider_rank = int(item.get('searchprovider_rank', 0) or 0)
+    except (TypeError, ValueError):
+        searchprovider_rank = 0
+    url = str(item.get('url', '') or '')[:2048]
+    new = 'new' in item
+    if new:
+        # the new flag is kept in the row, so the NewItems mixers can filter on it
+        item = dict(item)
+        del item['new']
+    return ResultRow(search_id_id=search_id, result_id=result.id, provider_id=result.provider_id, position=position, swirl_score=swirl_score,
+                      date_published=str(item.get('date_published', '') or '')[:64], searchprovider_rank=searchprovider_rank, url=url,
+                      result_block=str(item.get('result_block', '') or '')[:50], new=new, item=item, date_indexed=date_indexed)
+
+def index_result_items(search_id, force=False, result_ids=None):
+
+    '''
+    Replaces the search's ResultRows with the items in its Results' json_results
+    If result_ids are given, only the rows of those Results are replaced
+    Returns the number of rows written
+    '''
+
+    if not (SWIRL_RESULT_ITEMS or force):
+        return 0
+
+    # before reading the Results, so any saved while indexing show up as newer
+    date_indexed = timezone.now()
+    rows = []
+    # security review for 1.7 - OK, filtered by search ID
+    results = Result.objects.filter(search_id=search_id)
+    existing = ResultRow.objects.filter(search_id=search_id)
+    if result_ids is not None:
+        results = results.filter(id__in=result_ids)
+        existing = existing.filter(result_id__in=result_ids)
+    for result in results.order_by('-date_updated', 'id'):
+        if type(result.json_results) != list:
+            continue
+        for position, item in enumerate(result.json_results):
+            if type(item) != dict:
+                continue
+            rows.append(get_item_row(search_id, result, position, item, date_indexed))
+        # end for
+    # end for
+
+    with transaction.atomic():
+        existing.delete()
+        ResultRow.objects.bulk_create(rows, batch_size=SWIRL_RESULT_ITEMS_BATCH_SIZE)
+    logger.debug(f"result_items: indexed {len(rows)} items for search {search_id}")
+    return len(rows)
+
+def get_result_items(search_id, results):
+
+    '''
+    The ResultRows for the Results, or None if any of them changed since the search was indexed, e.g. a
+    Result added later, in which case the mixer uses json_results
+    '''
+
+    if not SWIRL_RESULT_ITEMS:
+        return None
+    items = ResultRow.objects.filter(search_id=search_id, result_id__in=[result.id for result in results])
+    # Results are indexed separately while streaming, so each is checked against its own rows
+    dates_indexed = dict(ResultRow.objects.filter(search_id=search_id).values('result_id').annotate(date_indexed=Min('date_indexed')).values_list('result_id', 'date_indexed'))
+    if not dates_indexed:
+        # not indexed, unless there was nothing to index
+        if any(result.retrieved > 0 for result in results):
+            return None
+        return items
+    date_indexed = min(dates_indexed.values())
+    for result in results:
+        if result.date_updated > dates_indexed.get(result.id, date_indexed):
+            return None
+    # end for
+    return items
+
+def mark_items_read(items):
+
+    '''
+    Clears the new flag of the rows, and of the same items in their Results' json_results, so they stay read when
+    the search is indexed again
+    The json_results are written with QuerySet.update(), so date_updated doesn't change and the rows stay current
+    Returns the number of items marked as read
+    '''
+
+    new_items = items.filter(new=True)
+    result_ids = set(new_items.values_list('result_id', flat=True))
+    marked = new_items.update(new=False)
+    with transaction.atomic():
+        for result in Result.objects.select_for_update().filter(id__in=result_ids).only('id', 'json_results'):
+            if type(result.json_results) != list:
+                continue
+            for item in result.json_results:
+                if type(item) == dict:
+                    item.pop('new', None)
+            # end for
+            Result.objects.filter(id=result.id).update(json_results=result.json_results)
+        # end for
+    # end with
+    return marked
+
+def get_item(row):
+
+    '''
+    The json_results item for a row
+    '''
+
+    item = row.item
+    if row.new:
+        item['new'] = True
+    return item
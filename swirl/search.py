@@ -8,14 +8,17 @@ from urllib.parse import urlparse
 
 from datetime import datetime
 import time
+import copy
+import inspect
 from celery import group, current_task
 from celery.exceptions import TimeoutError as CeleryTimeoutError
 
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.utils import timezone
 from django.contrib.auth.models import User, Group
 from django.conf import settings
 
-from celery.result import allow_join_result
 
 # TO DO: is this right? I think yes bc search is usually run from a celery task, but this might be problematic if it isn't
 from celery.utils.log import get_task_logger
@@ -26,6 +29,12 @@ from swirl.tasks import federate_task
 from swirl.processors import *
 from swirl.processors.transform_query_processor_utils import get_pre_query_processor_or_transform
 from swirl.utils import select_providers,get_url_details
+from swirl.latency import get_provider_timeout, get_provider_latency_percentile
+from swirl.federation import federation_executor, use_thread_executor
+from swirl.http_pool import http_pool
+from swirl.circuit_breaker import circuit_breaker
+from swirl.snapshot import get_search_snapshot
+from swirl.result_items import index_result_items
 from swirl.performance_logger import SwirlQueryRequestLogger
 
 ##################################################
@@ -33,6 +42,12 @@ from swirl.performance_logger import SwirlQueryRequestLogger
 
 module_name = 'search.py'
 
+SWIRL_STREAMING_FEDERATION = getattr(settings, 'SWIRL_STREAMING_FEDERATION', False)
+# load the Results once for all post result processors and save them once, instead of once per processor
+SWIRL_POST_RESULT_PIPELINE = getattr(settings, 'SWIRL_POST_RESULT_PIPELINE', True)
+# the Result fields post result processors change; date_updated is auto_now, which bulk_update() doesn't set
+POST_RESULT_PROCESSOR_FIELDS = ['json_results', 'date_updated']
+
 def get_query_selectd_provder_list(search):
     """
     Get the list of providers from the query, taking
@@ -93,10 +108,11 @@ def get_query_selectd_provder_list(search):
     return selected_provider_list
 
 
-def search(id, session=None, request=None):
+def search(id, session=None, request=None, bypass_cache=False):
 
     '''
     Execute the search task workflow
+    With bypass_cache, e.g. for a rerun, the providers are queried even if their results are cached
     '''
 
     update = False
@@ -188,6 +204,9 @@ def search(id, session=None, request=None):
     # end if
 
     ########################################
+    # the json_results of Results processed while streaming, as the connectors saved them
+    raw_results = {}
+    streamed = False
     search.status = 'FEDERATING'
     logger.debug(f"{module_name}: {search.status}")
     search.save()
@@ -199,32 +218,38 @@ def search(id, session=None, request=None):
         error_return(msg, swqrx_logger)
         return False
     else:
-        from celery import group, current_task
-        tasks_list = [federate_task.s(search.id, provider.id, provider.connector, update, session, swqrx_logger.request_id) for provider in providers]
-        results = group(*tasks_list).delay()
-        if current_task:
-            logger.debug(f'in current_task about to get {search.id}')
-            with allow_join_result():
-                logger.debug(f'allow_join about to get {search.id}')
-                try:
-                    results = results.get(interval=0.05, timeout=settings.SWIRL_TIMEOUT)
-                except CeleryTimeoutError as err:
-                    logger.warning(f"Timeout:{err} in allow_join context, query results may still be returned")
-                except Exception as err:
-                    logger.error(f"Unexpected:{err}")
-                logger.debug(f'in current_task got my results {search.id}')
-        else:
-            logger.debug(f'NOT in the current task about to get {search.id}')
-            try:
-                results = results.get(interval=0.05, timeout=settings.SWIRL_TIMEOUT)
-            except CeleryTimeoutError as err:
-                logger.warning(f"Timeout:{err} query results may still be returned")
-            except Exception as err:
-                logger.error(f"Unexpected:{err}")
-            logger.debug(f'NOT in the current task got my result {search.id}')
-
+        search.provider_status = {str(provider.id): 'FEDERATING' for provider in providers}
+        providers = skip_open_circuits(search, providers)
+        search.save()
+        search_user = search.owner
+        # the federate tasks take the search, user and query transforms from this instead of reading the database, see swirl/snapshot.py
+        snapshot = get_search_snapshot(search, user, providers)
+        query_transforms = {(name, qrx_type): config_content for name, qrx_type, config_content in snapshot['query_transforms']}
+        def submit(provider):
+            # I/O-bound connectors can run in this process, see swirl/federation.py
+            if use_thread_executor(provider):
+                return federation_executor.submit(search, provider, search_user, update, session, swqrx_logger.request_id, query_transforms=query_transforms, bypass_cache=bypass_cache)
+            return federate_task.delay(search.id, provider.id, provider.connector, update, session, swqrx_logger.request_id, snapshot, bypass_cache)
+        thread_providers = [provider for provider in providers if use_thread_executor(provider)]
+        celery_providers = [provider for provider in providers if not use_thread_executor(provider)]
+        provider_results = {}
+        if celery_providers:
+            tasks_list = [federate_task.s(search.id, provider.id, provider.connector, update, session, swqrx_logger.request_id, snapshot, bypass_cache) for provider in celery_providers]
+            group_result = group(*tasks_list).delay()
+            provider_results.update(zip([provider.id for provider in celery_providers], group_result.results))
+        for provider in thread_providers:
+            provider_results[provider.id] = submit(provider)
+        # updates append to the existing Result objects, so they are only processed once all providers finish
+        streaming = SWIRL_STREAMING_FEDERATION and not update
+        results = wait_for_providers(search, providers, [provider_results[provider.id] for provider in providers], update, session, swqrx_logger, streaming=streaming, submit=submit, raw_results=raw_results)
+        streamed = search.status == 'PARTIAL_RESULTS_READY'
+        if thread_providers:
+            logger.debug(f"{module_name}_{search.id}: http pool: {http_pool.stats()}")
 
     search.status = 'FULL_RESULTS'
+    if streamed:
+        # clients are already reading the streamed results, RESCORING keeps them readable until the final pass is done
+        search.status = 'RESCORING'
 
 
     logger.info(f"{module_name}: {search.status}")
@@ -252,41 +277,15 @@ def search(id, session=None, request=None):
     # post_result_processing
     if search.post_result_processors:
         last_status = search.status
-        search.status = 'POST_RESULT_PROCESSING'
+        if not streamed:
+            search.status = 'POST_RESULT_PROCESSING'
         logger.debug(f"{module_name}: {search.status}")
         search.save()
-
-        processor_list = search.post_result_processors
-        
-        for processor in processor_list:
-            logger.debug(f"{module_name}: invoking processor: {processor}")
-            try:
-                post_result_processor = alloc_processor(processor=processor)(search_id=search.id, request_id=swqrx_logger.request_id)
-                if post_result_processor.validate():
-                    results_modified = post_result_processor.process()
-                else:
-                    error_return(f"{module_name}_{search.id}: {processor}.validate() failed", swqrx_logger)
-                    return False
-                # end if
-            except (NameError, TypeError, ValueError) as err:
-                error_return(f'{module_name}_{search.id}: {processor}: {err.args}, {err}', swqrx_logger)
-                return False
-            if results_modified < 0:
-                message = f"[{datetime.now()}] {processor} deleted {-1*results_modified} results"
-            else:
-                message = f"[{datetime.now()}] {processor} updated {results_modified} results"
-            # don't repeat the same message - to do: test
-            last_message = search.messages[-1:]
-            if last_message:
-                if last_message[0].lower().strip() != message.lower().strip():
-                    search.messages.append(message)
-                # end if
-            else:
-                search.messages.append(message)
-                # end if
-            # end if
-        # end for
+        if not run_post_result_processors(search, swqrx_logger, raw_results=raw_results):
+            return False
         search.status = last_status
+    if search.status == 'RESCORING':
+        search.status = 'FULL_RESULTS'
     if search.status == 'PARTIAL_RESULTS':
         if update:
             search.status = 'PARTIAL_UPDATE_READY'
@@ -298,6 +297,7 @@ def search(id, session=None, request=None):
         else:
             search.status = 'FULL_RESULTS_READY'
     logger.debug(f"{module_name}: {search.status}")
+    index_result_items(search.id)
     end_time = time.time()
     search.time = f"{(end_time - start_time):.1f}"
     logger.debug(f"{module_name}: search time: {search.time}")
@@ -314,6 +314,249 @@ def search(id, session=None, request=None):
 
     return True
 
+def accepts_preloaded_results(processor_class):
+
+    '''
+    True if the post result processor can run in pipeline mode, i.e. takes the search and results it is given
+    '''
+
+    parameters = inspect.signature(processor_class.__init__).parameters
+    return 'results' in parameters or any(parameter.kind == parameter.VAR_KEYWORD for parameter in parameters.values())
+
+def save_post_processed_results(results):
+
+    '''
+    Writes the Results changed by the post result processors in one transaction
+    '''
+
+    if not results:
+        return
+    now = timezone.now()
+    for result in results:
+        result.date_updated = now
+    with transaction.atomic():
+        Result.objects.bulk_update(results, fields=POST_RESULT_PROCESSOR_FIELDS)
+
+def run_post_result_processors(search, swqrx_logger, streaming=False, results=None, raw_results=None):
+
+    '''
+    Run the search's post-result processors over the Result objects saved so far
+    With SWIRL_POST_RESULT_PIPELINE the Results are loaded once, changed in memory by each processor and saved once
+    at the end; processors that can't take them are run on their own, after saving the changes so far
+    If results are given, only those are processed and processors that can't take them are skipped
+    raw_results maps the ids of Results already processed while streaming to their json_results as first saved;
+    the final pass starts from these, so no Result is processed twice
+    If a processor fails nothing more is saved
+    Returns False if a processor failed; while streaming failures are only logged, the final pass reports them
+    '''
+
+    result_ids = None
+    if results is not None:
+        result_ids = [result.id for result in results]
+    elif SWIRL_POST_RESULT_PIPELINE or raw_results:
+        # security review for 1.7 - OK, filtered by search ID
+        results = list(Result.objects.filter(search_id=search.id))
+    if raw_results:
+        for result in results:
+            if result.id in raw_results:
+                result.json_results = raw_results[result.id]
+        # end for
+        if not SWIRL_POST_RESULT_PIPELINE:
+            # the processors read the Results themselves
+            save_post_processed_results(results)
+            results = None
+
+    for processor in search.post_result_processors:
+        logger.debug(f"{module_name}: invoking processor: {processor}")
+        try:
+            processor_class = alloc_processor(processor=processor)
+            if results is not None and accepts_preloaded_results(processor_class):
+                post_result_processor = processor_class(search_id=search.id, request_id=swqrx_logger.request_id, search=search, results=results)
+            elif result_ids is not None:
+                # it would process every Result, the final pass runs it
+                logger.debug(f"{module_name}_{search.id}: {processor} skipped, it can't process only some of the results")
+                continue
+            else:
+                if results is not None:
+                    # this one reads and saves the Results itself
+                    save_post_processed_results(results)
+                post_result_processor = processor_class(search_id=search.id, request_id=swqrx_logger.request_id)
+            if post_result_processor.validate():
+                results_modified = post_result_processor.process()
+            else:
+                if streaming:
+                    logger.warning(f"{module_name}_{search.id}: {processor}.validate() failed while streaming")
+                    return False
+                error_return(f"{module_name}_{search.id}: {processor}.validate() failed", swqrx_logger)
+                return False
+            # end if
+            if results is not None and not getattr(post_result_processor, 'pipeline', False):
+                # security review for 1.7 - OK, filtered by search ID
+                results = Result.objects.filter(search_id=search.id)
+                if result_ids is not None:
+                    results = results.filter(id__in=result_ids)
+                results = list(results)
+        except (NameError, TypeError, ValueError) as err:
+            if streaming:
+                logger.warning(f'{module_name}_{search.id}: {processor}: {err.args}, {err} while streaming')
+                return False
+            error_return(f'{module_name}_{search.id}: {processor}: {err.args}, {err}', swqrx_logger)
+            return False
+        if streaming:
+            # the final pass reports what each processor did
+            continue
+        if results_modified < 0:
+            message = f"[{datetime.now()}] {processor} deleted {-1*results_modified} results"
+        else:
+            message = f"[{datetime.now()}] {processor} updated {results_modified} results"
+        # don't repeat the same message - to do: test
+        last_message = search.messages[-1:]
+        if last_message:
+            if last_message[0].lower().strip() != message.lower().strip():
+                search.messages.append(message)
+            # end if
+        else:
+            search.messages.append(message)
+            # end if
+        # end if
+    # end for
+
+    save_post_processed_results(results)
+    return True
+
+def skip_open_circuits(search, providers):
+
+    '''
+    Returns the providers whose circuit breaker lets a request through; the others are marked CIRCUIT_OPEN
+    in Search.provider_status, with a message saying when they will be tried again
+    '''
+
+    allowed = []
+    for provider in providers:
+        if circuit_breaker.allow(provider.id):
+            allowed.append(provider)
+            continue
+        circuit = circuit_breaker.get_state(provider.id)
+        retry_in = max(int((circuit['retry_at'] or time.time()) - time.time()), 0)
+        logger.info(f"{module_name}_{search.id}: skipping {provider.name}, circuit open")
+        search.provider_status[str(provider.id)] = 'CIRCUIT_OPEN'
+        search.messages.append(f"[{datetime.now()}] Skipped {provider.name}: it failed {circuit['consecutive_failures']} times in a row ({int(circuit['error_rate'] * 100)}% of recent requests), retrying in {retry_in}s")
+    # end for
+    return allowed
+
+def get_provider_status(provider_results):
+
+    '''
+    Maps the federate_task(s) sent to one provider - more than one if the request was hedged - to the
+    provider status reported in Search.provider_status
+    '''
+
+    for provider_result in provider_results:
+        if provider_result.ready() and provider_result.successful() and not provider_result.result in [False, None]:
+            return 'READY'
+    for provider_result in provider_results:
+        if not provider_result.ready():
+            return 'TIMED_OUT'
+    return 'ERROR'
+
+def wait_for_providers(search, providers, provider_results, update, session, swqrx_logger, streaming=False, submit=None, raw_results=None):
+
+    '''
+    Waits for each provider's federate_task until it finishes or the provider's latency budget
+    (SearchProvider.timeout, or SWIRL_TIMEOUT) runs out; a provider that runs out is marked TIMED_OUT
+    and the search continues without it.
+    Providers with hedge set get a duplicate request once they pass their observed p95 latency; the
+    first request to finish wins and the other is revoked.
+    When streaming, each time providers finish while others are still running, the post-result
+    processors are run over the Results that just arrived and the search is marked PARTIAL_RESULTS_READY,
+    so the mixers can return them before the slowest provider answers. The json_results of those Results,
+    as the connectors saved them, are kept in raw_results for the final pass over all of them.
+    submit(provider) sends the hedged request, by default another federate_task
+    Returns the task results, like GroupResult.get()
+    '''
+
+    if submit is None:
+        submit = lambda provider: federate_task.delay(search.id, provider.id, provider.connector, update, session, swqrx_logger.request_id)
+
+    start_time = time.time()
+    pending = {provider.id: [provider_result] for provider, provider_result in zip(providers, provider_results)}
+    by_id = {provider.id: provider for provider in providers}
+    deadlines = {provider.id: start_time + get_provider_timeout(provider) for provider in providers}
+    hedge_after = {}
+    if not update:
+        for provider in providers:
+            if provider.hedge:
+                p95 = get_provider_latency_percentile(provider.id)
+                if p95 and p95 < get_provider_timeout(provider):
+                    hedge_after[provider.id] = start_time + p95
+    if raw_results is None:
+        raw_results = {}
+    # READY providers whose Results were processed while streaming
+    streamed = set()
+    results = []
+    while pending:
+        now = time.time()
+        finished = []
+        for provider_id, attempts in pending.items():
+            status = get_provider_status(attempts)
+            if status == 'READY' or status == 'ERROR':
+                finished.append(provider_id)
+            elif now >= deadlines[provider_id]:
+                finished.append(provider_id)
+                logger.warning(f"{module_name}_{search.id}: {by_id[provider_id].name} did not respond within {get_provider_timeout(by_id[provider_id])}s, query results may still be returned")
+            elif provider_id in hedge_after and now >= hedge_after[provider_id]:
+                del hedge_after[provider_id]
+                provider = by_id[provider_id]
+                logger.info(f"{module_name}_{search.id}: {provider.name} passed its p95 latency, sending a hedged request")
+                search.messages.append(f"[{datetime.now()}] Sent a hedged request to {provider.name}")
+                attempts.append(submit(provider))
+        if not finished:
+            time.sleep(0.05)
+            continue
+        for provider_id in finished:
+            attempts = pending.pop(provider_id)
+            search.provider_status[str(provider_id)] = get_provider_status(attempts)
+            if search.provider_status[str(provider_id)] == 'TIMED_OUT':
+                circuit_breaker.record(provider_id, False, now - start_time)
+            for provider_result in attempts:
+                if provider_result.ready() and provider_result.successful() and not provider_result.result in [False, None]:
+                    results.append(provider_result.result)
+                    break
+            if search.provider_status[str(provider_id)] == 'READY':
+                # the losing hedged request: drop it if it hasn't started, otherwise it stops at Connector.hedge_lost()
+                for provider_result in attempts:
+                    if not provider_result.ready():
+                        provider_result.revoke()
+            logger.debug(f"{module_name}_{search.id}: {by_id[provider_id].name} {search.provider_status[str(provider_id)]}, {len(pending)} pending")
+        if not pending or not streaming:
+            search.save()
+            continue
+        arrived = [int(provider_id) for provider_id, status in search.provider_status.items() if status == 'READY' and not int(provider_id) in streamed]
+        if not arrived:
+            search.save()
+            continue
+        streamed.update(arrived)
+        # security review for 1.7 - OK, filtered by search ID
+        new_results = list(Result.objects.filter(search_id=search.id, provider_id__in=arrived))
+        for result in new_results:
+            raw_results[result.id] = copy.deepcopy(result.json_results)
+        if search.post_result_processors:
+            last_status = search.status
+            # RESCORING keeps the results readable while they are re-processed
+            search.status = 'RESCORING'
+            search.save()
+            if not run_post_result_processors(search, swqrx_logger, streaming=True, results=new_results):
+                search.status = last_status
+                search.save()
+                continue
+        index_result_items(search.id, result_ids=[result.id for result in new_results])
+        search.status = 'PARTIAL_RESULTS_READY'
+        search.messages.append(f"[{datetime.now()}] Streaming results from {len(streamed)} of {len(providers)} SearchProviders")
+        search.save()
+    # end while
+
+    return results
+
 def run_processor_if_tag_in_request(tag, processor_name, request, search, swqrx_logger):
     if not (request and tag and processor_name):
         return
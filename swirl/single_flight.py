@@ -0,0 +1,181 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+from swirl.result_cache import get_provider_config_hash
+
+SWIRL_SINGLE_FLIGHT = getattr(settings, 'SWIRL_SINGLE_FLIGHT', True)
+SWIRL_SINGLE_FLIGHT_REDIS_URL = getattr(settings, 'SWIRL_SINGLE_FLIGHT_REDIS_URL', '')
+
+# how often a follower in another process checks for the leader's outcome
+SWIRL_SINGLE_FLIGHT_POLL = 0.05
+# the outcome is kept only long enough for the followers polling for it
+SWIRL_SINGLE_FLIGHT_RESULT_TTL = 10
+
+#############################################
+
+def get_single_flight_key(provider, query_to_provider, sort, user_id=None):
+    '''
+    Requests with the same key get the same response: provider id and config hash, the query sent and the sort,
+    and the user for providers that search with the user's own credentials
+    '''
+    key = [provider.id, get_provider_config_hash(provider), query_to_provider, sort, user_id]
+    return 'swirl:flight:' + hashlib.sha256(json.dumps(key, default=str).encode('utf-8')).hexdigest()
+
+class Flight:
+
+    __slots__ = ('done', 'outcome', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.outcome = None
+        self.waiters = 0
+
+class SingleFlight:
+
+    '''
+    Coalesces identical requests that are in flight at the same time: the first caller (the leader) runs fn(),
+    the others wait for its outcome and get a copy of it, so a burst of identical searches sends one request
+    Nothing is kept once the leader finishes, the next identical request runs again
+    Within a process followers wait on the leader's thread; with SWIRL_SINGLE_FLIGHT_REDIS_URL set, followers
+    in other workers find the leader through a Redis lock and poll for its outcome
+    fn() must return something JSON serializable; None means there is nothing to share
+    '''
+
+    def __init__(self, enabled=SWIRL_SINGLE_FLIGHT, redis_url=SWIRL_SINGLE_FLIGHT_REDIS_URL, redis_client=None):
+        self.enabled = enabled
+        self._redis = redis_client
+        self._redis_url = redis_url
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.led = 0
+        self.shared = 0
+
+    def _get_redis(self):
+        if self._redis is None and self._redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(self._redis_url)
+            except Exception as err:
+                logger.warning(f"single_flight: redis unavailable at {self._redis_url}: {err}")
+                self._redis_url = ''
+        return self._redis
+
+    def _wait_remote(self, client, key, flight_id, timeout):
+        deadline = time.time() + timeout
+        result_key = f'{key}:{flight_id}'
+        while time.time() < deadline:
+            data = client.get(result_key)
+            if data:
+                return json.loads(data)
+            if self._get_flight_id(client, key) != flight_id:
+                # the leader gave up without an outcome
+                data = client.get(result_key)
+                return json.loads(data) if data else None
+            time.sleep(SWIRL_SINGLE_FLIGHT_POLL)
+        return None
+
+    def _get_flight_id(self, client, key):
+        flight_id = client.get(key)
+        return flight_id.decode('utf-8') if flight_id else None
+
+    def _lead_remote(self, client, key, timeout):
+        '''
+        Returns (flight id, True) if this process leads the flight, (leader's flight id, False) otherwise
+        '''
+        flight_id = uuid.uuid4().hex
+        if client.set(key, flight_id, nx=True, ex=max(int(timeout), 1)):
+            return flight_id, True
+        return self._get_flight_id(client, key), False
+
+    def do(self, key, fn, timeout):
+        '''
+        Returns (outcome, shared): fn()'s outcome, or a copy of the leader's with shared True
+        The leader gets the outcome itself; it is copied once for the followers, if there are any
+        If the leader's outcome doesn't arrive within timeout seconds, fn() runs here
+        '''
+        if not self.enabled or not key:
+            return fn(), False
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._flights = {}
+                self._pid = os.getpid()
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                self._flights[key] = flight
+            else:
+                flight.waiters = flight.waiters + 1
+
+        if not leader:
+            if flight.done.wait(timeout) and flight.outcome is not None:
+                with self._lock:
+                    self.shared = self.shared + 1
+                return copy.deepcopy(flight.outcome), True
+            return fn(), False
+
+        client = self._get_redis()
+        flight_id = None
+        outcome = None
+        try:
+            if client is not None:
+                try:
+                    flight_id, remote_leader = self._lead_remote(client, key, timeout)
+                    if not remote_leader:
+                        outcome = self._wait_remote(client, key, flight_id, timeout) if flight_id else None
+                        if outcome is not None:
+                            with self._lock:
+                                self.shared = self.shared + 1
+                            return outcome, True
+                        flight_id = None
+                except Exception as err:
+                    logger.warning(f"single_flight: redis failed, coalescing in this process only: {err}")
+                    flight_id = None
+            with self._lock:
+                self.led = self.led + 1
+            outcome = fn()
+            if flight_id and outcome is not None:
+                try:
+                    client.set(f'{key}:{flight_id}', json.dumps(outcome, default=str), ex=SWIRL_SINGLE_FLIGHT_RESULT_TTL)
+                except Exception as err:
+                    logger.warning(f"single_flight: redis set failed: {err}")
+            return outcome, False
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                # no follower joins once the flight is removed
+                waiters = flight.waiters
+            if waiters and outcome is not None:
+                # taken before the leader's caller can change its outcome; each follower copies this one
+                flight.outcome = copy.deepcopy(outcome)
+            flight.done.set()
+            if flight_id:
+                try:
+                    if self._get_flight_id(client, key) == flight_id:
+                        client.delete(key)
+                except Exception as err:
+                    logger.warning(f"single_flight: redis delete failed: {err}")
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._flights), 'led': self.led, 'shared': self.shared}
+
+single_flight = SingleFlight()
@@ -0,0 +1,67 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+from django.contrib.auth.models import User
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+from swirl.models import Search, QueryTransform
+
+# what the connectors read from the Search; messages and the rest are not sent to the federate tasks
+SEARCH_SNAPSHOT_FIELDS = ['id', 'owner_id', 'query_string', 'query_string_processed', 'sort', 'tags', 'pre_query_processors', 'status']
+
+#############################################
+
+def get_search_snapshot(search, user, providers):
+    '''
+    A compact, JSON serializable copy of what the connectors need from the database for this search: the
+    processed query, sort and tags, the owner and their permissions and the QueryTransforms the providers'
+    query_processors name
+    The SearchProviders are not included: their credentials, URLs and headers may hold secrets, which must not
+    travel in the Celery messages, so each federate task reads its provider from the database
+    '''
+    transform_names = set()
+    for provider in providers:
+        for processor in provider.query_processors or []:
+            # name.type, see transform_query_processor_utils
+            if '.' in str(processor):
+                transform_names.add(str(processor).split('.')[0].strip())
+    query_transforms = []
+    if transform_names:
+        query_transforms = [[qrx.name, qrx.qrx_type, qrx.config_content] for qrx in QueryTransform.objects.filter(name__in=transform_names)]
+    return {
+        'search': {field: getattr(search, field) for field in SEARCH_SNAPSHOT_FIELDS},
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'is_active': user.is_active,
+            'is_superuser': user.is_superuser,
+            'permissions': sorted(user.get_all_permissions())
+        },
+        'query_transforms': query_transforms
+    }
+
+def load_search_snapshot(snapshot, search_id):
+    '''
+    Returns the search, user and query_transforms for prefetched_objects(), built from the snapshot
+    without querying the database; empty if the snapshot doesn't match the search
+    '''
+    if not snapshot:
+        return {}
+    if snapshot['search']['id'] != search_id:
+        logger.warning(f"search snapshot does not match {search_id}, reading the database")
+        return {}
+    user_fields = snapshot['user']
+    user = User(id=user_fields['id'], username=user_fields['username'], is_active=user_fields['is_active'], is_superuser=user_fields['is_superuser'])
+    # ModelBackend reads permissions from this cache before querying, so has_perm() doesn't hit the database
+    user._perm_cache = set(user_fields['permissions'])
+    search = Search(**{field: value for field, value in snapshot['search'].items() if field != 'owner_id'})
+    search.owner = user
+    return {
+        'search': search,
+        'user': user,
+        'query_transforms': {(name, qrx_type): config_content for name, qrx_type, config_content in snapshot['query_transforms']}
+    }
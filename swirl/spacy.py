@@ -3,6 +3,210 @@
 @contact:    sid@swirl.today
 '''
 
-import spacy
+import hashlib
+import threading
 
-nlp = spacy.load('en_core_web_lg')
\ No newline at end of file
+import numpy as np
+from cachetools import TTLCache
+
+from django.conf import settings
+
+from swirl.model_registry import get_model
+
+def get_nlp():
+    '''
+    The en_core_web_lg pipeline, loaded on first use
+    '''
+    return get_model('spacy')
+
+def __getattr__(name):
+    # keeps "from swirl.spacy import nlp" working without loading the model at import time
+    if name == 'nlp':
+        return get_nlp()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_vector_disable():
+    # only the tokenizer and the static vectors are needed to compute Doc.vector
+    return list(get_nlp().pipe_names)
+
+SWIRL_SPACY_CACHE_SIZE = getattr(settings, 'SWIRL_SPACY_CACHE_SIZE', 50000)
+SWIRL_SPACY_CACHE_TTL = getattr(settings, 'SWIRL_SPACY_CACHE_TTL', 3600)
+
+#############################################
+
+class SpacyVector:
+
+    '''
+    The parts of a spaCy Doc that vector similarity needs, small enough to cache
+    '''
+
+    __slots__ = ('vector', 'vector_norm', 'orths', 'has_vector')
+
+    def __init__(self, doc):
+        self.vector = doc.vector
+        self.vector_norm = doc.vector_norm
+        self.orths = tuple(token.orth for token in doc)
+        self.has_vector = doc.has_vector
+
+    def similarity(self, other):
+        '''
+        Same result as Doc.similarity(): 1.0 for identical token sequences,
+        0.0 if either vector is empty, otherwise the cosine of the two vectors
+        '''
+        if self.orths == other.orths:
+            return 1.0
+        if self.vector_norm == 0 or other.vector_norm == 0:
+            return 0.0
+        result = np.dot(self.vector, other.vector) / (self.vector_norm * other.vector_norm)
+        return result.item()
+
+#############################################
+
+class SpacyVectorCache:
+
+    '''
+    Process-wide, bounded LRU/TTL cache of SpacyVector, keyed by a hash of the text
+    The text is hashed exactly as given - normalizing it here would change the spaCy tokens, and the vector
+    '''
+
+    def __init__(self, maxsize=SWIRL_SPACY_CACHE_SIZE, ttl=SWIRL_SPACY_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text):
+        return hashlib.blake2b(text.encode('utf-8', errors='surrogatepass'), digest_size=16).digest()
+
+    def get_many(self, texts, batch_size=256):
+        '''
+        Returns a SpacyVector for each text, parsing only the cache misses with a single nlp.pipe() call
+        '''
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in found:
+                    continue
+                vec = self._cache.get(key)
+                if vec is not None:
+                    found[key] = vec
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            docs = get_nlp().pipe(list(missing.values()), batch_size=batch_size, disable=get_vector_disable())
+            parsed = {key: SpacyVector(doc) for key, doc in zip(missing.keys(), docs)}
+            with self._lock:
+                for key, vec in parsed.items():
+                    self._cache[key] = vec
+            found.update(parsed)
+        with self._lock:
+            self.misses = self.misses + len(missing)
+            self.hits = self.hits + len(keys) - len(missing)
+        return [found[key] for key in keys]
+
+    def get(self, text):
+        return self.get_many([text])[0]
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._cache),
+                'maxsize': self._cache.maxsize,
+                'ttl': self._cache.ttl,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+spacy_vector_cache = SpacyVectorCache()
+
+def get_vector(text):
+    '''
+    Cached replacement for nlp(text) when only .vector, .has_vector or .similarity() are used
+    '''
+    return spacy_vector_cache.get(text)
+
+def get_vectors(texts):
+    return spacy_vector_cache.get_many(texts)
+
+#############################################
+
+class SpacyVectorBatch:
+
+    '''
+    Collects texts, vectorizes all of them in one call through the vector cache and answers
+    the vector questions the relevancy processors ask (zero vectors, has_vector, similarity)
+    from one matrix of Doc.vector rows, instead of calling nlp() and Doc.similarity() per text
+    '''
+
+    def __init__(self):
+        self._index = {}
+        self._texts = []
+        self.chars = 0
+        self.vectors = None
+        self.norms = []
+        self.orths = []
+        self.has_vectors = []
+        self.nonzero = None
+
+    def __len__(self):
+        return len(self._texts)
+
+    def add(self, text):
+        '''
+        Register a text, returns its row in the batch; identical texts share a row
+        '''
+        if text in self._index:
+            return self._index[text]
+        self._index[text] = len(self._texts)
+        self._texts.append(text)
+        self.chars = self.chars + len(text)
+        return self._index[text]
+
+    def compute(self):
+        '''
+        Vectorize all registered texts in one pass and stack their vectors
+        '''
+        rows = []
+        for vec in get_vectors(self._texts):
+            rows.append(vec.vector)
+            self.norms.append(vec.vector_norm)
+            self.orths.append(vec.orths)
+            self.has_vectors.append(vec.has_vector)
+        if rows:
+            self.vectors = np.vstack(rows)
+        else:
+            self.vectors = np.zeros((0, get_nlp().vocab.vectors_length), dtype='float32')
+        # equivalent to doc.vector.all() for every row
+        self.nonzero = self.vectors.all(axis=1)
+        return len(rows)
+
+    def has_vector(self, i):
+        return self.has_vectors[i]
+
+    def has_zero(self, i):
+        '''
+        True if any dimension of the vector is 0, i.e. doc.vector.all() == 0
+        '''
+        return not self.nonzero[i]
+
+    def similarity(self, i, j):
+        '''
+        Same result as Doc.similarity(): 1.0 for identical token sequences,
+        0.0 if either vector is empty, otherwise the cosine of the two rows
+        '''
+        if self.orths[i] == self.orths[j]:
+            return 1.0
+        if self.norms[i] == 0 or self.norms[j] == 0:
+            return 0.0
+        # rows are contiguous float32, so np.dot reduces them exactly as Doc.similarity does
+        result = np.dot(self.vectors[i], self.vectors[j]) / (self.norms[i] * self.norms[j])
+        return result.item()
@@ -0,0 +1,133 @@
+'''
+@author:     Sid Probstein
+@contact:    sid@swirl.today
+'''
+
+import hashlib
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from celery.utils.log import get_task_logger
+logger = get_task_logger(__name__)
+
+from swirl.models import Result, SubscriptionState
+
+# subscription updates only add results not retrieved before, see Connector.process_results()
+SWIRL_SUBSCRIBE_INCREMENTAL = getattr(settings, 'SWIRL_SUBSCRIBE_INCREMENTAL', True)
+# the most dedupe keys remembered per search and provider, the oldest are forgotten first
+SWIRL_SUBSCRIBE_SEEN_MAX = getattr(settings, 'SWIRL_SUBSCRIBE_SEEN_MAX', 10000)
+SWIRL_DEDUPE_FIELD = getattr(settings, 'SWIRL_DEDUPE_FIELD', 'url')
+
+#############################################
+
+def get_seen_key(item):
+
+    '''
+    A 64 bit hash of the item's SWIRL_DEDUPE_FIELD, from the item or its payload, or of its title and body if it has none
+    '''
+
+    value = item.get(SWIRL_DEDUPE_FIELD, None)
+    if not value and type(item.get('payload', None)) == dict:
+        value = item['payload'].get(SWIRL_DEDUPE_FIELD, None)
+    if not value:
+        value = f"{item.get('title', '')}\n{item.get('body', '')}"
+    return hashlib.blake2b(str(value).encode('utf-8', errors='surrogatepass'), digest_size=8).hexdigest()
+
+class Subscription:
+
+    '''
+    The watermark and seen set of one search and provider, for incremental updates
+    filter() drops the items already retrieved, date_after() is the date to push down to the provider;
+    save() records the items kept and the time of the query
+    '''
+
+    def __init__(self, search, provider_id):
+        self.search = search
+        self.provider_id = provider_id
+        self.dropped = 0
+        self.state = SubscriptionState.objects.filter(search_id=search, provider_id=provider_id).first()
+        if self.state is None:
+            self.state = self._get_initial_state()
+        self.seen = list(self.state.seen)
+        self._seen_set = set(self.seen)
+
+    def _get_initial_state(self):
+        # the first update of a search: start from the results it already has
+        state = SubscriptionState(search_id=self.search, provider_id=self.provider_id)
+        # security review for 1.7 - OK, filtered by search ID
+        result = Result.objects.filter(search_id=self.search, provider_id=self.provider_id).first()
+        if result and type(result.json_results) == list:
+            state.seen = [get_seen_key(item) for item in result.json_results if type(item) == dict][-SWIRL_SUBSCRIBE_SEEN_MAX:]
+            state.date_published = get_latest_date(result.json_results)
+            state.date_queried = result.date_created
+        return state
+
+    def date_after(self):
+
+        '''
+        The date part of the watermark, or None before the first update
+        '''
+
+        if self.state.date_published:
+            return self.state.date_published[:10]
+        if self.state.date_queried:
+            return self.state.date_queried.strftime('%Y-%m-%d')
+        return None
+
+    def filter(self, results):
+
+        '''
+        Returns the results not seen before; results repeated in this batch are kept once
+        '''
+
+        if not results:
+            return results
+        kept = type(results)() if isinstance(results, list) else []
+        for item in results:
+            key = get_seen_key(item)
+            if key in self._seen_set:
+                self.dropped = self.dropped + 1
+                continue
+            self._seen_set.add(key)
+            self.seen.append(key)
+            kept.append(item)
+        # end for
+        return kept
+
+    def save(self, results):
+
+        '''
+        Moves the watermark to the latest date_published in results and stores the seen set
+        '''
+
+        latest = get_latest_date(results)
+        if latest > self.state.date_published:
+            self.state.date_published = latest
+        self.state.date_queried = timezone.now()
+        self.state.seen = self.seen[-SWIRL_SUBSCRIBE_SEEN_MAX:]
+        try:
+            self.state.save()
+        except IntegrityError:
+            # another update of the same search and provider saved first
+            logger.warning(f"subscriptions: state for {self.search.id}:{self.provider_id} was saved concurrently, keeping it")
+
+def get_latest_date(results):
+    latest = ''
+    for item in results or []:
+        date_published = item.get('date_published', '') if hasattr(item, 'get') else ''
+        if date_published and date_published != 'unknown' and str(date_published) > latest:
+            latest = str(date_published)
+    # end for
+    return latest[:64]
+
+def get_subscription(search, provider_id):
+
+    '''
+    The Subscription for an update of search from provider_id, or None if updates aren't incremental
+    '''
+
+    if not SWIRL_SUBSCRIBE_INCREMENTAL:
+        return None
+    return Subscription(search, provider_id)
@@ -30,6 +30,8 @@ from swirl.models import SearchProvider
 from swirl.performance_logger import *
 from swirl.web_page import PageFetcherFactory
 from swirl.authenticators import SWIRL_AUTHENTICATORS_DISPATCH
+from swirl.connectors.connector import prefetched_objects
+from swirl.snapshot import load_search_snapshot
 
 # use these to have the same options set for all fetches
 # while developing
@@ -118,11 +120,14 @@ def page_fetcher_task(searchprovider, swirl_score, url, provider_id, body, user_
 ##################################################
 
 @shared_task(name='federate', ignore_result=False)
-def federate_task(search_id, provider_id, provider_connector, update, session, request_id):
+def federate_task(search_id, provider_id, provider_connector, update, session, request_id, snapshot=None, bypass_cache=False):
     logger.debug(f"{module_name}: federate_task: {search_id}_{provider_id}_{provider_connector} update: {update} request_id {request_id}")
     try:
         with ProviderQueryRequestLogger(provider_connector+'_'+str(provider_id), request_id):
-            connector = alloc_connector(connector=provider_connector)(provider_id, search_id, update, request_id=request_id)
+            # the connector is built from the search snapshot, see swirl/snapshot.py; without one it reads the database
+            with prefetched_objects(**load_search_snapshot(snapshot, search_id)):
+                connector = alloc_connector(connector=provider_connector)(provider_id, search_id, update, request_id=request_id)
+            connector.bypass_cache = bypass_cache
             return connector.federate(session)
     except NameError as err:
         message = f'Error: NameError: {err}'
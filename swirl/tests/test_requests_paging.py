@@ -0,0 +1,166 @@
+import re
+import json
+import time
+import threading
+import pytest
+import requests
+import responses
+from urllib.parse import urlparse, parse_qs
+from django.contrib.auth.models import User
+from swirl.models import Search
+from swirl.serializers import SearchProviderSerializer
+from swirl.connectors.requestsget import RequestsGet
+from swirl.connectors.requests import PageRateLimiter
+import swirl.connectors.requests
+
+## General and shared
+
+PAGED_URL = 'https://paged.example.com/search'
+
+@pytest.fixture
+def test_suser_pw():
+    return 'password'
+
+@pytest.fixture
+def test_suser(test_suser_pw):
+    return User.objects.create_user(
+        username='paging_user',
+        password=test_suser_pw,
+        is_staff=True,
+        is_superuser=True,
+    )
+
+@pytest.fixture
+def paged_provider_data():
+    return {
+        "name": "Paged Search",
+        "active": True,
+        "default": True,
+        "connector": "RequestsGet",
+        "url": PAGED_URL,
+        "query_template": "{url}?&q={query_string}",
+        "query_processors": [],
+        "query_mappings": "PAGE=start=RESULT_INDEX",
+        "response_mappings": "FOUND=total,RETRIEVED=count,RESULTS=items",
+        "result_processors": ["MappingResultProcessor"],
+        "result_mappings": "title=title,url=link",
+        "results_per_query": 50,
+        "credentials": "",
+        "tags": []
+    }
+
+@pytest.fixture
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(swirl.connectors.requests, 'page_rate_limiter', PageRateLimiter(rate=0))
+
+def get_connector(user, provider_data):
+    serializer = SearchProviderSerializer(data=provider_data)
+    serializer.is_valid(raise_exception=True)
+    provider = serializer.save(owner=user)
+    search = Search.objects.create(owner=user, query_string='foo', query_string_processed='foo')
+    connector = RequestsGet(provider.id, search.id, False)
+    connector.process_query()
+    connector.construct_query()
+    return connector
+
+def add_pages(sizes, delays=None, calls=None):
+    '''
+    Mocks the provider: the page starting at result 1 + 10 * n has sizes[n] items, returned after delays[n] seconds
+    '''
+    def callback(request):
+        start = int(parse_qs(urlparse(request.url).query)['start'][0])
+        page = (start - 1) // 10
+        if calls is not None:
+            calls.append((page, time.time()))
+        if delays:
+            time.sleep(delays[page])
+        items = [{'title': f'result {start + i}', 'link': f'http://example.com/{start + i}'} for i in range(sizes[page])]
+        return (200, {}, json.dumps({'total': 1000, 'count': len(items), 'items': items}))
+    responses.add_callback(responses.GET, re.compile(re.escape(PAGED_URL) + r'.*'), callback=callback, content_type='application/json')
+
+######################################################################
+
+@pytest.mark.django_db
+@responses.activate
+def test_pages_are_kept_in_order(test_suser, paged_provider_data, no_rate_limit):
+    # later pages answer first, the results still come back in page order
+    add_pages([10, 10, 10, 10, 10], delays=[0, 0.3, 0.2, 0.1, 0])
+    connector = get_connector(test_suser, paged_provider_data)
+    connector.execute_search()
+    assert [item['title'] for item in connector.response] == [f'result {i}' for i in range(1, 51)]
+    assert connector.retrieved == 10 and connector.found == 1000
+    assert len(responses.calls) == 5
+
+@pytest.mark.django_db
+@responses.activate
+def test_paging_stops_at_a_short_page(test_suser, paged_provider_data, no_rate_limit):
+    add_pages([10, 4, 10, 10, 10])
+    connector = get_connector(test_suser, paged_provider_data)
+    connector.execute_search()
+    # nothing after the short second page is used
+    assert [item['title'] for item in connector.response] == [f'result {i}' for i in range(1, 15)]
+
+@pytest.mark.django_db
+@responses.activate
+def test_unused_pages_are_closed(test_suser, paged_provider_data, no_rate_limit, monkeypatch):
+    closed = []
+    close = requests.Response.close
+    def record_close(response):
+        # pages fetched ahead by the previous tests may still be closing
+        if any(call.response is response for call in responses.calls):
+            closed.append(int(parse_qs(urlparse(response.url).query)['start'][0]))
+        close(response)
+    monkeypatch.setattr(requests.Response, 'close', record_close)
+    add_pages([10, 4, 10, 10, 10], delays=[0, 0, 0.1, 0.1, 0.1])
+    connector = get_connector(test_suser, paged_provider_data)
+    connector.execute_search()
+    assert len(connector.response) == 14
+    # the pages fetched ahead of the short one give their connections back once they finish,
+    # those that hadn't started are cancelled
+    deadline = time.time() + 1
+    while len(closed) < 3 and time.time() < deadline:
+        time.sleep(0.05)
+    fetched = [int(parse_qs(urlparse(call.request.url).query)['start'][0]) for call in responses.calls]
+    assert closed and sorted(closed) == sorted(start for start in fetched if start > 11)
+
+@pytest.mark.django_db
+@responses.activate
+def test_a_short_first_page_is_fetched_alone(test_suser, paged_provider_data, no_rate_limit):
+    add_pages([7, 10, 10, 10, 10])
+    connector = get_connector(test_suser, paged_provider_data)
+    connector.execute_search()
+    assert len(connector.response) == 7
+    assert len(responses.calls) == 1
+
+@pytest.mark.django_db
+@responses.activate
+def test_page_requests_are_rate_limited(test_suser, paged_provider_data, monkeypatch):
+    monkeypatch.setattr(swirl.connectors.requests, 'page_rate_limiter', PageRateLimiter(rate=10))
+    calls = []
+    add_pages([10, 10, 10, 10, 10], calls=calls)
+    connector = get_connector(test_suser, paged_provider_data)
+    connector.execute_search()
+    assert len(connector.response) == 50
+    times = sorted(call_time for page, call_time in calls)
+    # at most 10 a second, even though pages 2-5 are fetched concurrently
+    assert all(later - earlier > 0.08 for earlier, later in zip(times, times[1:]))
+
+def test_page_rate_limiter_spaces_out_each_provider():
+    limiter = PageRateLimiter(rate=20)
+    start_time = time.time()
+    threads = [threading.Thread(target=limiter.wait, args=(1,)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.time() - start_time >= 0.19
+    # another provider has its own schedule
+    start_time = time.time()
+    limiter.wait(2)
+    assert time.time() - start_time < 0.05
+    # no limit
+    limiter = PageRateLimiter(rate=0)
+    start_time = time.time()
+    for _ in range(10):
+        limiter.wait(1)
+    assert time.time() - start_time < 0.05
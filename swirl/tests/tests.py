@@ -1005,3 +1005,1170 @@ def test_query_trasnform_unique(api_client, test_suser, test_suser_pw, qrx_recor
     ## try to create it again
     response = api_client.post(reverse('create'),data=qrx_record_1, format='json')
     assert response.status_code == 400, 'Expected HTTP status code 400'
+
+def test_spacy_vector_cache_hits_and_misses():
+
+    from swirl.spacy import SpacyVectorCache, nlp
+
+    cache = SpacyVectorCache(maxsize=10, ttl=60)
+    vectors = cache.get_many(['knowledge management', 'enterprise search', 'knowledge management'])
+    assert cache.stats()['misses'] == 2
+    assert cache.stats()['hits'] == 1
+    assert vectors[0] is vectors[2]
+
+    cache.get('enterprise search')
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['size'] == 2
+
+    # same answer as Doc.similarity()
+    assert vectors[0].similarity(vectors[1]) == nlp('knowledge management').similarity(nlp('enterprise search'))
+    assert vectors[0].similarity(vectors[2]) == 1.0
+
+class LocalRedis:
+    # minimal stand-in for the redis client calls ResultCache makes
+    def __init__(self):
+        self.data = {}
+    def get(self, key):
+        return self.data.get(key, (None, 0))[0]
+    def set(self, key, value, ex=None):
+        self.data[key] = (value, ex)
+    def ttl(self, key):
+        return self.data.get(key, (None, -2))[1]
+
+def test_result_cache_l1_and_l2():
+
+    from swirl.result_cache import ResultCache
+
+    redis_client = LocalRedis()
+    cache = ResultCache(maxsize=10, redis_client=redis_client)
+    assert cache.get('k') is None
+    cache.set('k', {'found': 1, 'processed_results': [{'title': 'a'}]}, 60)
+    hit = cache.get('k')
+    assert hit == {'found': 1, 'processed_results': [{'title': 'a'}]}
+    # each hit is a copy
+    hit['found'] = 2
+    assert cache.get('k')['found'] == 1
+
+    # another process, same redis
+    other = ResultCache(maxsize=10, redis_client=redis_client)
+    assert other.get('k')['found'] == 1
+    assert other.stats()['l2_hits'] == 1
+
+    cache.set('off', {'found': 1}, 0)
+    assert cache.get('off') is None
+
+def test_mapping_plan_is_compiled_once():
+
+    from swirl.processors.mapping_plan import get_mapping_plan
+
+    mappings = "title=_source.title|name,body='{_source.a} and {_source.b}',url=sw_urlencode(link),NO_PAYLOAD"
+    plan = get_mapping_plan(mappings)
+    assert plan is get_mapping_plan(mappings)
+    assert not plan.use_payload
+    assert [step.swirl_key for step in plan.steps] == ['title', 'body', 'url']
+    assert [key.name for key in plan.steps[1].template_keys] == ['_source.a', '_source.b']
+    assert plan.steps[2].template_keys[0].find({'link': 'a b'}) == 'a%20b'
+
+def test_streaming_parser_stops_at_limit():
+
+    from swirl.connectors.stream_parser import StreamingJsonParser, StreamingXmlParser
+
+    def chunks(body, size=16):
+        for i in range(0, len(body), size):
+            yield body[i:i+size]
+
+    body = json.dumps({'meta': {'skip': [{'a': ']}"'}], 'total': 500}, 'items': [{'n': i} for i in range(100)]}).encode('utf-8')
+    parser = StreamingJsonParser(['items'], [['meta', 'total']], 10, 0)
+    json_data = parser.parse(chunks(body))
+    assert json_data == {'meta': {'total': 500}, 'items': [{'n': i} for i in range(10)]}
+    assert parser.stopped
+
+    # list of lists, header row first
+    body = json.dumps([['a', 'b']] + [[i, i] for i in range(20)]).encode('utf-8')
+    assert StreamingJsonParser([], [], 2, 0).parse(chunks(body)) == [{'a': 0, 'b': 0}, {'a': 1, 'b': 1}]
+
+    body = b'<feed xmlns="http://www.w3.org/2005/Atom">' + b''.join(b'<entry><title>t%d</title></entry>' % i for i in range(50)) + b'</feed>'
+    parser = StreamingXmlParser(['feed', 'entry'], [], 3, 0)
+    assert parser.parse(chunks(body)) == {'feed': {'entry': [{'title': 't0'}, {'title': 't1'}, {'title': 't2'}]}}
+
+def test_circuit_breaker_opens_and_probes():
+
+    from swirl.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+    breaker = CircuitBreaker(enabled=True, failures=3, error_rate=0.5, window=10, min_samples=5, cooldown=60, redis_url='')
+    for _ in range(2):
+        breaker.record(1, False, 1.0)
+    assert breaker.allow(1)
+    breaker.record(1, False, 1.0)
+    assert breaker.get_state(1)['state'] == OPEN
+    assert not breaker.allow(1)
+
+    # after the cooldown a single probe goes through
+    breaker.cooldown = 0
+    assert breaker.allow(1)
+    assert breaker.get_state(1)['state'] == HALF_OPEN
+    assert not breaker.allow(1)
+    breaker.record(1, True, 0.5)
+    state = breaker.get_state(1)
+    assert state['state'] == CLOSED
+    assert state['samples'] == 4 and state['error_rate'] == 0.75
+
+    # error rate, without consecutive failures
+    for success in [True, False, True, False, False]:
+        breaker.record(2, success, 0.1)
+    assert breaker.get_state(2)['state'] == OPEN
+
+def test_single_flight_coalesces_concurrent_requests():
+
+    import threading
+    from swirl.single_flight import SingleFlight
+
+    flights = SingleFlight(enabled=True, redis_url='')
+    calls = []
+    release = threading.Event()
+    response = {'results': [{'title': 'a'}]}
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return response
+
+    outcomes = []
+    def run():
+        outcomes.append(flights.do('k', fetch, 5))
+
+    threads = [threading.Thread(target=run) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flights.stats()['in_flight'] == 0:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert [shared for outcome, shared in outcomes].count(True) == 4
+    assert all(outcome == {'results': [{'title': 'a'}]} for outcome, shared in outcomes)
+    # the leader gets the response itself, each follower its own copy
+    assert len(set(id(outcome) for outcome, shared in outcomes)) == 5
+    assert [outcome is response for outcome, shared in outcomes] == [not shared for outcome, shared in outcomes]
+
+    # nothing is kept once the flight lands, and a request without followers isn't copied
+    empty = {'results': []}
+    assert flights.do('k', lambda: empty, 5)[0] is empty
+
+@pytest.mark.django_db
+def test_search_snapshot_round_trip(test_suser_pw):
+
+    from swirl.models import Search
+    from swirl.snapshot import get_search_snapshot, load_search_snapshot
+
+    owner = get_ddrp_suser(test_suser_pw)
+    provider_data = get_minimal_search_provider_data('snapshot', True, True, ['foo'])
+    provider_data['url'] = 'https://example.com/search?key=secret-key'
+    provider_data['credentials'] = 'bearer=secret-token'
+    serializer = SearchProviderSerializer(data=provider_data)
+    serializer.is_valid(raise_exception=True)
+    provider = serializer.save(owner=owner)
+    search = Search.objects.create(owner=owner, query_string='foo', query_string_processed='foo', messages=['x'] * 100)
+
+    # what federate_task receives, through the JSON serializer
+    message = json.dumps(get_search_snapshot(search, owner, [provider]))
+    snapshot = json.loads(message)
+    assert not 'messages' in snapshot['search']
+    # no provider configuration, and so no secrets, in the Celery message
+    assert not 'providers' in snapshot
+    assert not 'secret' in message
+
+    objects = load_search_snapshot(snapshot, search.id)
+    assert not 'provider' in objects
+    assert objects['search'].query_string_processed == 'foo' and objects['search'].owner.id == owner.id
+    assert objects['user'].has_perm('swirl.view_querytransform')
+    assert load_search_snapshot(snapshot, search.id + 1) == {}
+
+def test_result_processor_pipeline_fuses_per_item_stages():
+
+    from swirl.models import SearchProvider
+    from swirl.processors.pipeline import ResultProcessorPipeline
+
+    provider = SearchProvider(name='pipeline', tags=[])
+    results = [{'title': 'foo bar', 'body': '', 'payload': {}}, {'title': 'bar', 'body': '', 'payload': {}}, {'title': 'foo', 'body': '', 'payload': {}}]
+    pipeline = ResultProcessorPipeline(['TestResultProcessor', 'RequireQueryStringInTitleResultProcessor', 'DuplicateHalfResultProcessor', 'CleanTextResultProcessor'],
+                                       provider, 'foo', skip=['CleanTextResultProcessor'])
+    processed = pipeline.run(results)
+
+    # the first two ran in one pass, the second dropped 'bar' and the batch processor duplicated half of the rest
+    assert [item['title'] for item in processed] == ['foo bar', 'foo', 'foo bar']
+    assert processed[0] is results[0] and all(item['test'] for item in processed)
+    assert [(stage['processor'], stage['items'], stage['modified']) for stage in pipeline.stages] == [
+        ('TestResultProcessor', 3, 3), ('RequireQueryStringInTitleResultProcessor', 3, -1), ('DuplicateHalfResultProcessor', 2, 3)]
+
+def test_result_item_is_a_dict_view():
+
+    import pickle
+    from swirl.processors.result_batch import ResultItem, ResultBatch
+    from swirl.processors.utils import create_result_dictionary
+
+    item = ResultItem()
+    assert item == create_result_dictionary() and list(item) == list(create_result_dictionary())
+    item['title'] = 'foo'
+    item['explain'] = {'title': 1}
+    del item['author']
+    assert 'explain' in item and not 'author' in item and item.get('author', 'x') == 'x'
+    with pytest.raises(KeyError):
+        item['author']
+
+    batch = ResultBatch([item, {'result_processor_feedback': {}}])
+    assert pickle.loads(pickle.dumps(batch)) == batch
+    stored = batch.to_json()
+    assert type(stored[0]) == dict and stored[0]['title'] == 'foo' and list(stored[0])[-2:] == ['payload', 'explain']
+    assert json.loads(json.dumps(stored)) == stored
+
+@pytest.mark.django_db
+def test_post_result_processors_save_once(test_suser_pw):
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from swirl.models import Search, Result
+    from swirl.search import run_post_result_processors
+    from swirl.performance_logger import SwirlQueryRequestLogger
+
+    owner = get_ddrp_suser(test_suser_pw)
+    search = Search.objects.create(owner=owner, query_string='foo', status='POST_RESULT_PROCESSING',
+                                   post_result_processors=['DedupeByFieldPostResultProcessor', 'DropIrrelevantPostResultProcessor'])
+    for provider_id in [1, 2, 3]:
+        Result.objects.create(owner=owner, search_id=search, provider_id=provider_id, searchprovider=f'p{provider_id}', retrieved=2,
+                              json_results=[{'url': 'http://a', 'swirl_score': 1000}, {'url': f'http://{provider_id}', 'swirl_score': 0}])
+    saved = dict(Result.objects.filter(search_id=search).values_list('id', 'date_updated'))
+
+    with CaptureQueriesContext(connection) as queries:
+        assert run_post_result_processors(search, SwirlQueryRequestLogger('foo', []))
+    updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+    assert len(updates) == 1
+    # like Result.save(), the rewrite counts as an update
+    assert all(result.date_updated > saved[result.id] for result in Result.objects.filter(search_id=search))
+    # one copy of the duplicate is kept, the rest score too low
+    assert sorted(len(result.json_results) for result in Result.objects.filter(search_id=search)) == [0, 0, 1]
+    assert search.messages[-1].endswith('DropIrrelevantPostResultProcessor deleted 3 results')
+
+@pytest.mark.django_db
+def test_result_items_page_in_the_database(test_suser_pw, monkeypatch):
+
+    from swirl.models import Search, Result, ResultRow
+    from swirl.mixers import RelevancyMixer, RelevancyNewItemsMixer, DateMixer
+    from swirl.result_items import index_result_items, get_result_items
+    import swirl.mixers.mixer
+    import swirl.result_items
+
+    owner = get_ddrp_suser(test_suser_pw)
+    search = Search.objects.create(owner=owner, query_string='foo', status='FULL_RESULTS_READY')
+    for provider_id in [1, 2]:
+        json_results = [{'title': f'{provider_id}-{rank}', 'url': f'http://{provider_id}/{rank}', 'swirl_score': float(10 - rank + provider_id),
+                         'date_published': f'2024-01-0{rank}' if rank < 4 else 'unknown', 'searchprovider_rank': rank, 'searchprovider': f'p{provider_id}'}
+                        for rank in range(1, 6)]
+        json_results[0]['new'] = True
+        Result.objects.create(owner=owner, search_id=search, provider_id=provider_id, searchprovider=f'p{provider_id}', retrieved=5, json_results=json_results)
+
+    def mix(mixer, page, **kwargs):
+        return mixer(search.id, 3, page, explain=True, **kwargs).mix()
+
+    expected = [[result['title'] for result in mix(mixer, page)['results']] for mixer in [RelevancyMixer, DateMixer] for page in [1, 2, 4, 5]]
+    assert expected[0][:2] == ['2-1', '2-2'] and expected[2] == ['1-5'] and expected[3] == []
+
+    monkeypatch.setattr(swirl.result_items, 'SWIRL_RESULT_ITEMS', True)
+    monkeypatch.setattr(swirl.mixers.mixer, 'SWIRL_RESULT_ITEMS', True)
+    assert index_result_items(search.id) == 10
+    mixed = mix(RelevancyMixer, 2)
+    assert [result['swirl_rank'] for result in mixed['results']] == [4, 5, 6]
+    assert mixed['info']['results']['retrieved_total'] == 10
+    assert [[result['title'] for result in mix(mixer, page)['results']] for mixer in [RelevancyMixer, DateMixer] for page in [1, 2, 4, 5]] == expected
+
+    # new flags are cleared in the table and in json_results, and stay cleared when the search is indexed again
+    assert len(mix(RelevancyNewItemsMixer, 1, mark_all_read=True)['results']) == 2
+    assert ResultRow.objects.filter(search_id=search, new=True).count() == 0
+    results = list(Result.objects.filter(search_id=search))
+    assert not any('new' in item for result in results for item in result.json_results)
+    # without changing date_updated, so the table is still used
+    assert get_result_items(search.id, results) is not None
+    index_result_items(search.id)
+    assert mix(RelevancyNewItemsMixer, 1)['results'] == []
+
+    # a Result saved after indexing is read from json_results until the search is indexed again
+    Result.objects.create(owner=owner, search_id=search, provider_id=3, searchprovider='p3', retrieved=1,
+                          json_results=[{'title': '3-1', 'url': 'http://3/1', 'swirl_score': 100.0, 'date_published': 'unknown', 'searchprovider_rank': 1}])
+    assert mix(RelevancyMixer, 1)['results'][0]['title'] == '3-1'
+
+######################################################################
+
+@pytest.mark.django_db
+def test_ranking_cache_pages_one_ranking(test_suser_pw):
+
+    from swirl.models import Search, Result
+    from swirl.mixers import RelevancyMixer
+    from swirl.ranking_cache import ranking_cache
+
+    owner = get_ddrp_suser(test_suser_pw)
+    search = Search.objects.create(owner=owner, query_string='foo', status='FULL_RESULTS_READY')
+    json_results = [{'title': f'1-{rank}', 'url': f'http://1/{rank}', 'swirl_score': float(10 - rank), 'date_published': 'unknown', 'searchprovider_rank': rank, 'searchprovider': 'p1'}
+                    for rank in range(1, 8)]
+    result = Result.objects.create(owner=owner, search_id=search, provider_id=1, searchprovider='p1', retrieved=7, json_results=json_results)
+
+    ranking_cache.enabled = False
+    try:
+        expected = [RelevancyMixer(search.id, 3, page).mix()['results'] for page in [1, 2, 3, 4]]
+    finally:
+        ranking_cache.enabled = True
+    ranking_cache.clear()
+
+    assert [RelevancyMixer(search.id, 3, page).mix()['results'] for page in [1, 2, 3, 4]] == expected
+    assert ranking_cache.stats()['hits'] == 3
+    assert [r['swirl_rank'] for r in expected[1]] == [4, 5, 6] and expected[3] == []
+
+    # a saved Result invalidates the cached ranking
+    result.json_results = json_results[:2]
+    result.save()
+    assert len(RelevancyMixer(search.id, 3, 1).mix()['results']) == 2
+    assert ranking_cache.stats()['hits'] == 3
+
+######################################################################
+
+@pytest.mark.django_db
+def test_mixers_merge_the_top_of_each_provider(test_suser_pw):
+
+    from operator import itemgetter
+    from swirl.models import Search, Result
+    from swirl.mixers import RelevancyMixer, DateMixer, Stack2Mixer
+    from swirl.mixers.utils import presort
+    from swirl.ranking_cache import ranking_cache
+
+    owner = get_ddrp_suser(test_suser_pw)
+    search = Search.objects.create(owner=owner, query_string='foo', status='FULL_RESULTS_READY')
+    all_results = []
+    for provider_id in [1, 2, 3]:
+        json_results = [{'title': f'{provider_id}-{rank}', 'url': f'http://{provider_id}/{rank}', 'swirl_score': float((rank * provider_id) % 4),
+                         'date_published': f'2024-01-0{(rank + provider_id) % 3 + 1}' if rank % 4 else 'unknown', 'searchprovider_rank': rank,
+                         'searchprovider': f'p{provider_id}'} for rank in range(1, 9)]
+        if provider_id == 2:
+            json_results = presort(json_results)
+        Result.objects.create(owner=owner, search_id=search, provider_id=provider_id, searchprovider=f'p{provider_id}', retrieved=8, json_results=json_results)
+    for result in Result.objects.filter(search_id=search):
+        all_results = all_results + result.json_results
+
+    relevancy = [result['title'] for result in sorted(sorted(sorted(all_results, key=itemgetter('searchprovider_rank')), key=itemgetter('date_published'), reverse=True), key=itemgetter('swirl_score'), reverse=True)]
+    dated = [result['title'] for result in sorted([result for result in all_results if result['date_published'] != 'unknown'], key=itemgetter('date_published'), reverse=True)]
+
+    for enabled in [False, True]:
+        ranking_cache.enabled = enabled
+        ranking_cache.clear()
+        try:
+            for page in [1, 2, 3]:
+                assert [result['title'] for result in RelevancyMixer(search.id, 5, page).mix()['results']] == relevancy[(page-1)*5:page*5]
+                assert [result['title'] for result in DateMixer(search.id, 5, page).mix()['results']] == dated[(page-1)*5:page*5]
+            assert [result['title'] for result in Stack2Mixer(search.id, 6, 2).mix()['results']] == ['3-2', '3-6', '1-2', '1-6', '2-5', '2-7']
+        finally:
+            ranking_cache.enabled = True
+
+######################################################################
+
+def test_near_duplicate_index_finds_candidates():
+
+    from swirl.processors.near_duplicates import NearDuplicateIndex
+
+    index = NearDuplicateIndex()
+    texts = ['The quick brown fox jumps over the lazy dog near the river bank today',
+             'Quarterly earnings rose sharply for the regional bank this spring',
+             '']
+    for key, text in enumerate(texts):
+        assert index.candidates(index.signature(text)) == []
+        index.add(key, index.signature(text))
+
+    assert index.candidates(index.signature('the quick brown fox jumps over the lazy dog near the river bank today')) == [0]
+    assert index.candidates(index.signature('The quick brown fox jumps over the lazy dog near the river bank')) == [0]
+    assert index.candidates(index.signature('')) == [2]
+    assert index.candidates(index.signature('Completely unrelated words about cooking pasta with fresh basil')) == []
+
+######################################################################
+
+@pytest.mark.django_db
+def test_subscription_skips_results_already_retrieved(test_suser_pw):
+
+    from swirl.models import Search, Result, SubscriptionState
+    from swirl.subscriptions import Subscription
+
+    owner = get_ddrp_suser(test_suser_pw)
+    search = Search.objects.create(owner=owner, query_string='foo', status='FULL_RESULTS_READY', subscribe=True)
+    Result.objects.create(owner=owner, search_id=search, provider_id=1, searchprovider='p1', retrieved=2,
+                          json_results=[{'title': 'a', 'url': 'http://1/a', 'date_published': '2024-01-02 10:00:00'},
+                                        {'title': 'b', 'url': 'http://1/b', 'date_published': 'unknown'}])
+
+    # the first update starts from the results the search has
+    subscription = Subscription(search, 1)
+    assert subscription.date_after() == '2024-01-02'
+    fetched = [{'title': 'a', 'url': 'http://1/a'}, {'title': 'c', 'url': 'http://1/c', 'date_published': '2024-02-01 08:00:00'},
+               {'title': 'c', 'url': 'http://1/c'}, {'title': 'd', 'url': '', 'payload': {'url': 'http://1/d'}}]
+    assert [item['title'] for item in subscription.filter(fetched)] == ['c', 'd']
+    assert subscription.dropped == 2
+    subscription.save(fetched[1:2])
+
+    state = SubscriptionState.objects.get(search_id=search, provider_id=1)
+    assert state.date_published == '2024-02-01 08:00:00' and len(state.seen) == 4
+    subscription = Subscription(search, 1)
+    assert subscription.date_after() == '2024-02-01'
+    assert [item['title'] for item in subscription.filter(fetched + [{'title': 'e', 'url': 'http://1/e'}])] == ['e']
+
+######################################################################
+
+@pytest.mark.django_db
+def test_expirer_deletes_expired_searches_in_batches(test_suser_pw, monkeypatch):
+
+    from datetime import timedelta
+    from django.utils import timezone
+    from swirl.models import Search, Result, ResultRow
+    from swirl.result_items import index_result_items
+    import swirl.expirer
+
+    owner = get_ddrp_suser(test_suser_pw)
+    searches = {retention: Search.objects.create(owner=owner, query_string='foo', status='FULL_RESULTS_READY', retention=retention) for retention in [0, 1, 2, 3]}
+    assert searches[0].expires_at is None
+    assert timedelta(days=27) < searches[3].expires_at - timezone.now() < timedelta(days=32)
+    for search in searches.values():
+        Result.objects.create(owner=owner, search_id=search, provider_id=1, searchprovider='p1', retrieved=1, json_results=[{'title': 'a', 'url': 'http://1/a'}])
+        index_result_items(search.id, force=True)
+
+    # hour and day retention are due
+    Search.objects.filter(retention__in=[1, 2]).update(expires_at=timezone.now() - timedelta(minutes=1))
+    monkeypatch.setattr(swirl.expirer, 'SWIRL_EXPIRE_BATCH_SIZE', 1)
+    assert swirl.expirer.expirer()
+    assert sorted(Search.objects.values_list('retention', flat=True)) == [0, 3]
+    assert Result.objects.count() == 2 and ResultRow.objects.count() == 2
+
+    # each model's rows are counted, children first
+    assert swirl.expirer.expire_searches([searches[0].id]) == {'ResultRow': 1, 'SubscriptionState': 0, 'Result': 1, 'Search': 1}
+    assert Result.objects.count() == 1 and ResultRow.objects.count() == 1
+
+######################################################################
+
+@pytest.fixture
+def small_spacy(monkeypatch):
+    '''
+    A blank English pipeline with a small vector table in place of en_core_web_lg
+    '''
+    import numpy as np
+    import spacy
+    from swirl.model_registry import model_registry
+    from swirl.spacy import spacy_vector_cache
+
+    nlp = spacy.blank('en')
+    generator = np.random.RandomState(0)
+    for word in 'the quick brown fox jumps over lazy dog search engine results federated knowledge river bank Swirl fast'.split():
+        nlp.vocab.set_vector(word, generator.uniform(-1, 1, 16).astype('float32'))
+        nlp.vocab.set_vector(word.lower(), generator.uniform(-1, 1, 16).astype('float32'))
+    monkeypatch.setitem(model_registry._models, ('spacy', None), nlp)
+    spacy_vector_cache.clear()
+    yield nlp
+    spacy_vector_cache.clear()
+
+class PerItemVectors:
+
+    '''
+    The per-item path SpacyVectorBatch replaced: nlp() per text, Doc.similarity() per pair
+    '''
+
+    def __init__(self):
+        self.texts = []
+        self.docs = []
+        self.chars = 0
+
+    def add(self, text):
+        self.texts.append(text)
+        self.chars = self.chars + len(text)
+        return len(self.texts) - 1
+
+    def compute(self):
+        from swirl.spacy import get_nlp
+        self.docs = [get_nlp()(text) for text in self.texts]
+        return len(self.docs)
+
+    def has_vector(self, i):
+        return self.docs[i].has_vector
+
+    def has_zero(self, i):
+        return self.docs[i].vector.all() == 0
+
+    def similarity(self, i, j):
+        return self.docs[i].similarity(self.docs[j])
+
+def test_relevancy_batch_matches_per_item_vectors(small_spacy, monkeypatch):
+
+    import copy
+    import warnings
+    from swirl.models import SearchProvider
+    import swirl.processors.relevancy
+    from swirl.processors.relevancy import CosineRelevancyResultProcessor
+
+    provider = SearchProvider(id=1, name='relevancy', tags=[])
+    results = [{'title': 'The quick brown fox', 'body': 'The fox jumps over the lazy dog. The dog sleeps by the river bank.', 'author': 'Swirl', 'searchprovider_rank': 1},
+               {'title': 'Federated search engine', 'body': 'Swirl returns fast federated search results from every knowledge source.', 'author': '', 'searchprovider_rank': 2},
+               {'title': 'Nothing in common', 'body': 'unknown words only here', 'searchprovider_rank': 3},
+               {'title': ['fox search'], 'body': 'https://example.com/quick-brown-fox', 'searchprovider_rank': 4}]
+
+    def run(vectors):
+        monkeypatch.setattr(swirl.processors.relevancy, 'SpacyVectorBatch', vectors)
+        processor = CosineRelevancyResultProcessor(copy.deepcopy(results), provider, 'quick fox search', request_id='test', result_processor_json_feedback={})
+        with warnings.catch_warnings():
+            # Doc.similarity() warns about empty vectors
+            warnings.simplefilter('ignore')
+            modified = processor.process()
+        return modified, processor.get_results()
+
+    batched = run(swirl.processors.relevancy.SpacyVectorBatch)
+    per_item = run(PerItemVectors)
+    assert batched[0] == per_item[0] > 0
+    assert batched[1] == per_item[1]
+    # scores and highlights came from the vectors, not just term matches
+    assert batched[1][0]['title'] == 'The <em>quick</em> brown <em>fox</em>'
+    assert 0 < batched[1][0]['dict_score']['title']['quick_1'] < 1
+
+######################################################################
+
+def test_model_registry_loads_each_model_once():
+
+    import subprocess
+    import sys
+    import threading
+    from swirl.model_registry import ModelRegistry
+
+    registry = ModelRegistry()
+    loads = []
+    def load_fake(arg=None):
+        loads.append(arg)
+        time.sleep(0.05)
+        return object()
+    registry.register('fake', load_fake)
+
+    assert not registry.is_loaded('fake')
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(registry.get('fake'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == [None] and len(set(id(model) for model in models)) == 1
+    assert registry.get('fake', 'a') is not models[0] and loads == [None, 'a']
+    assert sorted(stat['name'] for stat in registry.stats()) == ['fake', 'fake:a']
+    registry.unload('fake')
+    assert not registry.is_loaded('fake') and registry.is_loaded('fake', 'a')
+    with pytest.raises(KeyError):
+        registry.get('missing')
+
+    # importing the processors loads no model and doesn't import transformers
+    check = ("import sys; import swirl.processors; from swirl.model_registry import model_registry; "
+             "print(any(model_registry.is_loaded(name) for name in model_registry.names()), 'transformers' in sys.modules)")
+    output = subprocess.run([sys.executable, '-c', check], capture_output=True, text=True, env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'swirl_server.settings'})
+    assert output.stdout.strip().splitlines()[-1] == 'False False', output.stderr
+
+@pytest.mark.django_db
+def test_configured_models_are_preloaded(test_suser_pw, monkeypatch, capsys):
+
+    import importlib.util
+    from swirl.models import SearchProvider
+    import swirl.model_registry
+    from swirl.model_registry import model_registry, get_configured_models, preload_models
+
+    owner = get_ddrp_suser(test_suser_pw)
+    for name, connector, result_processors, tags, active in [
+            ('web', 'RequestsGet', ['MappingResultProcessor', 'CosineRelevancyResultProcessor'], [], True),
+            ('pii', 'RequestsGet', ['MappingResultProcessor', 'RedactPIIResultProcessor'], [], False),
+            ('vectors', 'PineconeDB', ['MappingResultProcessor'], ['model:fake-embeddings'], True)]:
+        provider = get_minimal_search_provider_data(name, active, True, tags)
+        provider.update({'connector': connector, 'result_processors': result_processors})
+        serializer = SearchProviderSerializer(data=provider)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(owner=owner)
+
+    # inactive providers don't count; the Search defaults do
+    assert get_configured_models() == [('transformers', 'fake-embeddings'), ('spacy', None)]
+
+    loads = []
+    monkeypatch.setitem(model_registry._loaders, 'fake', lambda: loads.append(1) or 'model')
+    monkeypatch.setattr(swirl.model_registry, 'get_configured_models', lambda: [('fake', None)])
+    try:
+        assert [stat['name'] for stat in preload_models([('fake', None), ('missing', None)])] == ['fake']
+        assert loads == [1]
+
+        # python swirl.py models loads the configured models and reports them
+        spec = importlib.util.spec_from_file_location('swirl_cli', os.path.join(os.path.dirname(swirl.model_registry.__file__), '..', 'swirl.py'))
+        swirl_cli = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(swirl_cli)
+        assert swirl_cli.models([])
+        assert loads == [1]
+        assert 'fake' in capsys.readouterr().out
+    finally:
+        model_registry.unload('fake')
+
+######################################################################
+
+class FakeTokenizer:
+
+    '''
+    One token per word, right padded, like a transformers tokenizer with padding=True
+    '''
+
+    def __call__(self, texts, return_tensors=None, padding=False, truncation=False):
+        import torch
+        lengths = [len(text.split()) for text in texts]
+        width = max(lengths)
+        ids = torch.tensor([[len(word) for word in text.split()] + [0] * (width - length) for text, length in zip(texts, lengths)])
+        mask = torch.tensor([[1] * length + [0] * (width - length) for length in lengths])
+        return {'input_ids': ids, 'attention_mask': mask}
+
+def get_fake_embedding_model(mb):
+
+    import torch
+
+    class FakeModel(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.weight = torch.nn.Parameter(torch.zeros(mb * 1024 * 1024 // 4))
+        def forward(self, input_ids, attention_mask):
+            class Output:
+                pass
+            output = Output()
+            # each token's hidden state is (word length, 1), padding is (100, 100)
+            hidden = torch.stack([input_ids.float(), torch.ones_like(input_ids, dtype=torch.float)], dim=-1)
+            output.last_hidden_state = torch.where(attention_mask.unsqueeze(-1) == 1, hidden, torch.full_like(hidden, 100.0))
+            return output
+
+    return FakeModel()
+
+def test_embedding_pool_evicts_and_pools_real_tokens(monkeypatch):
+
+    import threading
+    import swirl.embeddings
+    from swirl.embeddings import EmbeddingModelPool
+
+    sizes = {'a': 1, 'b': 1, 'c': 2}
+    loads = []
+    def load_fake(model_name):
+        loads.append(model_name)
+        time.sleep(0.05)
+        return FakeTokenizer(), get_fake_embedding_model(sizes[model_name])
+    monkeypatch.setattr(swirl.embeddings, 'load_transformer', load_fake)
+
+    # masked mean: padding doesn't change a text's embedding
+    pool = EmbeddingModelPool(max_mb=3, max_models=2)
+    alone = pool.encode(['abc de'], 'a')[0]
+    batched = pool.encode(['abc de', 'a bb ccc dddd'], 'a')
+    assert list(alone) == list(batched[0]) == [2.5, 1.0] and list(batched[1]) == [2.5, 1.0]
+
+    # the model count cap evicts the least recently used
+    pool.get('b')
+    pool.get('a')
+    pool.get('c')
+    assert pool.loaded() == ['a', 'c']
+    # the memory cap: c (2 MB) + b (1 MB) fits in 3 MB, a doesn't as well
+    pool.get('b')
+    assert pool.loaded() == ['c', 'b']
+    assert loads == ['a', 'b', 'c', 'b']
+
+    # threads waiting on a load count as hits
+    pool = EmbeddingModelPool(max_mb=3, max_models=2)
+    threads = [threading.Thread(target=pool.get, args=('a',)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = pool.stats()[0]
+    assert (stats['loads'], stats['hits']) == (1, 2)
+
+######################################################################
+
+class FakeFederateTask:
+
+    def __init__(self, ready, result=1):
+        self._ready = ready
+        self.result = result
+
+    def ready(self):
+        return self._ready()
+
+    def successful(self):
+        return True
+
+    def revoke(self):
+        self.revoked = True
+
+@pytest.mark.django_db
+def test_streaming_processes_each_result_once(test_suser_pw, monkeypatch):
+
+    from types import SimpleNamespace
+    from swirl.models import Search, Result
+    from swirl.processors.processor import PostResultProcessor
+    from swirl.performance_logger import SwirlQueryRequestLogger
+    import swirl.search
+
+    processed = []
+    class CountingPostResultProcessor(PostResultProcessor):
+        type = 'CountingPostResultProcessor'
+        def process(self):
+            for result in self.results:
+                processed.append(result.provider_id)
+                for item in result.json_results:
+                    item['passes'] = item.get('passes', 0) + 1
+                self.save_result(result)
+            return len(self.results)
+    monkeypatch.setattr(swirl.search, 'alloc_processor', lambda processor: CountingPostResultProcessor)
+
+    owner = get_ddrp_suser(test_suser_pw)
+    search = Search.objects.create(owner=owner, query_string='foo', status='FEDERATING', post_result_processors=['CountingPostResultProcessor'],
+                                   provider_status={'1': 'FEDERATING', '2': 'FEDERATING'})
+    def save_result(provider_id):
+        Result.objects.create(owner=owner, search_id=search, provider_id=provider_id, searchprovider=f'p{provider_id}', retrieved=2,
+                              json_results=[{'url': f'http://{provider_id}/{rank}'} for rank in [1, 2]])
+        return True
+    save_result(1)
+    def slow_ready():
+        # the second provider answers once the first one's results were streamed
+        if Search.objects.get(id=search.id).status != 'PARTIAL_RESULTS_READY':
+            return False
+        return Result.objects.filter(search_id=search, provider_id=2).exists() or save_result(2)
+
+    providers = [SimpleNamespace(id=provider_id, name=f'p{provider_id}', hedge=False, timeout=10, connector='RequestsGet') for provider_id in [1, 2]]
+    swqrx_logger = SwirlQueryRequestLogger('foo', [])
+    raw_results = {}
+    swirl.search.wait_for_providers(search, providers, [FakeFederateTask(lambda: True), FakeFederateTask(slow_ready)], False, None, swqrx_logger,
+                                    streaming=True, raw_results=raw_results)
+    # only the first provider's Result was streamed, and its first json_results kept
+    assert processed == [1]
+    assert search.status == 'PARTIAL_RESULTS_READY' and search.provider_status == {'1': 'READY', '2': 'READY'}
+    assert [list(results) for results in raw_results.values()] == [[{'url': 'http://1/1'}, {'url': 'http://1/2'}]]
+    assert [item['passes'] for item in Result.objects.get(search_id=search, provider_id=1).json_results] == [1, 1]
+
+    # the final pass runs the whole chain once over every Result
+    search.status = 'POST_RESULT_PROCESSING'
+    assert swirl.search.run_post_result_processors(search, swqrx_logger, raw_results=raw_results)
+    assert sorted(processed) == [1, 1, 2]
+    for result in Result.objects.filter(search_id=search):
+        assert [item['passes'] for item in result.json_results] == [1, 1]
+
+@pytest.mark.django_db
+def test_streamed_results_stay_readable_during_the_final_pass(test_suser_pw, monkeypatch):
+
+    from swirl.models import Search
+    from swirl.processors.processor import PostResultProcessor
+    import swirl.search
+
+    statuses = []
+    class StatusPostResultProcessor(PostResultProcessor):
+        type = 'StatusPostResultProcessor'
+        def process(self):
+            statuses.append(Search.objects.get(id=self.search.id).status)
+            return 0
+    monkeypatch.setattr(swirl.search, 'alloc_processor', lambda processor: StatusPostResultProcessor)
+    def wait_for_providers(search, providers, provider_results, update, session, swqrx_logger, **kwargs):
+        # as if the providers' results were streamed
+        search.status = 'PARTIAL_RESULTS_READY'
+        search.save()
+        return [1]
+    monkeypatch.setattr(swirl.search, 'wait_for_providers', wait_for_providers)
+    monkeypatch.setattr(swirl.search, 'use_thread_executor', lambda provider: True)
+    monkeypatch.setattr(swirl.search.federation_executor, 'submit', lambda *args, **kwargs: FakeFederateTask(lambda: True))
+
+    owner = get_ddrp_suser(test_suser_pw)
+    serializer = SearchProviderSerializer(data=get_minimal_search_provider_data('streamed', True, True, []))
+    serializer.is_valid(raise_exception=True)
+    serializer.save(owner=owner)
+    search = Search.objects.create(owner=owner, query_string='foo', status='NEW_SEARCH', pre_query_processors=[],
+                                   post_result_processors=['StatusPostResultProcessor'])
+    assert swirl.search.search(search.id)
+    # the views serve RESCORING searches, so the streamed results don't turn into 503s
+    assert statuses == ['RESCORING']
+    assert Search.objects.get(id=search.id).status == 'FULL_RESULTS_READY'
+
+######################################################################
+
+@pytest.mark.django_db
+def test_provider_timeouts_and_hedged_requests(test_suser_pw, monkeypatch):
+
+    from types import SimpleNamespace
+    from swirl.models import Search, Result
+    from swirl.connectors.connector import Connector
+    from swirl.circuit_breaker import CircuitBreaker
+    from swirl.performance_logger import SwirlQueryRequestLogger
+    from swirl.latency import percentile, get_provider_timeout, get_provider_latency_percentile, _percentile_cache
+    import swirl.search
+    import swirl.latency
+
+    # nearest-rank percentiles
+    assert percentile([], 95) is None
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([float(t) for t in range(20, 0, -1)], 95) == 19.0
+    assert percentile([float(t) for t in range(1, 101)], 50) == 50.0
+    assert get_provider_timeout(SimpleNamespace(timeout=0)) == float(settings.SWIRL_TIMEOUT)
+    assert get_provider_timeout(SimpleNamespace(timeout=2)) == 2.0
+
+    owner = get_ddrp_suser(test_suser_pw)
+    serializer = SearchProviderSerializer(data=get_minimal_search_provider_data('hedged', True, True, []))
+    serializer.is_valid(raise_exception=True)
+    provider = serializer.save(owner=owner, hedge=True)
+    search = Search.objects.create(owner=owner, query_string='foo', status='FEDERATING')
+
+    # the p95 of the recent Result times, once there are enough of them
+    _percentile_cache.clear()
+    monkeypatch.setattr(swirl.latency, 'SWIRL_HEDGE_MIN_SAMPLES', 20)
+    for t in range(1, 20):
+        Result.objects.create(owner=owner, search_id=search, provider_id=provider.id + 1, time=float(t))
+    assert get_provider_latency_percentile(provider.id + 1) is None
+    _percentile_cache.clear()
+    Result.objects.create(owner=owner, search_id=search, provider_id=provider.id + 1, time=20.0)
+    assert get_provider_latency_percentile(provider.id + 1) == 19.0
+    Result.objects.filter(search_id=search).delete()
+
+    # a provider that runs out of budget is TIMED_OUT, the others are still returned
+    monkeypatch.setattr(swirl.search, 'circuit_breaker', CircuitBreaker(enabled=False, redis_url=''))
+    swqrx_logger = SwirlQueryRequestLogger('foo', [])
+    providers = [SimpleNamespace(id=1, name='fast', hedge=False, timeout=5, connector='RequestsGet'),
+                 SimpleNamespace(id=2, name='slow', hedge=False, timeout=0.1, connector='RequestsGet')]
+    search.provider_status = {'1': 'FEDERATING', '2': 'FEDERATING'}
+    start_time = time.time()
+    results = swirl.search.wait_for_providers(search, providers, [FakeFederateTask(lambda: True, 3), FakeFederateTask(lambda: False)], False, None, swqrx_logger)
+    assert time.time() - start_time < 2
+    assert results == [3]
+    assert search.provider_status == {'1': 'READY', '2': 'TIMED_OUT'}
+
+    # past its p95 a hedged provider gets a second request; the first one to finish wins and the other is revoked
+    monkeypatch.setattr(swirl.search, 'get_provider_latency_percentile', lambda provider_id: 0.05)
+    search.provider_status = {str(provider.id): 'FEDERATING'}
+    first = FakeFederateTask(lambda: False)
+    hedged = []
+    def submit(provider):
+        hedged.append(FakeFederateTask(lambda: True, 7))
+        return hedged[-1]
+    assert swirl.search.wait_for_providers(search, [provider], [first], False, None, swqrx_logger, submit=submit) == [7]
+    assert len(hedged) == 1 and first.revoked and not hasattr(hedged[0], 'revoked')
+    assert search.provider_status == {str(provider.id): 'READY'}
+    assert search.messages[-1].endswith('Sent a hedged request to hedged')
+
+    # only the first request to save stores its results, the other stops before processing them
+    connectors = [Connector(provider.id, search.id, False) for _ in range(2)]
+    for connector in connectors:
+        connector.start_time = time.time()
+        connector.processed_results = [{'title': 'a', 'url': 'http://a'}]
+        connector.retrieved = 1
+    assert not connectors[1].hedge_lost()
+    assert connectors[0].save_results() == 1
+    assert connectors[1].hedge_lost()
+    assert connectors[1].save_results() == False
+    assert Result.objects.filter(search_id=search, provider_id=provider.id).count() == 1
+
+######################################################################
+
+@pytest.mark.django_db
+def test_thread_pool_federation_executor(test_suser_pw, monkeypatch):
+
+    import threading
+    from swirl.models import Search
+    from swirl.connectors.connector import Connector, prefetched_objects, _prefetched
+    from swirl.federation import ThreadPoolFederationExecutor
+    import swirl.connectors
+
+    # the prefetched objects are per thread, and restored on exit
+    with prefetched_objects(provider='outer'):
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(getattr(_prefetched, 'objects', None)))
+        thread.start()
+        thread.join()
+        assert seen == [None]
+        with prefetched_objects(provider='inner'):
+            assert _prefetched.objects['provider'] == 'inner'
+        assert _prefetched.objects['provider'] == 'outer'
+    assert _prefetched.objects is None
+
+    owner = get_ddrp_suser(test_suser_pw)
+    providers = []
+    for name in ['one', 'two']:
+        serializer = SearchProviderSerializer(data=get_minimal_search_provider_data(name, True, True, []))
+        serializer.is_valid(raise_exception=True)
+        providers.append(serializer.save(owner=owner))
+    search = Search.objects.create(owner=owner, query_string='foo', status='FEDERATING')
+
+    release = threading.Event()
+    class FakeConnector(Connector):
+        def federate(self, session):
+            release.wait(5)
+            if self.provider.name == 'two':
+                raise TypeError('broken')
+            # each connector can change its search and provider without the others seeing it
+            self.search.status = f'changed by {self.provider.name}'
+            self.provider.credentials = f'bearer={self.provider.name}'
+            return (self.search, self.provider, self.search_user)
+    monkeypatch.setattr(swirl.connectors, 'alloc_connector', lambda connector: FakeConnector)
+
+    executor = ThreadPoolFederationExecutor(max_workers=1)
+    futures = [executor.submit(search, provider, owner, False, None, 'request') for provider in providers]
+    # the pool has one thread, so the last request hasn't started and can be revoked
+    queued = executor.submit(search, providers[0], owner, False, None, 'request')
+    queued.revoke()
+    release.set()
+    executor.shutdown()
+    assert all(future.ready() for future in futures)
+    # the connectors are built from the objects given, not read from the database
+    connector_search, provider, user = futures[0].result
+    assert user is owner
+    assert provider is not providers[0] and provider.id == providers[0].id
+    assert provider.credentials == 'bearer=one' and providers[0].credentials != 'bearer=one'
+    assert connector_search is not search and connector_search.id == search.id
+    assert connector_search.status == 'changed by one' and search.status == 'FEDERATING'
+    # the error is logged, the provider reports False
+    assert futures[1].successful() and futures[1].result == False
+    assert queued.ready() and not queued.successful() and queued.result is None
+
+######################################################################
+
+def test_http_pool_does_not_keep_cookies():
+
+    import threading
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from swirl.http_pool import HttpPool
+
+    class CookieHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = (self.headers.get('Cookie') or '').encode('utf-8')
+            self.send_response(200)
+            if self.path == '/login':
+                self.send_header('Set-Cookie', 'session=user-a; Path=/')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), CookieHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    pool = HttpPool(maxsize=2, max_hosts=2, max_per_host=2)
+    url = f'http://127.0.0.1:{server.server_port}'
+    try:
+        response = pool.get(f'{url}/login', timeout=5)
+        assert response.cookies.get('session') == 'user-a'
+        # the next request, maybe for another user, doesn't send it
+        assert pool.get(f'{url}/search', timeout=5).text == ''
+        assert pool.get(f'{url}/search', cookies={'session': 'user-b'}, timeout=5).text == 'session=user-b'
+        assert pool.get(f'{url}/search', timeout=5).text == ''
+        assert pool.stats()[0]['requests'] == 4
+    finally:
+        pool.close()
+        server.shutdown()
+        server.server_close()
+
+def test_http_pool_waits_for_a_free_slot_no_longer_than_the_timeout():
+
+    import time
+    import requests
+    from swirl.http_pool import HostPool
+
+    pool = HostPool('http://127.0.0.1:9', maxsize=1, max_concurrent=1)
+    # another request holds the host's only slot
+    pool._limit.acquire()
+    start_time = time.time()
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        pool.request('GET', 'http://127.0.0.1:9/search', timeout=(0.2, 5))
+    assert time.time() - start_time < 1
+    assert pool.stats()['errors'] == 1 and pool.stats()['in_flight'] == 0
+    pool.close()
+
+######################################################################
+
+@pytest.mark.django_db
+def test_rerun_bypasses_the_result_cache_without_tagging(api_client, test_suser, test_suser_pw, monkeypatch):
+
+    from swirl.models import Search, Result
+    from swirl.connectors.connector import Connector
+    import swirl.views
+    import swirl.connectors.connector
+
+    search = Search.objects.create(owner=test_suser, query_string='foo', status='FULL_RESULTS_READY', tags=['SW_RESULT_PROCESSOR_SKIP:DedupeByFieldResultProcessor'])
+    Result.objects.create(owner=test_suser, search_id=search, provider_id=1, searchprovider='p1')
+    reruns = []
+    monkeypatch.setattr(swirl.views, 'run_search', lambda id, session, request=None, bypass_cache=False: reruns.append((id, bypass_cache)))
+
+    assert api_client.login(username=test_suser.username, password=test_suser_pw)
+    response = api_client.get(reverse('search'), {'rerun': search.id})
+    assert response.status_code == 302
+    assert reruns == [(search.id, True)]
+    search.refresh_from_db()
+    assert search.tags == ['SW_RESULT_PROCESSOR_SKIP:DedupeByFieldResultProcessor']
+    assert search.status == 'NEW_SEARCH' and not Result.objects.filter(search_id=search).exists()
+
+    # the connector queries the provider instead of the cache
+    monkeypatch.setattr(swirl.connectors.connector, 'get_provider_cache_ttl', lambda provider: 60)
+    serializer = SearchProviderSerializer(data=get_minimal_search_provider_data('cached', True, True, []))
+    serializer.is_valid(raise_exception=True)
+    provider = serializer.save(owner=test_suser)
+    connector = Connector(provider.id, search.id, False)
+    connector.query_to_provider = 'foo'
+    assert connector.get_cache_key()
+    connector.bypass_cache = True
+    assert connector.get_cache_key() is None
+
+######################################################################
+
+class FakeClient:
+
+    def __init__(self, healthy=True):
+        self.closed = False
+        self.healthy = healthy
+
+    def close(self):
+        self.closed = True
+
+def test_connection_pool_lends_checks_and_evicts():
+
+    import threading
+    from swirl.connection_pool import ConnectionPool
+
+    pool = ConnectionPool(max_per_provider=2, idle_timeout=60, check_after=60, wait=0.2)
+    key = (1, 'hash')
+    stats = lambda: {entry['provider_id']: entry for entry in pool.stats()}
+
+    # lent to one caller at a time, and returned after the block
+    with pool.connection(key, FakeClient) as first:
+        with pool.connection(key, FakeClient) as second:
+            assert first is not second
+            assert stats()[1]['in_use'] == 2
+            # the pool is full: the caller waits, then gets a connection that is closed after use
+            start_time = time.time()
+            with pool.connection(key, FakeClient) as overflow:
+                assert time.time() - start_time >= 0.2
+                assert overflow is not first and overflow is not second
+            assert overflow.closed
+    assert stats()[1]['in_use'] == 0 and stats()[1]['open'] == 2 and stats()[1]['waits'] >= 1
+    with pool.connection(key, FakeClient) as reused:
+        assert reused in (first, second) and not reused.closed
+    assert stats()[1]['created'] == 3 and stats()[1]['reused'] == 1
+
+    # a waiting caller gets the connection another returns
+    pool.wait = 5
+    held = threading.Event()
+    def hold():
+        with pool.connection(key, FakeClient):
+            held.set()
+            time.sleep(0.2)
+    with pool.connection(key, FakeClient) as mine:
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait(5)
+        with pool.connection(key, FakeClient) as returned:
+            assert returned in (first, second) and returned is not mine
+    thread.join()
+    assert stats()[1]['created'] == 3
+
+    # an error in the block discards the connection
+    with pytest.raises(ValueError):
+        with pool.connection(key, FakeClient) as broken:
+            raise ValueError('lost connection')
+    assert broken.closed and stats()[1]['discarded'] == 1 and stats()[1]['open'] == 1
+
+    # connections idle for check_after are checked before they are lent; an unhealthy one is replaced
+    pool.check_after = 0
+    with pool.connection(key, FakeClient) as connection:
+        connection.healthy = False
+    with pool.connection(key, FakeClient, check=lambda connection: connection.healthy) as replacement:
+        assert replacement is not connection and replacement.healthy
+    assert connection.closed and stats()[1]['failed_checks'] == 1
+    with pool.connection(key, FakeClient, check=lambda connection: connection.healthy) as checked:
+        assert checked is replacement
+
+    # shared clients are lent to every caller at once
+    with pool.client((2, 'hash'), FakeClient) as client:
+        with pool.client((2, 'hash'), FakeClient) as same:
+            assert same is client
+    assert stats()[2]['open'] == 1 and not client.closed
+
+    # idle clients are closed once idle_timeout passes
+    pool.idle_timeout = 0.05
+    time.sleep(0.1)
+    with pool.connection((3, 'hash'), FakeClient):
+        pass
+    assert client.closed and replacement.closed
+    assert stats()[2]['evicted'] == 1 and stats()[1]['open'] == 0
+
+    # invalidate drops a provider's clients
+    assert pool.invalidate(3) == 1
+    assert not 3 in stats()
+
+######################################################################
+
+class LocalRedisStore:
+    # minimal stand-in for the redis client calls the circuit breaker makes, shared by several breakers
+    def __init__(self):
+        self.data = {}
+    def get(self, key):
+        return self.data.get(key)
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+    def lpush(self, key, value):
+        self.data.setdefault(key, []).insert(0, value)
+    def ltrim(self, key, start, end):
+        self.data[key] = self.data.get(key, [])[start:end + 1]
+    def expire(self, key, ex):
+        pass
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, []))[start:None if end == -1 else end + 1]
+    def pipeline(self):
+        client = self
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+            def __getattr__(self, name):
+                return lambda *args: self.calls.append((name, args))
+            def execute(self):
+                return [getattr(client, name)(*args) for name, args in self.calls]
+        return Pipeline()
+
+def test_circuit_breaker_is_shared_by_the_search_and_worker_processes():
+
+    from swirl.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+    # off by default unless the state can be shared
+    assert settings.SWIRL_CIRCUIT_BREAKER == bool(settings.SWIRL_CIRCUIT_BREAKER_REDIS_URL)
+
+    # allow() runs in the search process, record() in the worker that ran the connector
+    shared = LocalRedisStore()
+    options = {'enabled': True, 'failures': 2, 'error_rate': 0.5, 'window': 10, 'min_samples': 5, 'cooldown': 60}
+    search_process = CircuitBreaker(redis_client=shared, **options)
+    worker = CircuitBreaker(redis_client=shared, **options)
+    worker.record(1, False, 1.0)
+    worker.record(1, False, 1.0)
+    assert not search_process.allow(1)
+    search_process.cooldown = 0
+    assert search_process.allow(1)
+    assert worker.get_state(1)['state'] == HALF_OPEN
+    # the probe's success, recorded by the worker, closes the circuit for the search process
+    worker.record(1, True, 0.5)
+    assert search_process.get_state(1)['state'] == CLOSED
+    assert search_process.allow(1) and search_process.allow(1)
+
+    # without a shared store the search process never hears from the worker
+    search_process = CircuitBreaker(redis_url='', **options)
+    worker = CircuitBreaker(redis_url='', **options)
+    worker.record(1, False, 1.0)
+    worker.record(1, False, 1.0)
+    assert worker.get_state(1)['state'] == OPEN
+    assert search_process.allow(1)
+
+    # if Redis fails, requests go through
+    class BrokenRedis:
+        def __getattr__(self, name):
+            raise ConnectionError('redis is down')
+    broken = CircuitBreaker(redis_client=BrokenRedis(), **options)
+    broken.record(1, False, 1.0)
+    assert broken.allow(1)
+    assert broken.get_state(1)['samples'] == 0
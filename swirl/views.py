@@ -502,7 +502,8 @@ class SearchViewSet(viewsets.ModelViewSet):
             rerun_search.save()
             logger.info(f"{request.user} rerun {rerun_id}")
             # search_task.delay(rerun_search.id, Authenticator().get_session_data(request))
-            run_search(rerun_search.id, Authenticator().get_session_data(request), request=request)
+            # a rerun always queries the providers, never the result cache
+            run_search(rerun_search.id, Authenticator().get_session_data(request), request=request, bypass_cache=True)
             return redirect(f'/swirl/results?search_id={rerun_search.id}')
         # end if
 
@@ -649,6 +650,7 @@ class ResultViewSet(viewsets.ModelViewSet):
     Add &result_mixer=<MixerName> to the above URL specify the result mixer to use
     Add &explain=False to hide the relevancy explanation for each result
     Add &provider=<provider_id> to filter results to one SearchProvider
+    With SWIRL_STREAMING_FEDERATION, results are available once the search is PARTIAL_RESULTS_READY
     """
     queryset = Result.objects.all()
     serializer_class = ResultSerializer
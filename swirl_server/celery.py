@@ -7,7 +7,7 @@
 import os
 from celery import Celery
 from celery.schedules import crontab
-from celery.signals import after_setup_logger
+from celery.signals import after_setup_logger, worker_process_init
 from django.conf import settings
 
 # Set the default Django settings module for the 'celery' program.
@@ -52,6 +52,12 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+@worker_process_init.connect
+def preload_models(**kwargs):
+    if getattr(settings, 'SWIRL_PRELOAD_MODELS', False):
+        from swirl.model_registry import preload_models
+        preload_models()
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
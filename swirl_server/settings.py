@@ -255,9 +255,72 @@ SWIRL_DEFAULT_QUERY_LANGUAGE = 'english'
 SWIRL_TIMEOUT_DEFAULT = 10
 SWIRL_TIMEOUT = env.int('SWIRL_TIMEOUT',default=SWIRL_TIMEOUT_DEFAULT)
 SWIRL_SUBSCRIBE_WAIT = 20
+# subscription updates skip results already retrieved, remembering up to SWIRL_SUBSCRIBE_SEEN_MAX per search and provider
+SWIRL_SUBSCRIBE_INCREMENTAL = env.bool('SWIRL_SUBSCRIBE_INCREMENTAL', default=True)
+SWIRL_SUBSCRIBE_SEEN_MAX = env.int('SWIRL_SUBSCRIBE_SEEN_MAX', default=10000)
+# the expirer deletes expired searches, and their results, this many at a time
+SWIRL_EXPIRE_BATCH_SIZE = env.int('SWIRL_EXPIRE_BATCH_SIZE', default=500)
+# process and expose each provider's results as soon as it responds, instead of waiting for all of them
+SWIRL_STREAMING_FEDERATION = env.bool('SWIRL_STREAMING_FEDERATION', default=False)
+# 'thread' federates I/O-bound connectors on a thread pool in the search process instead of Celery tasks
+SWIRL_FEDERATION_EXECUTOR = env('SWIRL_FEDERATION_EXECUTOR', default='celery')
+SWIRL_FEDERATION_MAX_WORKERS = env.int('SWIRL_FEDERATION_MAX_WORKERS', default=32)
+SWIRL_HTTP_POOL_MAXSIZE = env.int('SWIRL_HTTP_POOL_MAXSIZE', default=20)
+SWIRL_HTTP_POOL_MAX_HOSTS = env.int('SWIRL_HTTP_POOL_MAX_HOSTS', default=100)
+SWIRL_HTTP_MAX_PER_HOST = env.int('SWIRL_HTTP_MAX_PER_HOST', default=10)
+SWIRL_PAGE_FETCH_WORKERS = env.int('SWIRL_PAGE_FETCH_WORKERS', default=5)
+SWIRL_PAGE_RATE_LIMIT = env.int('SWIRL_PAGE_RATE_LIMIT', default=5)
+SWIRL_RESULT_CACHE_TTL = env.int('SWIRL_RESULT_CACHE_TTL', default=0)
+SWIRL_RESULT_CACHE_SIZE = env.int('SWIRL_RESULT_CACHE_SIZE', default=1000)
+SWIRL_RESULT_CACHE_REDIS_URL = env('SWIRL_RESULT_CACHE_REDIS_URL', default='')
+SWIRL_CONNECTION_POOL_MAX_PER_PROVIDER = env.int('SWIRL_CONNECTION_POOL_MAX_PER_PROVIDER', default=4)
+SWIRL_CONNECTION_POOL_IDLE_TIMEOUT = env.int('SWIRL_CONNECTION_POOL_IDLE_TIMEOUT', default=300)
+SWIRL_CONNECTION_POOL_CHECK_AFTER = env.int('SWIRL_CONNECTION_POOL_CHECK_AFTER', default=30)
+SWIRL_CONNECTION_POOL_WAIT = env.int('SWIRL_CONNECTION_POOL_WAIT', default=5)
+SWIRL_STREAMING_PARSE = env.bool('SWIRL_STREAMING_PARSE', default=False)
+SWIRL_STREAMING_PARSE_MAX_BYTES = env.int('SWIRL_STREAMING_PARSE_MAX_BYTES', default=10485760)
+# skip SearchProviders that keep failing, see swirl/circuit_breaker.py
+# the search process and the Celery workers share the circuit state through Redis, so it is only on by default with it
+SWIRL_CIRCUIT_BREAKER_REDIS_URL = env('SWIRL_CIRCUIT_BREAKER_REDIS_URL', default='')
+SWIRL_CIRCUIT_BREAKER = env.bool('SWIRL_CIRCUIT_BREAKER', default=bool(SWIRL_CIRCUIT_BREAKER_REDIS_URL))
+SWIRL_CIRCUIT_BREAKER_FAILURES = env.int('SWIRL_CIRCUIT_BREAKER_FAILURES', default=5)
+SWIRL_CIRCUIT_BREAKER_ERROR_RATE = env.float('SWIRL_CIRCUIT_BREAKER_ERROR_RATE', default=0.5)
+SWIRL_CIRCUIT_BREAKER_WINDOW = env.int('SWIRL_CIRCUIT_BREAKER_WINDOW', default=20)
+SWIRL_CIRCUIT_BREAKER_MIN_SAMPLES = env.int('SWIRL_CIRCUIT_BREAKER_MIN_SAMPLES', default=10)
+SWIRL_CIRCUIT_BREAKER_COOLDOWN = env.int('SWIRL_CIRCUIT_BREAKER_COOLDOWN', default=60)
+# identical provider requests in flight at the same time share one response, see swirl/single_flight.py
+SWIRL_SINGLE_FLIGHT = env.bool('SWIRL_SINGLE_FLIGHT', default=True)
+SWIRL_SINGLE_FLIGHT_REDIS_URL = env('SWIRL_SINGLE_FLIGHT_REDIS_URL', default='')
+# post result processors share one load and one save of the Results, see run_post_result_processors() in swirl/search.py
+SWIRL_POST_RESULT_PIPELINE = env.bool('SWIRL_POST_RESULT_PIPELINE', default=True)
+# also store result items one per row, so mixers can order and page in the database, see swirl/result_items.py
+SWIRL_RESULT_ITEMS = env.bool('SWIRL_RESULT_ITEMS', default=False)
+# mixed rankings are cached for this many seconds, so later pages of a search are a slice of the first mix
+SWIRL_RANKING_CACHE = env.bool('SWIRL_RANKING_CACHE', default=True)
+SWIRL_RANKING_CACHE_TTL = env.int('SWIRL_RANKING_CACHE_TTL', default=300)
+SWIRL_RANKING_CACHE_SIZE = env.int('SWIRL_RANKING_CACHE_SIZE', default=100)
+SWIRL_RANKING_CACHE_REDIS_URL = env('SWIRL_RANKING_CACHE_REDIS_URL', default='')
+# SearchProviders with hedge=True get a duplicate request once they pass this percentile of their recent response times
+SWIRL_HEDGE_PERCENTILE = 95
+SWIRL_HEDGE_WINDOW = 100
+SWIRL_HEDGE_MIN_SAMPLES = 20
 SWIRL_DEDUPE_FIELD = 'url'
 SWIRL_DEDUPE_SIMILARITY_MINIMUM = 0.95
 SWIRL_DEDUPE_SIMILARITY_FIELDS = ['title', 'body']
+# DedupeBySimilarityPostResultProcessor: 'pairwise' or 'lsh', which only compares near duplicates by MinHash; a search can pick one with the DedupeEngine:<engine> tag
+SWIRL_DEDUPE_SIMILARITY_ENGINE = env('SWIRL_DEDUPE_SIMILARITY_ENGINE', default='pairwise')
+
+# process-wide cache of spaCy document vectors
+SWIRL_SPACY_CACHE_SIZE = env.int('SWIRL_SPACY_CACHE_SIZE', default=50000)
+SWIRL_SPACY_CACHE_TTL = env.int('SWIRL_SPACY_CACHE_TTL', default=3600)
+
+# NLP/ML models load on first use; set to True to load the ones needed by active SearchProviders when each worker starts
+SWIRL_PRELOAD_MODELS = env.bool('SWIRL_PRELOAD_MODELS', default=False)
+
+# per-process pool of transformer models used for query embeddings
+SWIRL_EMBEDDING_MODEL = 'intfloat/e5-small-v2'
+SWIRL_EMBEDDING_POOL_MAX_MB = env.int('SWIRL_EMBEDDING_POOL_MAX_MB', default=2048)
+SWIRL_EMBEDDING_POOL_MAX_MODELS = env.int('SWIRL_EMBEDDING_POOL_MAX_MODELS', default=4)
 
 SWIRL_EXPLAIN = bool(os.getenv('SWIRL_EXPLAIN', 'True') == 'True')
 